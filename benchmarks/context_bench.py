@@ -0,0 +1,68 @@
+#Context packing benchmark: prompt context size and product coverage, raw Documents vs. the packed context.
+#   raw    : top_k Documents formatted straight into {context} (what the chain did before)
+#   packed : fetch_k Documents grouped by product, deduplicated and packed under the token budget
+#The catalog is repeated (--copies) with "(copy n)" suffixes, so near-duplicate reviews are common,
+#like the many almost identical reviews per product in the real data.
+#
+#Run from the project root:
+#   python -m benchmarks.context_bench --copies 3 --max-tokens 600
+
+import argparse
+import time
+from benchmarks.retrieval_bench import QUERIES
+from benchmarks.stubs import StubEmbeddings, csv_documents
+from benchmarks.results import add_output_argument, maybe_write_results
+from retriever.catalog import ProductCatalog
+from retriever.context_packer import ContextPacker, estimate_tokens
+from retriever.local_index import LocalVectorStore
+
+
+def main(args):
+    embeddings = StubEmbeddings(dimension=args.dimension)
+    documents = csv_documents(copies=args.copies)
+    store = LocalVectorStore(embeddings)
+    texts = [doc.page_content for doc in documents]
+    store.add_embeddings(texts, embeddings.embed_documents(texts), [doc.metadata for doc in documents],
+                         [doc.id for doc in documents])
+    catalog = ProductCatalog()
+    catalog.add_documents(documents)
+    packer = ContextPacker(catalog, max_tokens=args.max_tokens)
+
+    totals = {"raw_tokens": 0, "packed_tokens": 0, "raw_products": 0, "packed_products": 0, "pack_ms": 0.0}
+    print(f"{'question':<44} {'raw tok':>8} {'packed tok':>10} {'raw prod':>8} {'packed prod':>11}")
+    for question in QUERIES:
+        raw = store.similarity_search(question, k=args.top_k)
+        fetched = store.similarity_search(question, k=args.fetch_k)
+        start = time.perf_counter()
+        context = packer.pack(fetched)
+        totals["pack_ms"] += (time.perf_counter() - start) * 1000
+
+        raw_tokens, packed_tokens = estimate_tokens(str(raw)), estimate_tokens(context)
+        raw_products = len({doc.metadata["product_name"] for doc in raw})
+        packed_products = context.count("Product: ")
+        for key, value in (("raw_tokens", raw_tokens), ("packed_tokens", packed_tokens),
+                           ("raw_products", raw_products), ("packed_products", packed_products)):
+            totals[key] += value
+        print(f"{question[:44]:<44} {raw_tokens:>8} {packed_tokens:>10} {raw_products:>8} {packed_products:>11}")
+
+    count = len(QUERIES)
+    print(f"\naverage: raw {totals['raw_tokens'] / count:.0f} tokens / {totals['raw_products'] / count:.1f} products "
+          f"(top {args.top_k}), packed {totals['packed_tokens'] / count:.0f} tokens / "
+          f"{totals['packed_products'] / count:.1f} products (from {args.fetch_k}, budget {args.max_tokens}), "
+          f"packing {totals['pack_ms'] / count:.2f} ms per request")
+    if args.show:
+        print("\nExample packed context:\n" + packer.pack(store.similarity_search(QUERIES[0], k=args.fetch_k)))
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raw vs. packed prompt context size")
+    parser.add_argument("--copies", type=int, default=3, help="repeat the CSV catalog (adds near-duplicates)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--fetch-k", type=int, default=12)
+    parser.add_argument("--max-tokens", type=int, default=600)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--show", action="store_true", help="print one packed context")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "context_bench", main(args))
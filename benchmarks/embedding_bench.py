@@ -0,0 +1,107 @@
+#Embedding micro-benchmark against the deterministic stub model (fixed latency per call):
+#   documents cold   : review texts through the on-disk embedding cache, nothing cached yet (ingestion)
+#   documents warm   : the same texts again, every vector comes from the cache (re-ingestion)
+#   queries direct   : concurrent questions, one model call each (what the server did before batching)
+#   queries batched  : the same questions through the micro-batcher (utils/embedding_batcher.py)
+#   queries cached   : the same questions again through the cache
+#Reported per scenario: wall time, texts/s, model calls and p50/p99 latency per question.
+#
+#Run from the project root:
+#   python -m benchmarks.embedding_bench --queries 256 --concurrency 32 --latency 0.05
+
+import argparse
+import asyncio
+import tempfile
+import time
+import numpy as np
+from benchmarks.load_test import percentile
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.retrieval_bench import QUERIES
+from benchmarks.stubs import StubEmbeddings, csv_documents
+from utils.embedding_batcher import MicroBatchEmbeddings
+from utils.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+def summary(texts: int, seconds: float, calls: int, latencies=None) -> dict:
+    result = {"texts": texts, "seconds": round(seconds, 3), "texts_per_second": round(texts / seconds, 1),
+              "model_calls": calls}
+    if latencies:
+        result["p50_ms"] = round(percentile(latencies, 50) * 1000, 2)
+        result["p99_ms"] = round(percentile(latencies, 99) * 1000, 2)
+    return result
+
+
+def embed_documents(embeddings, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[offset:offset + batch_size])
+    return time.perf_counter() - start
+
+
+async def embed_queries(embeddings, questions, concurrency: int):
+    latencies = []
+    queue = list(reversed(questions))
+
+    async def worker():
+        while queue:
+            question = queue.pop()
+            start = time.perf_counter()
+            await embeddings.aembed_query(question)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def run(args) -> dict:
+    texts = list(dict.fromkeys(doc.page_content for doc in csv_documents(copies=args.copies)))
+    rng = np.random.default_rng(0)
+    questions = [f"{QUERIES[i % len(QUERIES)]} {rng.integers(100000)}" for i in range(args.queries)]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        model = StubEmbeddings(dimension=args.dimension, latency_seconds=args.latency)
+        cached = CachedEmbeddings(model, EmbeddingStore(f"{cache_dir}/embeddings.sqlite", "stub"))
+        for name in ("documents cold", "documents warm"):
+            calls = model.calls
+            seconds = embed_documents(cached, texts, args.batch_size)
+            results[name] = summary(len(texts), seconds, model.calls - calls)
+
+        for name, embeddings in (("queries direct", model),
+                                 ("queries batched", MicroBatchEmbeddings(model, args.max_batch_size,
+                                                                          args.batch_window_ms)),
+                                 ("queries cached", None)):
+            if embeddings is None:
+                await embed_queries(cached, questions, args.concurrency)      #fill the cache first
+                embeddings = cached
+            calls = model.calls
+            seconds, latencies = await embed_queries(embeddings, questions, args.concurrency)
+            results[name] = summary(len(questions), seconds, model.calls - calls, latencies)
+    return results
+
+
+def main(args):
+    results = asyncio.run(run(args))
+    print(f"stub model: {args.latency * 1000:.0f} ms per call, dim={args.dimension}; "
+          f"{args.concurrency} concurrent questions\n")
+    print(f"{'scenario':<16} {'texts':>6} {'texts/s':>10} {'calls':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['texts']:>6} {result['texts_per_second']:>10} {result['model_calls']:>6} "
+              f"{result.get('p50_ms', ''):>8} {result.get('p99_ms', ''):>8}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding throughput: cache, micro-batching, direct calls")
+    parser.add_argument("--copies", type=int, default=4, help="repeat the CSV catalog to embed more reviews")
+    parser.add_argument("--batch-size", type=int, default=100, help="texts per document embedding call")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub model seconds per call")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--batch-window-ms", type=float, default=10.0)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "embedding_bench", main(args))
@@ -0,0 +1,114 @@
+#Metadata pre-filtering benchmark: unfiltered vs. post-filtered vs. pre-filtered local vector search.
+#Every benchmark question comes with the filter a human would apply ("4+ star boAt headphones" ->
+#rating >= 4 and a BoAt product). Recall@k is measured against the exact top-k among the documents
+#that satisfy that filter, i.e. how many of the right reviews reach the prompt.
+#   unfiltered   : plain top-k over the whole catalog (what the retriever did before)
+#   post-filter  : over-fetch k * overfetch, then drop the non-matching hits
+#   pre-filter   : filter from the query parser applied before scoring (retriever/query_understanding.py)
+#
+#Run from the project root:
+#   python -m benchmarks.filter_bench --copies 50 --repeat 20
+
+import argparse
+import time
+import numpy as np
+from benchmarks.stubs import StubEmbeddings, csv_documents
+from benchmarks.results import add_output_argument, maybe_write_results
+from retriever.catalog import ProductCatalog
+from retriever.local_index import LocalVectorStore
+from retriever.metadata_filter import MetadataColumns
+from retriever.query_understanding import QueryFilterParser
+
+ROCKERZ = "BoAt Rockerz 235v2 with ASAP charging Version 5.0 Bluetooth Headset"
+BOAT = [ROCKERZ, "BoAt Airdopes 131 Bluetooth Headset", "BoAt BassHeads 100 Wired Headset"]
+REALME = ["realme Buds Wireless Bluetooth Headset", "realme Buds 2 Wired Headset", "realme Buds Q Bluetooth Headset"]
+ONEPLUS = ["OnePlus Bullets Wireless Z Bluetooth Headset", "OnePlus Bullets Wireless Z Bass Edition Bluetooth Headset"]
+
+# (question, expected filter)
+QUERY_SET = [
+    ("4+ star boAt headphones with good bass", {"product_rating": {"$gte": 4}, "product_name": {"$in": BOAT}}),
+    ("show me 1 star reviews of BoAt Rockerz 235v2", {"product_rating": {"$eq": 1}, "product_name": ROCKERZ}),
+    ("is the realme buds 2 battery good", {"product_name": "realme Buds 2 Wired Headset"}),
+    ("oneplus bullets rated 4 or above for calls", {"product_rating": {"$gte": 4}, "product_name": {"$in": ONEPLUS}}),
+    ("complaints about realme buds under 3 stars", {"product_rating": {"$lt": 3}, "product_name": {"$in": REALME}}),
+    ("five star neckband for workouts", {"product_rating": {"$eq": 5},
+                                          "product_name": "U&I Titanic Series - Low Price Bluetooth Neckband Bluetooth Headset"}),
+    ("at least 4 stars wired earphones", {"product_rating": {"$gte": 4},
+                                          "product_name": {"$in": ["realme Buds 2 Wired Headset", "BoAt BassHeads 100 Wired Headset"]}}),
+    ("Airdopes 131 connection problems", {"product_name": "BoAt Airdopes 131 Bluetooth Headset"}),
+]
+
+
+def timed(search, repeat: int):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = search()
+        latencies.append(time.perf_counter() - start)
+    return result, float(np.median(latencies)) * 1000
+
+
+def main(args):
+    embeddings = StubEmbeddings(dimension=args.dimension)
+    documents = csv_documents(copies=args.copies)
+    texts = [doc.page_content for doc in documents]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = LocalVectorStore(embeddings)
+    store.add_embeddings(texts, vectors.tolist(), [doc.metadata for doc in documents], [doc.id for doc in documents])
+
+    catalog = ProductCatalog()
+    catalog.add_documents(documents)
+    parser = QueryFilterParser(catalog.names, ["wired", "neckband"])
+    columns = MetadataColumns.from_metadatas([doc.metadata for doc in documents])
+    ids = np.array([doc.id for doc in documents])
+
+    totals = {"unfiltered": [0.0, 0], "post-filter": [0.0, 0], "pre-filter": [0.0, 0]}
+    parsed_correctly = 0
+    print(f"catalog: {len(documents)} reviews, k={args.k}, post-filter over-fetch x{args.overfetch}\n")
+    print(f"{'question':<46} {'matching':>8} {'unfilt ms':>9} {'post ms':>8} {'pre ms':>7} "
+          f"{'R unfilt':>8} {'R post':>7} {'R pre':>6}")
+    for question, expected_filter in QUERY_SET:
+        query = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+        query /= np.linalg.norm(query)
+        matching = np.flatnonzero(columns.mask(expected_filter))
+        truth = set(ids[matching[np.argsort(-(vectors[matching] @ query))[:args.k]]])
+
+        parsed = parser.parse(question)
+        parsed_correctly += parsed == expected_filter
+        allowed = set(ids[matching])
+
+        unfiltered, unfiltered_ms = timed(lambda: store.similarity_search_by_vector(query, args.k), args.repeat)
+        post, post_ms = timed(lambda: [doc for doc in store.similarity_search_by_vector(query, args.k * args.overfetch)
+                                       if doc.id in allowed][:args.k], args.repeat)
+        pre, pre_ms = timed(lambda: store.similarity_search_by_vector(query, args.k, filter=parser.parse(question)),
+                            args.repeat)
+
+        row = []
+        for name, result, latency in (("unfiltered", unfiltered, unfiltered_ms), ("post-filter", post, post_ms),
+                                      ("pre-filter", pre, pre_ms)):
+            found = len(truth & {doc.id for doc in result}) / len(truth) if truth else 1.0
+            totals[name][0] += latency
+            totals[name][1] += found
+            row.append(found)
+        print(f"{question[:46]:<46} {len(matching):>8} {unfiltered_ms:>9.3f} {post_ms:>8.3f} {pre_ms:>7.3f} "
+              f"{row[0]:>8.2f} {row[1]:>7.2f} {row[2]:>6.2f}")
+
+    print(f"\n{'mode':<12} {'avg ms':>8} {'recall@' + str(args.k):>9}")
+    for name, (latency, found) in totals.items():
+        print(f"{name:<12} {latency / len(QUERY_SET):>8.3f} {found / len(QUERY_SET):>9.3f}")
+    print(f"query parser: {parsed_correctly}/{len(QUERY_SET)} filters extracted as expected "
+          f"(pre-filter timings include parsing)")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filtered vs. unfiltered retrieval latency and recall")
+    parser.add_argument("--copies", type=int, default=20, help="repeat the CSV catalog to simulate a larger one")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--overfetch", type=int, default=4)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per question (median reported)")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "filter_bench", main(args))
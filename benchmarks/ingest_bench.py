@@ -0,0 +1,57 @@
+#Ingestion throughput benchmark for the pipelined engine (data_ingestion/pipeline_engine.py).
+#Embedding and vector store writes go to local stub HTTP servers with a fixed per-call latency,
+#so the speedup from concurrent embedding workers and writers can be measured without API keys.
+#
+#Run from the project root:
+#   python -m benchmarks.ingest_bench --concurrency 1 2 4 8
+#   python -m benchmarks.ingest_bench --rate-limit-every 7      #every 7th embedding call answers 429
+
+import argparse
+from benchmarks.stubs import (StubEmbeddings, StubServiceServer, RemoteStubEmbeddings, RemoteStubVectorStore,
+                              csv_documents, embedding_routes, vector_store_routes)
+from benchmarks.results import add_output_argument, maybe_write_results
+from data_ingestion.pipeline_engine import IngestionEngine
+from retriever.local_index import LocalVectorStore
+
+
+def main(args):
+    documents = csv_documents(copies=args.copies)
+    model = StubEmbeddings(dimension=args.dimension)
+    results = []
+
+    with StubServiceServer(embedding_routes(model, args.rate_limit_every), args.embed_latency) as embed_server:
+        embeddings = RemoteStubEmbeddings(embed_server.url)
+        for concurrency in args.concurrency:
+            backend = LocalVectorStore(model)      #fresh "database" for every run
+            with StubServiceServer(vector_store_routes(backend), args.write_latency) as store_server:
+                vstore = RemoteStubVectorStore(store_server.url, embeddings)
+                engine = IngestionEngine(embeddings, vstore, batch_size=args.batch_size,
+                                         embed_workers=concurrency, write_workers=concurrency,
+                                         queue_size=2 * concurrency, backoff_seconds=0.05,
+                                         report_every_seconds=60)
+                report = engine.run([documents])
+                assert len(backend) == len({doc.id for doc in documents}), "documents were lost or duplicated"
+                results.append({"workers": concurrency, **report})
+
+    baseline = results[0]["docs_per_second"]
+    print(f"\n{len(documents)} documents, batch {args.batch_size}, "
+          f"embed latency {args.embed_latency * 1000:.0f} ms, write latency {args.write_latency * 1000:.0f} ms")
+    print(f"{'workers':>8} {'docs/s':>9} {'speedup':>8} {'retries':>8}")
+    for report in results:
+        print(f"{report['workers']:>8} {report['docs_per_second']:>9} "
+              f"{report['docs_per_second'] / baseline:>8.2f} {report['retries']:>8}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipelined ingestion throughput against local stub servers")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--copies", type=int, default=4, help="repeat the CSV catalog to get more documents")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="seconds per embedding call")
+    parser.add_argument("--write-latency", type=float, default=0.05, help="seconds per insert call")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer 429 on every Nth embedding call")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "ingest_bench", main(args))
@@ -0,0 +1,163 @@
+#Load test for the /get endpoint using the local stub LLM and stub vector store.
+#It serves the FastAPI app with uvicorn on a local port (no API keys needed) and shows how requests/second
+#scales with the number of concurrent clients now that the chain runs on the async path.
+#
+#Run from the project root:
+#   python -m benchmarks.load_test --requests 200 --concurrency 1 4 16 64
+#   python -m benchmarks.load_test --local-index --output benchmarks/results/load.json
+
+import argparse
+import asyncio
+import time
+import httpx
+import uvicorn
+from benchmarks.stubs import StubChatModel, StubEmbeddings, StubRetriever, csv_documents, sample_documents
+from retriever.local_index import LocalVectorStore
+from utils.chain_registry import ChainRegistry
+from utils.concurrency import ConcurrencyLimiter
+from utils.embedding_batcher import MicroBatchEmbeddings
+from utils.metrics import REGISTRY
+from utils.tracing import STAGE_HISTOGRAMS, TimedEmbeddings
+from benchmarks.results import add_output_argument, maybe_write_results
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))]
+
+
+async def run_level(client: httpx.AsyncClient, total_requests: int, concurrency: int, stream: bool = False) -> dict:
+    """
+    Send `total_requests` POSTs to /get (or /stream) using `concurrency` parallel clients.
+    For /stream the latency is the time to the first streamed token.
+    """
+    latencies = []
+    status_counts = {}
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(f"question number {i} about budget headphones")
+
+    async def worker():
+        while True:
+            try:
+                msg = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            if stream:
+                async with client.stream("POST", "/stream", data={"msg": msg}) as response:
+                    first_token = None
+                    async for _ in response.aiter_bytes():
+                        first_token = first_token or time.perf_counter()
+                latencies.append((first_token or time.perf_counter()) - start)
+            else:
+                response = await client.post("/get", data={"msg": msg})
+                latencies.append(time.perf_counter() - start)
+            status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "rps": round(total_requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "status": status_counts,
+    }
+
+
+async def main(args):
+    import main as app_module   #imported here so the registry can be injected before startup
+    app = app_module.app
+
+    query_embeddings = None
+    if args.local_index or args.embed_latency > 0:
+        # Real local index over the CSV (AstraDB stand-in); each question pays a (stub) embedding
+        # round-trip of --embed-latency, optionally micro-batched with --batch-window-ms
+        query_embeddings = StubEmbeddings(latency_seconds=args.embed_latency)
+        documents = csv_documents()
+        store = LocalVectorStore(query_embeddings)
+        store.add_embeddings([d.page_content for d in documents],
+                             StubEmbeddings().embed_documents([d.page_content for d in documents]),
+                             [d.metadata for d in documents], [d.id for d in documents])
+        if args.batch_window_ms > 0:
+            store.embedding = MicroBatchEmbeddings(query_embeddings, args.max_batch_size, args.batch_window_ms)
+        store.embedding = TimedEmbeddings(store.embedding)    #embedding span, like Retriever.load_retriever
+        retriever = store.as_retriever(search_kwargs={"k": 3})
+    else:
+        retriever = StubRetriever(documents=sample_documents(), latency_seconds=args.retrieval_latency)
+
+    app.state.registry = ChainRegistry(
+        retriever=retriever,
+        llm=StubChatModel(latency_seconds=args.llm_latency, token_latency_seconds=args.token_latency),
+    )
+    app.state.answer_cache = None     #measure the full chain, not the cache
+    app.state.limiter = ConcurrencyLimiter(
+        max_concurrency=args.max_concurrency, max_queue=args.max_queue, queue_timeout=args.queue_timeout
+    )
+
+    # Real uvicorn server in the same event loop, so streamed bytes are measured as the browser sees them
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    levels = []
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60, limits=limits) as client:
+            print(f"{'clients':>8} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  status")
+            for concurrency in args.concurrency:
+                result = await run_level(client, args.requests, concurrency, stream=args.stream)
+                levels.append(result)
+                print(f"{result['concurrency']:>8} {result['rps']:>8} {result['p50_ms']:>8} "
+                      f"{result['p95_ms']:>8} {result['p99_ms']:>8}  {result['status']}")
+    finally:
+        server.should_exit = True
+        await server_task
+
+    # Where the time went (same histograms as /metrics), over all levels
+    stages = {}
+    print(f"\n{'stage':>16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage, histogram in STAGE_HISTOGRAMS.items():
+        snapshot = histogram.snapshot()
+        if snapshot["count"]:
+            stages[stage] = {key: snapshot[key] for key in ("count", "p50", "p95", "p99")}
+            print(f"{stage:>16} {snapshot['count']:>6} {snapshot['p50'] * 1000:>8.1f} "
+                  f"{snapshot['p95'] * 1000:>8.1f} {snapshot['p99'] * 1000:>8.1f}")
+
+    if query_embeddings is not None:
+        print(f"embedding calls: {query_embeddings.calls}")
+        if args.batch_window_ms > 0:
+            print(f"batch size: {REGISTRY.histogram('query_embedding_batch_size').snapshot()}")
+            print(f"queue wait: {REGISTRY.histogram('query_embedding_queue_wait_seconds').snapshot()}")
+    return {"levels": levels, "stages": stages,
+            "embedding_calls": query_embeddings.calls if query_embeddings is not None else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /get with local stubs")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="stub LLM time per following token")
+    parser.add_argument("--stream", action="store_true", help="hit /stream and report time to first token")
+    parser.add_argument("--retrieval-latency", type=float, default=0.05)
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--queue-timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="use a local index with a stub query embedder of this latency instead of the stub retriever")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0, help="micro-batch question embeddings")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--local-index", action="store_true",
+                        help="retrieve from a local index over the CSV instead of a fixed-latency stub retriever")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "load_test", asyncio.run(main(args)))
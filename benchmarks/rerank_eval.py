@@ -0,0 +1,88 @@
+#Offline evaluation of the reranking stage (retriever/reranker.py): quality vs. latency across top_k and
+#rerank depth. Questions and relevance labels come from the filter benchmark: a review is relevant when it
+#is about the product / rating the question asks for. Retrieval is plain vector search (no metadata filter),
+#so the numbers show what reranking alone adds.
+#   depth 0  : no reranking, the top_k vector search hits go to the prompt
+#   depth N  : N candidates are searched and reranked, the best top_k are kept
+#cold = score memo empty, warm = same questions again (scores memoized per (question, doc id)).
+#
+#Run from the project root:
+#   python -m benchmarks.rerank_eval --copies 5 --top-k 3 5 8 --depth 0 10 20 30 50
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from benchmarks.filter_bench import QUERY_SET
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.stubs import StubEmbeddings, csv_documents
+from retriever.local_index import LocalVectorStore
+from retriever.metadata_filter import MetadataColumns
+from retriever.reranker import Reranker, RerankingRetriever
+from utils.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+def ndcg(relevant: list, k: int, total_relevant: int) -> float:
+    gains = sum(1.0 / np.log2(rank + 2) for rank, hit in enumerate(relevant[:k]) if hit)
+    ideal = sum(1.0 / np.log2(rank + 2) for rank in range(min(k, total_relevant)))
+    return gains / ideal if ideal else 0.0
+
+
+def evaluate(retriever, labels, k: int) -> dict:
+    precision = gain = 0.0
+    latencies = []
+    for question, relevant_ids in labels:
+        start = time.perf_counter()
+        documents = retriever.invoke(question)
+        latencies.append(time.perf_counter() - start)
+        hits = [doc.id in relevant_ids for doc in documents[:k]]
+        precision += sum(hits) / k
+        gain += ndcg(hits, k, len(relevant_ids))
+    return {"precision": precision / len(labels), "ndcg": gain / len(labels),
+            "ms": float(np.mean(latencies)) * 1000}
+
+
+def main(args):
+    documents = csv_documents(copies=args.copies)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Document vectors end up in the embedding cache, like after a real ingestion
+        embeddings = CachedEmbeddings(StubEmbeddings(dimension=args.dimension),
+                                      EmbeddingStore(f"{cache_dir}/embeddings.sqlite", "stub"))
+        texts = [doc.page_content for doc in documents]
+        store = LocalVectorStore(embeddings)
+        store.add_embeddings(texts, embeddings.embed_documents(texts), [doc.metadata for doc in documents],
+                             [doc.id for doc in documents])
+
+        columns = MetadataColumns.from_metadatas([doc.metadata for doc in documents])
+        ids = np.array([doc.id for doc in documents])
+        labels = [(question, set(ids[columns.mask(expected)])) for question, expected in QUERY_SET]
+
+        print(f"catalog: {len(documents)} reviews, {len(labels)} labelled questions\n")
+        print(f"{'top_k':>5} {'depth':>5} {'P@k':>6} {'nDCG@k':>7} {'cold ms':>8} {'warm ms':>8}")
+        results = []
+        for k in args.top_k:
+            for depth in args.depth:
+                if depth and depth < k:
+                    continue
+                if depth:
+                    retriever = RerankingRetriever(base_retriever=store.as_retriever(search_kwargs={"k": depth}),
+                                                   reranker=Reranker(embeddings), k=k)
+                else:
+                    retriever = store.as_retriever(search_kwargs={"k": k})
+                cold = evaluate(retriever, labels, k)
+                warm = evaluate(retriever, labels, k)
+                results.append({"top_k": k, "depth": depth, **cold, "warm_ms": warm["ms"]})
+                print(f"{k:>5} {depth:>5} {cold['precision']:>6.3f} {cold['ndcg']:>7.3f} "
+                      f"{cold['ms']:>8.3f} {warm['ms']:>8.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reranker quality vs. latency")
+    parser.add_argument("--copies", type=int, default=5, help="repeat the CSV catalog to simulate a larger one")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--depth", type=int, nargs="+", default=[0, 10, 20, 30, 50])
+    parser.add_argument("--dimension", type=int, default=768)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "rerank_eval", main(args))
@@ -0,0 +1,139 @@
+#Tail latency of chat requests with and without the resilience section (utils/resilience.py), over the real
+#chain (context packing, prompt, parser) with fault-injecting stubs for the retriever and the LLM:
+#   slow tail  : a small share of the retrievals and of the LLM calls is seconds slower than usual
+#   llm outage : for --outage-seconds, starting --outage-start seconds into the run, every LLM call hangs for
+#                --slow-llm-seconds and then fails (an overloaded upstream timing out)
+#Requests arrive at a fixed rate (open loop, so fast degraded answers do not change the arrival pattern) and
+#each runs the way main.invoke_chain runs it (ChainRun: deadline, degraded answer), answer cache off.
+#Reported per scenario and mode: p50/p95/p99, errors, share of degraded answers, hedged retrievals,
+#calls refused by an open circuit. Faults are seeded, so both modes see the same slow/failing calls.
+#
+#Run from the project root:
+#   python -m benchmarks.resilience_bench --requests 450 --rate 30
+
+import argparse
+import asyncio
+import copy
+import time
+from benchmarks.load_test import percentile
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.stubs import FaultInjector, StubChatModel, StubRetriever, csv_documents
+from config.config_loader import load_config
+from utils.chain_registry import ChainRegistry
+from utils.metrics import REGISTRY
+from utils.resilience import ChainRun
+
+QUESTIONS = [
+    "Can you suggest good budget headphones?",
+    "best earphones with good bass",
+    "how is the battery life of BoAt Airdopes 131",
+    "reviews of realme buds 2",
+]
+
+
+def counter_value(name: str) -> float:
+    return REGISTRY.counter(name).value
+
+
+def scenario_faults(name: str, args):
+    if name == "slow tail":
+        return (FaultInjector(slow_probability=args.slow_share, slow_seconds=args.slow_retrieval_seconds, seed=1),
+                FaultInjector(slow_probability=args.slow_share, slow_seconds=args.slow_llm_seconds, seed=2))
+    return FaultInjector(seed=1), FaultInjector(slow_seconds=args.slow_llm_seconds, seed=2)
+
+
+async def run_scenario(name: str, config: dict, documents: list, args) -> dict:
+    retriever_faults, llm_faults = scenario_faults(name, args)
+    retriever = StubRetriever(documents=documents, latency_seconds=args.retrieval_latency, faults=retriever_faults)
+    llm = StubChatModel(latency_seconds=args.llm_latency, token_latency_seconds=args.token_latency, faults=llm_faults)
+    registry = ChainRegistry(config=config, retriever=retriever, llm=llm).build()
+    chain = registry.get_chain()
+    counters = ("chat_degraded_answers_total", "retrieval_hedges_total", "retrieval_hedge_wins_total",
+                "circuit_llm_rejected_total", "circuit_retrieval_rejected_total")
+    before = {counter: counter_value(counter) for counter in counters}
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+
+    async def request(number: int):
+        nonlocal errors
+        await asyncio.sleep(max(0.0, started + number / args.rate - time.perf_counter()))
+        start = time.perf_counter()
+        if name == "llm outage":
+            elapsed = start - started
+            outage = args.outage_start <= elapsed < args.outage_start + args.outage_seconds
+            llm_faults.error_probability = llm_faults.slow_probability = 1.0 if outage else 0.0
+        try:
+            run = ChainRun(registry.resilience)
+            async for _ in run.astream(chain, QUESTIONS[number % len(QUESTIONS)], []):
+                pass
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(request(number) for number in range(args.requests)))
+    after = {counter: counter_value(counter) - before[counter] for counter in counters}
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "errors": errors,
+        "degraded_share": round(after["chat_degraded_answers_total"] / args.requests, 4),
+        "hedges": int(after["retrieval_hedges_total"]),
+        "hedge_wins": int(after["retrieval_hedge_wins_total"]),
+        "circuit_rejections": int(after["circuit_llm_rejected_total"] + after["circuit_retrieval_rejected_total"]),
+    }
+
+
+async def run(args) -> dict:
+    base = copy.deepcopy(load_config())
+    base["server"]["warm_up"] = False
+    base["llm"]["routing"]["enabled"] = False
+    base["resilience"].update({"request_timeout_seconds": args.timeout, "min_generation_seconds": args.min_generation,
+                               "llm_timeout_seconds": args.llm_timeout})
+    base["resilience"]["circuit_breaker"]["reset_seconds"] = args.reset_seconds
+    documents = csv_documents()[:12]
+
+    print(f"stub retrieval {args.retrieval_latency * 1000:.0f} ms, stub LLM {args.llm_latency * 1000:.0f} ms to first token; "
+          f"{args.requests} requests at {args.rate}/s; deadline {args.timeout} s\n")
+    print(f"{'scenario':<11} {'resilience':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'degraded':>9} {'hedges/wins':>12} {'rejected':>9}")
+    results = {}
+    for name in ("slow tail", "llm outage"):
+        results[name] = {}
+        for enabled in (False, True):
+            config = copy.deepcopy(base)
+            config["resilience"]["enabled"] = enabled
+            result = await run_scenario(name, config, documents, args)
+            mode = "on" if enabled else "off"
+            results[name][mode] = result
+            print(f"{name:<11} {mode:<10} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+                  f"{result['errors']:>7} {result['degraded_share']:>9} "
+                  f"{str(result['hedges']) + '/' + str(result['hedge_wins']):>12} {result['circuit_rejections']:>9}")
+    return results
+
+
+def main(args):
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p99 of chat requests under injected faults, with and without resilience")
+    parser.add_argument("--requests", type=int, default=450)
+    parser.add_argument("--rate", type=float, default=30.0, help="requests started per second")
+    parser.add_argument("--retrieval-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--slow-share", type=float, default=0.05, help="share of slow calls in the slow tail scenario")
+    parser.add_argument("--slow-retrieval-seconds", type=float, default=2.0)
+    parser.add_argument("--slow-llm-seconds", type=float, default=6.0)
+    parser.add_argument("--outage-start", type=float, default=2.0)
+    parser.add_argument("--outage-seconds", type=float, default=8.0)
+    parser.add_argument("--timeout", type=float, default=3.0, help="request deadline (resilience.request_timeout_seconds)")
+    parser.add_argument("--min-generation", type=float, default=1.0, help="resilience.min_generation_seconds")
+    parser.add_argument("--llm-timeout", type=float, default=1.5, help="resilience.llm_timeout_seconds")
+    parser.add_argument("--reset-seconds", type=float, default=1.0, help="circuit breaker reset time")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "resilience_bench", main(args))
@@ -0,0 +1,65 @@
+#JSON output shared by the benchmarks: every benchmark accepts --output PATH and writes its results there,
+#together with what is needed to compare two runs later (arguments, git commit, Python/platform, time).
+#benchmarks.suite runs them all and merges the files; `python -m benchmarks.suite --compare A.json B.json`
+#prints the numbers that changed between two runs.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def add_output_argument(parser):
+    parser.add_argument("--output", help="write the results as JSON to this file")
+
+
+def run_info() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _jsonable(value):
+    # NumPy scalars, tuples-as-keys etc. become plain JSON values
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def write_results(path: str, benchmark: str, args, results) -> dict:
+    """
+    Write {"benchmark", "run", "args", "results"} to `path` (directories are created) and return it.
+    """
+    document = {
+        "benchmark": benchmark,
+        "run": run_info(),
+        "args": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": _jsonable(results),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"results written to {path}", file=sys.stderr)
+    return document
+
+
+def maybe_write_results(args, benchmark: str, results):
+    if getattr(args, "output", None):
+        write_results(args.output, benchmark, args, results)
@@ -0,0 +1,114 @@
+#Retrieval latency benchmark: local in-process index (exact and IVF) vs. a remote vector store.
+#The remote side is a local HTTP stub server holding the same vectors (stand-in for AstraDB), so the
+#difference is the network round-trip + serialization the local backend avoids.
+#Query embedding is computed once up front so only the vector search is measured.
+#
+#Run from the project root:
+#   python -m benchmarks.retrieval_bench --copies 1 --queries 500
+#   python -m benchmarks.retrieval_bench --copies 200 --queries 200       #~90k reviews, shows IVF
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from benchmarks.stubs import StubEmbeddings, StubServiceServer, RemoteStubVectorStore, csv_documents, vector_store_routes
+from benchmarks.results import add_output_argument, maybe_write_results
+from retriever.local_index import LocalVectorStore
+
+QUERIES = [
+    "Can you suggest good budget headphones?",
+    "best bluetooth headset with long battery backup",
+    "earphones with good bass under 1000",
+    "is the sound quality good for calls",
+    "which product has the best value for money",
+    "headphones that are comfortable for gaming",
+    "charging time and battery life",
+    "wireless earbuds with noise cancellation",
+]
+
+
+def measure(search, query_vectors, k: int) -> dict:
+    latencies = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        search(vector, k)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {"p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3)}
+
+
+def recall(search, reference, query_vectors, k: int) -> float:
+    """
+    Fraction of the exact top-k ids that the approximate search also returns.
+    """
+    found = total = 0
+    for vector in query_vectors[:50]:
+        expected = {doc.id for doc in reference(vector, k)}
+        found += len(expected & {doc.id for doc in search(vector, k)})
+        total += len(expected)
+    return round(found / total, 3) if total else 1.0
+
+
+def main(args):
+    embeddings = StubEmbeddings(dimension=args.dimension)
+    documents = csv_documents(copies=args.copies)
+    texts = [doc.page_content for doc in documents]
+    vectors = embeddings.embed_documents(texts)
+    metadatas = [doc.metadata for doc in documents]
+    ids = [doc.id for doc in documents]
+
+    exact = LocalVectorStore(embeddings, mode="exact")
+    exact.add_embeddings(texts, vectors, metadatas, ids)
+
+    # Save and memory-map the index, the way the server loads it
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        exact.save(index_dir)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        mapped = LocalVectorStore.load(index_dir, embeddings, mode="exact")
+        load_seconds = time.perf_counter() - start
+
+        ivf = LocalVectorStore(embeddings, mode="ivf", nlist=args.nlist, nprobe=args.nprobe)
+        ivf.add_embeddings(texts, vectors, metadatas, ids)
+        ivf.build_ivf()
+
+        rng = np.random.default_rng(0)
+        query_texts = [QUERIES[i % len(QUERIES)] + f" {rng.integers(1000)}" for i in range(args.queries)]
+        query_vectors = embeddings.embed_documents(query_texts)
+
+        print(f"catalog: {len(documents)} reviews, dim={args.dimension}; "
+              f"save {save_seconds * 1000:.1f} ms, mmap load {load_seconds * 1000:.1f} ms")
+        results = {
+            "local exact (mmap)": measure(mapped.similarity_search_by_vector, query_vectors, args.k),
+            "local ivf": measure(ivf.similarity_search_by_vector, query_vectors, args.k),
+        }
+
+        with StubServiceServer(vector_store_routes(exact), latency_seconds=args.network_latency) as server:
+            remote = RemoteStubVectorStore(server.url, embeddings)
+            results["remote stub (AstraDB stand-in)"] = measure(remote.similarity_search_by_vector,
+                                                                query_vectors, args.k)
+
+        ivf_recall = recall(ivf.similarity_search_by_vector, exact.similarity_search_by_vector, query_vectors, args.k)
+
+    print(f"{'backend':<34} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<34} {result['p50_ms']:>9} {result['p99_ms']:>9}")
+    print(f"ivf recall@{args.k} vs exact: {ivf_recall} (nlist={args.nlist}, nprobe={args.nprobe})")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local index vs. remote vector store retrieval latency")
+    parser.add_argument("--copies", type=int, default=1, help="repeat the CSV catalog to simulate a larger one")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--nlist", type=int, default=64)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--network-latency", type=float, default=0.0,
+                        help="extra simulated latency per remote call in seconds (on top of the real HTTP round-trip)")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "retrieval_bench", main(args))
@@ -0,0 +1,138 @@
+#LLM routing benchmark (utils/llm_router.py) with two stub chat models of different latency standing in for
+#gemini-1.5-flash and gemini-1.5-pro, over the real retrieval + context packing path (local index over the CSV).
+#The question mix has simple lookups and recommendations next to comparisons and open-ended questions:
+#   pro only         : every question on the heavy model (the current single-model setup)
+#   routed           : tiers from llm.routing in config.yaml, picked by the local classifier
+#   routed, pro busy : same, with a low pro max_in_flight, so a burst spills over to flash
+#Reported per scenario: p50/p95/p99 per question, share of questions per tier, busy fallbacks.
+#
+#Run from the project root:
+#   python -m benchmarks.routing_bench --requests 200 --concurrency 16
+
+import argparse
+import asyncio
+import copy
+import time
+from benchmarks.load_test import percentile
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.stubs import StubChatModel, StubEmbeddings, csv_documents
+from config.config_loader import load_config
+from retriever.local_index import LocalVectorStore
+from utils.chain_registry import ChainRegistry
+from utils.llm_router import LLMRouter, LLMTier, detect_intent
+from utils.metrics import REGISTRY
+
+QUESTIONS = [
+    "rating of BoAt Rockerz 235v2",
+    "reviews of realme buds 2",
+    "Can you suggest good budget headphones?",
+    "best earphones with good bass",
+    "compare the bass of boAt Rockerz and OnePlus Bullets",
+    "why do people complain about the OnePlus Bullets Wireless Z",
+    "which is better for calls, realme Buds 2 or BoAt BassHeads 100, and how long does the battery last",
+    "how is the battery life of BoAt Airdopes 131",
+]
+
+
+def build_retriever(k: int):
+    documents = csv_documents()
+    texts = [doc.page_content for doc in documents]
+    store = LocalVectorStore(StubEmbeddings())
+    store.add_embeddings(texts, StubEmbeddings().embed_documents(texts), [doc.metadata for doc in documents],
+                         [doc.id for doc in documents])
+    return store.as_retriever(search_kwargs={"k": k})
+
+
+def stub_tiers(args, routing_config: dict, pro_max_in_flight=None) -> list:
+    latencies = {"flash": (args.flash_latency, args.flash_token_latency), "pro": (args.pro_latency, args.pro_token_latency)}
+    tiers = []
+    for tier_config in routing_config["tiers"]:
+        first_token, per_token = latencies[tier_config["name"]]
+        max_in_flight = tier_config.get("max_in_flight")
+        if tier_config["name"] == "pro" and pro_max_in_flight is not None:
+            max_in_flight = pro_max_in_flight
+        tiers.append(LLMTier(
+            name=tier_config["name"],
+            llm=StubChatModel(latency_seconds=first_token, token_latency_seconds=per_token),
+            max_question_words=tier_config.get("max_question_words"),
+            max_context_tokens=tier_config.get("max_context_tokens"),
+            max_products=tier_config.get("max_products"),
+            intents=tier_config.get("intents"),
+            max_in_flight=max_in_flight,
+        ))
+    return tiers
+
+
+async def run_scenario(config: dict, retriever, tiers: list, args) -> dict:
+    registry = ChainRegistry(config=config, retriever=retriever, router=LLMRouter(tiers)).build()
+    chain = registry.get_chain()
+    hits_before = {tier.name: tier.hits.value for tier in tiers}
+    fallbacks_before = REGISTRY.counter("llm_route_fallbacks_total").value
+    latencies = {}
+    queue = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.requests)]
+
+    async def worker():
+        while queue:
+            question = queue.pop()
+            start = time.perf_counter()
+            await chain.ainvoke(question)
+            latencies.setdefault(detect_intent(question), []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    everything = [latency for values in latencies.values() for latency in values]
+    return {
+        "rps": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(everything, 50) * 1000, 1),
+        "p95_ms": round(percentile(everything, 95) * 1000, 1),
+        "p99_ms": round(percentile(everything, 99) * 1000, 1),
+        "p50_ms_by_intent": {intent: round(percentile(values, 50) * 1000, 1) for intent, values in latencies.items()},
+        "tier_requests": {tier.name: int(tier.hits.value - hits_before[tier.name]) for tier in tiers},
+        "busy_fallbacks": int(REGISTRY.counter("llm_route_fallbacks_total").value - fallbacks_before),
+    }
+
+
+async def run(args) -> dict:
+    config = copy.deepcopy(load_config())
+    config["server"]["warm_up"] = False
+    routing_config = config["llm"]["routing"]
+    retriever = build_retriever(config.get("context", {}).get("fetch_k", 12))
+    pro_only = {"tiers": [tier for tier in routing_config["tiers"] if tier["name"] == "pro"]}
+
+    scenarios = {
+        "pro only": stub_tiers(args, pro_only),
+        "routed": stub_tiers(args, routing_config),
+        "routed, pro busy": stub_tiers(args, routing_config, pro_max_in_flight=args.busy_max_in_flight),
+    }
+    results = {}
+    print(f"stub flash {args.flash_latency * 1000:.0f} ms, stub pro {args.pro_latency * 1000:.0f} ms to first token; "
+          f"{args.requests} questions, {args.concurrency} concurrent\n")
+    print(f"{'scenario':<18} {'rps':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  tiers / busy fallbacks")
+    for name, tiers in scenarios.items():
+        result = await run_scenario(config, retriever, tiers, args)
+        results[name] = result
+        print(f"{name:<18} {result['rps']:>6} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8}  "
+              f"{result['tier_requests']} / {result['busy_fallbacks']}")
+    print("\np50 ms by intent:")
+    for name, result in results.items():
+        print(f"  {name:<18} {result['p50_ms_by_intent']}")
+    return results
+
+
+def main(args):
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM routing between a fast and a heavy stub model")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--flash-latency", type=float, default=0.3, help="stub flash time to first token")
+    parser.add_argument("--flash-token-latency", type=float, default=0.005)
+    parser.add_argument("--pro-latency", type=float, default=1.5, help="stub pro time to first token")
+    parser.add_argument("--pro-token-latency", type=float, default=0.02)
+    parser.add_argument("--busy-max-in-flight", type=int, default=4, help="pro max_in_flight of the busy scenario")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "routing_bench", main(args))
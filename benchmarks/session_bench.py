@@ -0,0 +1,94 @@
+#Session memory micro-benchmark (utils/session_memory.py) with scripted conversations:
+#every session asks a first question followed by follow-ups ("is it waterproof?", "what about the
+#cheaper one?") that should reuse the first turn's reviews, and occasionally changes topic.
+#   memory : per-worker store, reported with the Python heap held per session (tracemalloc)
+#   sqlite : shared store for multi-worker setups, one SQLite file
+#Reported per store: turns/s for plan + record, share of turns that reused retrieval, sessions kept.
+#
+#Run from the project root:
+#   python -m benchmarks.session_bench --sessions 20000 --turns 6
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.retrieval_bench import QUERIES
+from benchmarks.stubs import csv_documents
+from utils.session_memory import InMemorySessionStore, SessionMemory, SQLiteSessionStore
+
+FOLLOW_UPS = ["is it waterproof?", "what about the cheaper one?", "how is its battery life?",
+              "does it have good bass?", "which of them is better for calls?"]
+
+ANSWER = ("Based on the reviews, the BoAt Rockerz 235v2 is well rated for bass and battery life, "
+          "while the Realme Buds Wireless is a little cheaper and lighter. ") * 3
+
+
+def conversation(session: int, turns: int) -> list:
+    questions = [QUERIES[session % len(QUERIES)]]
+    for turn in range(1, turns):
+        if turn % 4 == 3:
+            questions.append(QUERIES[(session + turn) % len(QUERIES)])       #change of topic
+        else:
+            questions.append(FOLLOW_UPS[(session + turn) % len(FOLLOW_UPS)])
+    return questions
+
+
+def run_store(memory: SessionMemory, args, documents) -> dict:
+    conversations = [conversation(session, args.turns) for session in range(args.sessions)]
+    reused = turns = 0
+    start = time.perf_counter()
+    # Sessions interleave, like concurrent users: turn 1 of every session, then turn 2, ...
+    for turn in range(args.turns):
+        for session, questions in enumerate(conversations):
+            plan = memory.plan(f"session-{session}", questions[turn])
+            retrieved = plan.documents
+            if retrieved is None:
+                offset = (session * 7 + turn) % (len(documents) - args.k)
+                retrieved = documents[offset:offset + args.k]
+            reused += plan.reused
+            turns += 1
+            memory.record(plan, ANSWER, retrieved)
+    seconds = time.perf_counter() - start
+    return {"turns": turns, "seconds": round(seconds, 3), "turns_per_second": round(turns / seconds, 1),
+            "reused_ratio": round(reused / turns, 3), "sessions_kept": len(memory.store)}
+
+
+def main(args):
+    documents = csv_documents()
+    results = {}
+    print(f"{args.sessions} sessions x {args.turns} turns, max_turns={args.max_turns}, "
+          f"max_sessions={args.max_sessions}\n")
+    print(f"{'store':<8} {'turns/s':>9} {'reused':>7} {'sessions':>9} {'KB/session':>11}")
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    memory = SessionMemory(InMemorySessionStore(args.max_sessions), max_turns=args.max_turns)
+    result = run_store(memory, args, documents)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    result["kb_per_session"] = round(held / 1024 / max(1, result["sessions_kept"]), 2)
+    results["memory"] = result
+    print(f"{'memory':<8} {result['turns_per_second']:>9} {result['reused_ratio']:>7} "
+          f"{result['sessions_kept']:>9} {result['kb_per_session']:>11}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteSessionStore(os.path.join(directory, "sessions.sqlite"), args.max_turns, args.max_sessions)
+        result = run_store(SessionMemory(store, max_turns=args.max_turns), args, documents)
+        results["sqlite"] = result
+        print(f"{'sqlite':<8} {result['turns_per_second']:>9} {result['reused_ratio']:>7} "
+              f"{result['sessions_kept']:>9} {'-':>11}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session memory: throughput, retrieval reuse and memory per session")
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--max-turns", type=int, default=4)
+    parser.add_argument("--max-sessions", type=int, default=50000)
+    parser.add_argument("--k", type=int, default=12, help="reviews retrieved per turn")
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "session_bench", main(args))
@@ -0,0 +1,119 @@
+#Cold start benchmark, for tracking how fast a new container (autoscaling) can take traffic:
+#   import   : `python -X importtime -c "import main"`, total and the slowest top-level imports
+#   main     : `uvicorn main:app` as deployed; time until /health and / first answer. The Gemini/AstraDB
+#              keys are blanked, so the background startup fails fast instead of calling the APIs:
+#              it shows that the page and health checks do not wait for the chain.
+#   stub     : `uvicorn benchmarks.stub_app:app` (stub models, local index, warm-up on); time until
+#              /health, /, /ready and the first /get answer
+#Each target is started --runs times and the median is reported.
+#
+#Run from the project root:
+#   python -m benchmarks.startup_bench --runs 3
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.worker_scaling import build_index
+
+
+def import_times(top: int) -> dict:
+    """
+    Self-reported import times of `import main` (microseconds in -X importtime's stderr).
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                               capture_output=True, text=True, check=True, env=quiet_env())
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue           #header line
+        cumulative[name.rstrip()] = int(cumulative_us)
+    total = cumulative.get(" main", 0)
+    # Imports made by main itself are indented one level (two spaces) deeper than " main"
+    children = {name.strip(): value for name, value in cumulative.items() if name.startswith("   ") and not name.startswith("    ")}
+    slowest = sorted(children.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {"main_ms": round(total / 1000, 1), "slowest_ms": {name: round(value / 1000, 1) for name, value in slowest}}
+
+
+def quiet_env(**overrides) -> dict:
+    env = dict(os.environ, **overrides)
+    env.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+    return env
+
+
+def first_success(client: httpx.Client, method: str, path: str, started: float, deadline: float, **kwargs):
+    while time.perf_counter() < deadline:
+        try:
+            if client.request(method, path, **kwargs).status_code == 200:
+                return round(time.perf_counter() - started, 3)
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def start_once(app: str, env: dict, port: int, stages: list, timeout: float) -> dict:
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            deadline = started + timeout
+            for name, method, path, kwargs in stages:
+                timings[name] = first_success(client, method, path, started, deadline, **kwargs)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return timings
+
+
+def median_of(runs: list) -> dict:
+    return {name: (round(statistics.median(values), 3) if None not in values else None)
+            for name in runs[0] for values in [[run[name] for run in runs]]}
+
+
+def main(args):
+    results = {"import": import_times(args.top)}
+    print(f"import main: {results['import']['main_ms']} ms; slowest imports (ms): {results['import']['slowest_ms']}\n")
+
+    blank_keys = {"GOOGLE_API_KEY": "", "ASTRA_DB_API_ENDPOINT": "", "ASTRA_DB_APPLICATION_TOKEN": "", "ASTRA_DB_KEYSPACE": ""}
+    page_stages = [("health_s", "GET", "/health", {}), ("page_s", "GET", "/", {})]
+    runs = [start_once("main:app", quiet_env(**blank_keys), args.port, page_stages, args.timeout) for _ in range(args.runs)]
+    results["main"] = median_of(runs)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        build_index(index_dir, copies=1, dimension=256)
+        env = quiet_env(STUB_INDEX_DIR=index_dir, STUB_DIMENSION="256", STUB_WARM_UP="1",
+                        STUB_LLM_LATENCY=str(args.llm_latency), STUB_EMBED_LATENCY="0.02")
+        stages = page_stages + [("ready_s", "GET", "/ready", {}),
+                                ("first_answer_s", "POST", "/get", {"data": {"msg": "good budget headphones"}})]
+        runs = [start_once("benchmarks.stub_app:app", env, args.port, stages, args.timeout) for _ in range(args.runs)]
+        results["stub"] = median_of(runs)
+
+    print(f"{'target':<6} {'/health s':>10} {'/ s':>8} {'ready s':>8} {'answer s':>9}")
+    for target in ("main", "stub"):
+        timings = results[target]
+        print(f"{target:<6} {str(timings['health_s']):>10} {str(timings['page_s']):>8} "
+              f"{str(timings.get('ready_s', '-')):>8} {str(timings.get('first_answer_s', '-')):>9}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start: import time and time to first response")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to report")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub LLM latency (also paid by the warm-up)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8767)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "startup_bench", main(args))
@@ -0,0 +1,35 @@
+#The FastAPI app of main.py with the stub LLM and a local index, importable by gunicorn:
+#   STUB_INDEX_DIR=/tmp/index gunicorn -c gunicorn.conf.py benchmarks.stub_app:app
+#The index (saved LocalVectorStore, see benchmarks.worker_scaling) is loaded through the same read-only
+#path as the real server, so with preload it is loaded once in the master and shared by the workers.
+#   STUB_INDEX_DIR     saved local index (required)
+#   STUB_MMAP          1 (default) memory-maps the vectors, 0 reads them into private memory
+#   STUB_LLM_LATENCY   stub LLM time to first token in seconds (default 0.1)
+#   STUB_EMBED_LATENCY stub question embedding latency in seconds (default 0.02)
+#   STUB_WARM_UP       1 sends the warm-up query through the chain at startup (default 0)
+
+import copy
+import os
+import main
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+from config.config_loader import load_config
+from retriever.vector_store import load_vector_store
+from utils.chain_registry import ChainRegistry
+
+config = copy.deepcopy(load_config())
+config["vector_store"] = {"backend": "local",
+                          "local": {"index_path": os.environ["STUB_INDEX_DIR"],
+                                    "mmap": os.getenv("STUB_MMAP", "1") == "1"}}
+config["server"]["warm_up"] = os.getenv("STUB_WARM_UP", "0") == "1"
+
+embeddings = StubEmbeddings(dimension=int(os.getenv("STUB_DIMENSION", "768")),
+                            latency_seconds=float(os.getenv("STUB_EMBED_LATENCY", "0.02")))
+store = load_vector_store(embeddings, config, read_only=True)
+
+main.app.state.registry = ChainRegistry(
+    config=config,
+    retriever=store.as_retriever(search_kwargs={"k": config.get("context", {}).get("fetch_k", 3)}),
+    llm=StubChatModel(latency_seconds=float(os.getenv("STUB_LLM_LATENCY", "0.1")), token_latency_seconds=0.005),
+)
+main.app.state.answer_cache = None      #every request runs the whole chain
+app = main.app
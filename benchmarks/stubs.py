@@ -0,0 +1,357 @@
+#Local stand-ins for the external services (Gemini LLM, AstraDB vector store).
+#They simulate network latency with sleeps, so benchmarks and load tests can run offline and repeatably.
+#A FaultInjector makes a seeded share of the calls slow or failing (tail latency, outages).
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+
+class StubUpstreamError(ConnectionError):
+    pass
+
+
+class FaultInjector:
+    """
+    Seeded faults for the stubs: a share of the calls takes slow_seconds longer, a share fails.
+    The attributes can be changed while a benchmark runs (e.g. error_probability=1.0 for an outage).
+    """
+
+    def __init__(self, slow_probability: float = 0.0, slow_seconds: float = 0.0, error_probability: float = 0.0,
+                 seed: int = 0):
+        self.slow_probability = slow_probability
+        self.slow_seconds = slow_seconds
+        self.error_probability = error_probability
+        self.random = random.Random(seed)
+
+    def draw(self):
+        """
+        (extra seconds, fails) of the next call.
+        """
+        fails = self.random.random() < self.error_probability
+        extra = self.slow_seconds if self.random.random() < self.slow_probability else 0.0
+        return extra, fails
+
+
+def _draw(faults):
+    return faults.draw() if faults is not None else (0.0, False)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model that returns a fixed answer after a simulated latency.
+    `latency_seconds` is the time to the first token, `token_latency_seconds` the time per following token.
+    """
+    response: str = "This is a stub answer about budget headphones with good battery life."
+    latency_seconds: float = 0.2         #simulated time to first token
+    token_latency_seconds: float = 0.0   #simulated time between tokens
+    faults: Any = None                   #FaultInjector: slow or failing calls
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _tokens(self) -> List[str]:
+        words = self.response.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _total_latency(self) -> float:
+        return self.latency_seconds + self.token_latency_seconds * (len(self._tokens()) - 1)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        extra, fails = _draw(self.faults)
+        time.sleep(self._total_latency() + extra)
+        if fails:
+            raise StubUpstreamError("injected LLM failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        extra, fails = _draw(self.faults)
+        await asyncio.sleep(self._total_latency() + extra)
+        if fails:
+            raise StubUpstreamError("injected LLM failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        extra, fails = _draw(self.faults)
+        for i, token in enumerate(self._tokens()):
+            time.sleep(self.latency_seconds + extra if i == 0 else self.token_latency_seconds)
+            if fails:
+                raise StubUpstreamError("injected LLM failure")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        extra, fails = _draw(self.faults)
+        for i, token in enumerate(self._tokens()):
+            await asyncio.sleep(self.latency_seconds + extra if i == 0 else self.token_latency_seconds)
+            if fails:
+                raise StubUpstreamError("injected LLM failure")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic embeddings: a bag of hashed words projected to `dimension` floats,
+    so texts sharing words get similar vectors. Sleeps `latency_seconds` per call.
+    """
+
+    def __init__(self, dimension: int = 256, latency_seconds: float = 0.0):
+        self.dimension = dimension
+        self.latency_seconds = latency_seconds
+        self.calls = 0          #number of (batched) calls, handy for checking caches
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode()).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        time.sleep(self.latency_seconds)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        await asyncio.sleep(self.latency_seconds)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class StubRetriever(BaseRetriever):
+    """
+    Retriever that returns fixed documents after a simulated vector-search round-trip.
+    """
+    documents: List[Document] = []
+    latency_seconds: float = 0.05
+    faults: Any = None                   #FaultInjector: slow or failing calls
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        extra, fails = _draw(self.faults)
+        time.sleep(self.latency_seconds + extra)
+        if fails:
+            raise StubUpstreamError("injected retrieval failure")
+        return list(self.documents)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        extra, fails = _draw(self.faults)
+        await asyncio.sleep(self.latency_seconds + extra)
+        if fails:
+            raise StubUpstreamError("injected retrieval failure")
+        return list(self.documents)
+
+
+def sample_documents() -> List[Document]:
+    """
+    A few product reviews shaped like the documents produced by DataIngestion.transform_data.
+    """
+    return [
+        Document(
+            page_content="Super sound and good looking I like that prize",
+            metadata={"product_name": "BoAt Rockerz 235v2 with ASAP charging Version 5.0 Bluetooth Headset",
+                      "product_rating": 5, "product_summary": "Terrific purchase"},
+        ),
+        Document(
+            page_content="Battery backup is good, bass is average for the price.",
+            metadata={"product_name": "realme Buds Wireless Bluetooth Headset",
+                      "product_rating": 4, "product_summary": "Value-for-money"},
+        ),
+    ]
+
+
+def csv_documents(csv_path: str = "data/flipkart_product_review.csv", copies: int = 1) -> List[Document]:
+    """
+    The real review catalog as Documents (same shape as DataIngestion.transform_data).
+    `copies` > 1 repeats the catalog with distinct ids to simulate a larger one.
+    """
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    documents = []
+    for copy in range(copies):
+        for row in df.itertuples(index=False):
+            review = row.review if copy == 0 else f"{row.review} (copy {copy})"
+            documents.append(Document(
+                page_content=review,
+                metadata={"product_name": row.product_title, "product_rating": int(row.rating),
+                          "product_summary": row.summary},
+                id=hashlib.md5(review.encode()).hexdigest(),
+            ))
+    return documents
+
+
+class StubHTTPError(Exception):
+    """
+    Raise from a stub route to answer with an HTTP error status (e.g. 429 for rate limiting).
+    """
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+
+class StubServiceServer:
+    """
+    Tiny JSON-over-HTTP server running in a background thread. Each route is a function
+    taking the request JSON and returning the response JSON; `latency_seconds` is added to every call
+    to simulate the network distance to the real service.
+    """
+
+    def __init__(self, routes: dict, latency_seconds: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.routes = routes
+        self.latency_seconds = latency_seconds
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"     #keep-alive, like a pooled client talking to AstraDB
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                route = server.routes.get(self.path)
+                if route is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if server.latency_seconds:
+                    time.sleep(server.latency_seconds)
+                try:
+                    payload = json.dumps(route(json.loads(body or b"{}"))).encode()
+                    status = 200
+                except StubHTTPError as e:
+                    payload = json.dumps({"error": str(e)}).encode()
+                    status = e.status
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def post_json(url: str, payload: dict, timeout: float = 30.0) -> dict:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def vector_store_routes(store) -> dict:
+    """
+    Routes that expose an in-process vector store the way a remote vector database would.
+    """
+    def search(request):
+        hits = store.similarity_search_with_score_by_vector(request["vector"], k=request.get("k", 4))
+        return {"hits": [{"id": doc.id, "text": doc.page_content, "metadata": doc.metadata, "score": score}
+                         for doc, score in hits]}
+
+    def insert(request):
+        return {"ids": store.add_embeddings(request["texts"], request["vectors"], request.get("metadatas"),
+                                            request.get("ids"))}
+
+    return {"/search": search, "/insert": insert}
+
+
+def embedding_routes(embeddings: Embeddings, rate_limit_every: int = 0) -> dict:
+    """
+    Route exposing an embedding model over HTTP. With rate_limit_every=N, every Nth call answers 429.
+    """
+    counter = {"calls": 0}
+    lock = threading.Lock()
+
+    def embed(request):
+        with lock:
+            counter["calls"] += 1
+            calls = counter["calls"]
+        if rate_limit_every and calls % rate_limit_every == 0:
+            raise StubHTTPError(429, "Too Many Requests")
+        return {"vectors": embeddings.embed_documents(request["texts"])}
+
+    return {"/embed": embed}
+
+
+class RemoteStubEmbeddings(Embeddings):
+    """
+    Client for a StubServiceServer exposing embedding_routes (stand-in for the Gemini embedding API).
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return post_json(f"{self.url}/embed", {"texts": list(texts)})["vectors"]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class RemoteStubVectorStore(VectorStore):
+    """
+    Client for a StubServiceServer exposing vector_store_routes: every search is an HTTP round-trip,
+    which makes it a local stand-in for AstraDB in benchmarks.
+    """
+
+    def __init__(self, url: str, embedding: Embeddings):
+        self.url = url
+        self.embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None) -> List[str]:
+        return post_json(f"{self.url}/insert", {"texts": list(texts), "vectors": [list(v) for v in embeddings],
+                                                "metadatas": metadatas, "ids": ids})["ids"]
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs) -> List[Document]:
+        hits = post_json(f"{self.url}/search", {"vector": list(embedding), "k": k})["hits"]
+        return [Document(page_content=hit["text"], metadata=hit["metadata"], id=hit["id"]) for hit in hits]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Create the store with a server url instead")
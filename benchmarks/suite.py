@@ -0,0 +1,105 @@
+#Runs the benchmark suite with fixed, quick settings and writes all results to one JSON file, so runs can be
+#compared over time (e.g. before and after a change to main.py or retriever/retrieval.py):
+#   micro : transform (CSV -> Documents), pipelined ingestion, embedding, retrieval, metadata filtering,
+#           context packing, reranking (quality and latency), session memory
+#   macro : cold start, LLM tier routing, tail latency under injected faults, gunicorn worker scaling (RSS/PSS),
+#           load test of the FastAPI app (stub Gemini + local index over the CSV): throughput, p50/p95/p99
+#Every benchmark listed in the README is in SUITE, with smaller settings than the README examples.
+#Every benchmark runs in its own process (clean metrics registry, own peak RSS) with --output.
+#Everything is local and deterministic: stub models, seeded inputs, no API keys.
+#
+#Run from the project root:
+#   python -m benchmarks.suite                                   #-> benchmarks/results/<timestamp>.json
+#   python -m benchmarks.suite --only load_test --output after.json
+#   python -m benchmarks.suite --compare before.json after.json  #numbers that changed by more than --threshold
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.results import run_info
+
+SUITE = {
+    "transform_bench": ["--rows", "200000", "--variants", "after"],
+    "ingest_bench": ["--concurrency", "1", "4", "--copies", "1"],
+    "embedding_bench": ["--queries", "128", "--concurrency", "16", "--latency", "0.02"],
+    "retrieval_bench": ["--queries", "200", "--copies", "5"],
+    "filter_bench": ["--copies", "5", "--repeat", "10"],
+    "context_bench": ["--copies", "3"],
+    "rerank_eval": ["--copies", "2", "--top-k", "3", "5", "--depth", "0", "20"],
+    "session_bench": ["--sessions", "5000", "--turns", "6"],
+    "routing_bench": ["--requests", "80", "--concurrency", "16"],
+    "startup_bench": ["--runs", "3"],
+    "resilience_bench": ["--requests", "450", "--rate", "30"],
+    "worker_scaling": ["--workers", "1", "2", "--copies", "10", "--requests", "200"],
+    "load_test": ["--local-index", "--requests", "200", "--concurrency", "1", "8", "32",
+                  "--llm-latency", "0.1", "--token-latency", "0.005", "--embed-latency", "0.02"],
+}
+
+
+def run_suite(names) -> dict:
+    suite = {"run": run_info(), "benchmarks": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            output = os.path.join(tmp, f"{name}.json")
+            print(f"--- {name} {' '.join(SUITE[name])}", flush=True)
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-m", f"benchmarks.{name}", *SUITE[name], "--output", output], check=True)
+            with open(output) as f:
+                result = json.load(f)
+            result["wall_seconds"] = round(time.perf_counter() - start, 2)
+            suite["benchmarks"][name] = result
+    return suite
+
+
+def flatten(value, prefix: str = "") -> dict:
+    """
+    {"load_test.results.levels.0.rps": 37.8, ...}: numeric leaves of a results document.
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+        return {prefix: value} if is_number else {}
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def compare(before_path: str, after_path: str, threshold: float):
+    with open(before_path) as f:
+        before = flatten(json.load(f)["benchmarks"])
+    with open(after_path) as f:
+        after = flatten(json.load(f)["benchmarks"])
+    print(f"{'metric':<64} {'before':>12} {'after':>12} {'change':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        if ".args." in key or ".run." in key or key.endswith("wall_seconds"):
+            continue
+        old, new = before[key], after[key]
+        change = (new - old) / abs(old) if old else (0.0 if new == old else float("inf"))
+        if abs(change) >= threshold:
+            print(f"{key[:64]:<64} {old:>12} {new:>12} {change:>+8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark suite or compare two suite runs")
+    parser.add_argument("--only", nargs="+", choices=list(SUITE), default=list(SUITE))
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two suite result files")
+    parser.add_argument("--threshold", type=float, default=0.05, help="smallest relative change shown by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.threshold)
+    else:
+        output = args.output or os.path.join("benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(run_suite(args.only), f, indent=2)
+        print(f"suite results written to {output}")
@@ -0,0 +1,106 @@
+#CSV -> Document transformation benchmark on a synthetic review file.
+#"before" is the previous implementation (full read_csv + iterrows + list of dicts + list of Documents),
+#"after" is the streaming, column-wise document_stream.iter_document_batches.
+#Each variant runs in its own process so the reported peak RSS is not shared between them.
+#
+#Run from the project root:
+#   python -m benchmarks.transform_bench --rows 2000000
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from benchmarks.results import add_output_argument, maybe_write_results
+
+
+def make_synthetic_csv(path: str, rows: int, source: str = "data/flipkart_product_review.csv"):
+    """
+    Write `rows` reviews sampled from the real CSV, each with a unique suffix so ids differ.
+    """
+    base = pd.read_csv(source)
+    rng = np.random.default_rng(0)
+    written = 0
+    chunk = 100_000
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        while written < rows:
+            size = min(chunk, rows - written)
+            sample = base.iloc[rng.integers(0, len(base), size)].reset_index(drop=True)
+            sample["review"] = sample["review"] + " #" + pd.Series(range(written, written + size)).astype(str)
+            sample.to_csv(file, header=(written == 0), index=False)
+            written += size
+
+
+def transform_before(csv_path: str) -> int:
+    product_data = pd.read_csv(csv_path)
+    product_list = []
+    for _, row in product_data.iterrows():
+        product_list.append({"product_name": row["product_title"], "product_rating": row["rating"],
+                             "product_summary": row["summary"], "product_review": row["review"]})
+    documents = []
+    for entry in product_list:
+        metadata = {"product_name": entry["product_name"], "product_rating": entry["product_rating"],
+                    "product_summary": entry["product_summary"]}
+        doc_id = hashlib.md5(entry["product_review"].encode()).hexdigest()
+        documents.append(Document(page_content=entry["product_review"], metadata=metadata, id=doc_id))
+    return len(documents)
+
+
+def transform_after(csv_path: str, chunk_size: int) -> int:
+    from data_ingestion.document_stream import iter_document_batches
+    count = 0
+    for batch in iter_document_batches(csv_path, chunk_size):
+        count += len(batch)     #the batch would be handed to the vector store writer here
+    return count
+
+
+def run_worker(variant: str, csv_path: str, chunk_size: int):
+    start = time.perf_counter()
+    rows = transform_before(csv_path) if variant == "before" else transform_after(csv_path, chunk_size)
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024    #kilobytes on Linux
+    print(json.dumps({"variant": variant, "rows": rows, "seconds": round(elapsed, 2),
+                      "rows_per_second": round(rows / elapsed), "peak_rss_mb": round(peak_rss_mb, 1)}))
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "reviews.csv")
+        print(f"Writing {args.rows} synthetic reviews...")
+        make_synthetic_csv(csv_path, args.rows)
+        print(f"CSV size: {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+        print(f"{'variant':<8} {'rows/s':>10} {'seconds':>9} {'peak RSS MB':>12}")
+        results = []
+        for variant in args.variants:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.transform_bench", "--worker", variant,
+                 "--csv", csv_path, "--chunk-size", str(args.chunk_size)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{variant:<8} {result['rows_per_second']:>10} {result['seconds']:>9} {result['peak_rss_mb']:>12}")
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CSV -> Document transformation")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--variants", nargs="+", default=["before", "after"])
+    parser.add_argument("--worker", choices=["before", "after"], help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.worker, args.csv, args.chunk_size)
+    else:
+        maybe_write_results(args, "transform_bench", main(args))
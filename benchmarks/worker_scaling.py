@@ -0,0 +1,140 @@
+#Multi-worker scaling test of the gunicorn serving mode (gunicorn.conf.py) with the stub app
+#(benchmarks/stub_app.py): per-worker memory and total throughput as the worker count grows.
+#   shared  : preload + memory-mapped index, loaded once in the master and shared by the workers
+#   private : no preload, every worker loads its own in-memory copy of the index (the naive setup)
+#Memory is read from /proc/<pid>/smaps_rollup after the load run:
+#   RSS counts every page a worker touches, shared or not; PSS splits shared pages between the processes
+#   using them, so the PSS total (master + workers) is the real memory cost of the deployment.
+#Throughput is bounded per worker by server.max_concurrency (the stub LLM mostly waits), so it should
+#grow with the worker count until the CPUs are saturated.
+#
+#Run from the project root (Linux):
+#   python -m benchmarks.worker_scaling --workers 1 2 4 --copies 40 --clients 64 --requests 400
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from benchmarks.load_test import run_level
+from benchmarks.results import add_output_argument, maybe_write_results
+from benchmarks.stubs import StubEmbeddings, csv_documents
+from retriever.local_index import LocalVectorStore
+
+
+def build_index(path: str, copies: int, dimension: int) -> int:
+    documents = csv_documents(copies=copies)
+    texts = [doc.page_content for doc in documents]
+    store = LocalVectorStore(StubEmbeddings(dimension=dimension))
+    store.add_embeddings(texts, StubEmbeddings(dimension=dimension).embed_documents(texts),
+                         [doc.metadata for doc in documents], [doc.id for doc in documents])
+    store.save(path)
+    return len(documents)
+
+
+def memory_mb(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0]) / 1024      #kB
+    return values
+
+
+def worker_pids(master_pid: int) -> list:
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+async def wait_until_serving(base_url: str, process, workers: int, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            try:
+                if (await client.get("/stats")).status_code == 200 and len(worker_pids(process.pid)) == workers:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError("gunicorn did not start in time")
+
+
+async def run_deployment(args, index_dir: str, workers: int, mode: str) -> dict:
+    port = args.port
+    env = dict(os.environ, STUB_INDEX_DIR=index_dir, STUB_DIMENSION=str(args.dimension),
+               STUB_MMAP="1" if mode == "shared" else "0", PRELOAD="1" if mode == "shared" else "0",
+               WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}",
+               STUB_LLM_LATENCY=str(args.llm_latency), STUB_EMBED_LATENCY=str(args.embed_latency))
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "benchmarks.stub_app:app"],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_serving(base_url, process, workers)
+        # Idle connections expire before the server's keep-alive timeout (5 s), so none is reused as it closes
+        limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients, keepalive_expiry=1)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            await run_level(client, args.clients, args.clients)           #warm every worker up
+            load = await run_level(client, args.requests, args.clients)
+        per_worker = [memory_mb(pid) for pid in worker_pids(process.pid)]
+        master = memory_mb(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "rps": load["rps"],
+        "p50_ms": load["p50_ms"],
+        "p95_ms": load["p95_ms"],
+        "p99_ms": load["p99_ms"],
+        "status": load["status"],
+        "worker_rss_mb": round(sum(m["rss"] for m in per_worker) / len(per_worker), 1),
+        "worker_pss_mb": round(sum(m["pss"] for m in per_worker) / len(per_worker), 1),
+        "master_pss_mb": round(master["pss"], 1),
+        "total_pss_mb": round(master["pss"] + sum(m["pss"] for m in per_worker), 1),
+    }
+
+
+async def run(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as index_dir:
+        documents = build_index(index_dir, args.copies, args.dimension)
+        print(f"index: {documents} reviews, dim={args.dimension}; {args.clients} clients, {args.requests} requests; "
+              f"{os.cpu_count()} CPUs\n")
+        print(f"{'mode':<8} {'workers':>7} {'rps':>7} {'p50 ms':>7} {'p99 ms':>7} "
+              f"{'RSS/worker':>10} {'PSS/worker':>10} {'PSS total':>10}")
+        for mode in args.modes:
+            for workers in args.workers:
+                result = await run_deployment(args, index_dir, workers, mode)
+                results.append(result)
+                print(f"{mode:<8} {workers:>7} {result['rps']:>7} {result['p50_ms']:>7} {result['p99_ms']:>7} "
+                      f"{result['worker_rss_mb']:>10} {result['worker_pss_mb']:>10} {result['total_pss_mb']:>10}")
+    return results
+
+
+def main(args):
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="gunicorn worker scaling: per-worker memory and throughput")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["shared", "private"], default=["shared", "private"])
+    parser.add_argument("--copies", type=int, default=40, help="repeat the CSV catalog to get a bigger index")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8766)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    maybe_write_results(args, "worker_scaling", main(args))
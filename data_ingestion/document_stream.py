@@ -0,0 +1,47 @@
+#Streaming CSV -> LangChain Document conversion used by the ingestion pipeline.
+#The CSV is read in chunks and every chunk is converted with column operations (no iterrows and no
+#intermediate list of dicts), so peak memory depends on the chunk size, not on the size of the file.
+
+import hashlib
+from typing import Iterator, List
+import pandas as pd
+from langchain_core.documents import Document
+
+EXPECTED_COLUMNS = {"product_title", "rating", "summary", "review"}
+
+
+def validate_columns(csv_path: str):
+    """
+    Check the CSV header without loading the rows.
+    """
+    columns = set(pd.read_csv(csv_path, nrows=0).columns)
+    if not EXPECTED_COLUMNS.issubset(columns):
+        raise ValueError(f"CSV must contain columns: {EXPECTED_COLUMNS}")
+
+
+def frame_to_documents(frame: pd.DataFrame) -> List[Document]:
+    """
+    Convert a DataFrame (or CSV chunk) to Documents: review as page_content, product title, rating
+    and summary as metadata, and the MD5 of the review text as id (same ids as before, to avoid duplicates).
+    """
+    reviews = frame["review"].fillna("").astype(str).tolist()
+    md5 = hashlib.md5
+    ids = [md5(review.encode()).hexdigest() for review in reviews]
+    # .tolist() turns the numpy scalars into plain Python values (JSON friendly metadata)
+    names = frame["product_title"].tolist()
+    ratings = frame["rating"].tolist()
+    summaries = frame["summary"].tolist()
+    return [
+        Document(page_content=review, metadata={"product_name": name, "product_rating": rating,
+                                                "product_summary": summary}, id=doc_id)
+        for review, name, rating, summary, doc_id in zip(reviews, names, ratings, summaries, ids)
+    ]
+
+
+def iter_document_batches(csv_path: str, chunk_size: int = 5000) -> Iterator[List[Document]]:
+    """
+    Yield lists of at most `chunk_size` Documents while reading the CSV chunk by chunk.
+    """
+    validate_columns(csv_path)
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, usecols=list(EXPECTED_COLUMNS)):
+        yield frame_to_documents(chunk)
@@ -1,31 +1,39 @@
 import os
-import pandas as pd
+import argparse
 from dotenv import load_dotenv
-from typing import List, Tuple
+from typing import Iterable, List
 from langchain_core.documents import Document
-from langchain_astradb import AstraDBVectorStore
 from utils.model_loader import ModelLoader
 from config.config_loader import load_config
-import hashlib #for generating unique IDs for documents (to avoid duplicates)
+from utils.answer_cache import touch_ingestion_stamp
+from retriever.vector_store import load_vector_store, save_vector_store, required_env_vars, get_backend
+from data_ingestion.manifest import IngestionManifest, document_hash
+from data_ingestion.document_stream import iter_document_batches, validate_columns
+from data_ingestion.pipeline_engine import IngestionEngine
+from retriever.bm25 import BM25Builder
+from retriever.catalog import ProductCatalog
+from utils.logger import get_logger, setup_logging
+
+logger = get_logger(__name__)
 
 class DataIngestion:
     """
-    Class to handle data transformation and ingestion into AstraDB vector store.
+    Class to handle data transformation and ingestion into the vector store (AstraDB or local index).
     """
 
     def __init__(self):
         """
         Initialize environment variables, embedding model, and set CSV file path.
         """
-        print("Initializing DataIngestion pipeline...")
+        logger.info("Initializing DataIngestion pipeline...")
         self.model_loader=ModelLoader()
+        self.config=load_config()
         self._load_env_variables()
         """Calls the private method _load_env_variables() defined later in the class.
          Even though it appears "later" in the file, Python doesn't care — 
          it just needs to know the method exists in the class, and it will resolve it at runtime."""
         self.csv_path = self._get_csv_path()
-        self.product_data = self._load_csv()
-        self.config=load_config()
+        validate_columns(self.csv_path)   #only the header is read here, rows are streamed later
 
     def _load_env_variables(self):       #wherever you _ in the starting of the function it is a private function and we don't want to expose it to the outside world (encapsulation) in oops concept
         """
@@ -33,7 +41,7 @@ class DataIngestion:
         """
         load_dotenv()
         
-        required_vars = ["GOOGLE_API_KEY", "ASTRA_DB_API_ENDPOINT", "ASTRA_DB_APPLICATION_TOKEN", "ASTRA_DB_KEYSPACE"]
+        required_vars = required_env_vars(self.config)   #AstraDB variables are only needed for the astra backend
         
         missing_vars = [var for var in required_vars if os.getenv(var) is None]
         if missing_vars:
@@ -58,71 +66,199 @@ class DataIngestion:
 
         return csv_path
 
-    def _load_csv(self):
+    def iter_documents(self):
         """
-        Load product data from CSV.
+        Stream the CSV as batches of LangChain Document objects (ingestion.chunk_size rows per batch).
+        Memory stays flat no matter how large the CSV is.
         """
-        df = pd.read_csv(self.csv_path)
-        expected_columns = {'product_title', 'rating', 'summary', 'review'}
-
-        if not expected_columns.issubset(set(df.columns)):
-            raise ValueError(f"CSV must contain columns: {expected_columns}")
-
-        return df
+        chunk_size = self.config.get("ingestion", {}).get("chunk_size", 5000)
+        return iter_document_batches(self.csv_path, chunk_size)
 
     def transform_data(self):
         """
         Transform product data into list of LangChain Document objects.
         """
-        product_list = []
-
-        for _, row in self.product_data.iterrows():   #_ we are getting index, we don't need it
-            product_entry = {
-                "product_name": row['product_title'],
-                "product_rating": row['rating'],
-                "product_summary": row['summary'],
-                "product_review": row['review']
-            }
-            product_list.append(product_entry)
-
-        documents = []
-        for entry in product_list:
-            metadata = {
-                "product_name": entry["product_name"],
-                "product_rating": entry["product_rating"],
-                "product_summary": entry["product_summary"]
-            }
-            doc_id = hashlib.md5(entry["product_review"].encode()).hexdigest() ## (To avoid duplicates)Generate a unique ID for the document using MD5 hash of the review text
-            doc = Document(page_content=entry["product_review"], metadata=metadata,id=doc_id)  
-            documents.append(doc)
-
-        print(f"Transformed {len(documents)} documents.")
+        documents = [doc for batch in self.iter_documents() for doc in batch]
+        logger.info("Transformed %d documents.", len(documents))
         return documents
 
     def store_in_vector_db(self, documents: List[Document]):
         """
-        Store documents into AstraDB vector store. configurations
+        Store documents into the configured vector store (AstraDB collection or local index).
         """
-        collection_name=self.config["astra_db"]["collection_name"]
-        vstore = AstraDBVectorStore(
-            embedding= self.model_loader.load_embeddings(),
-            collection_name=collection_name,
-            api_endpoint=self.db_api_endpoint,
-            token=self.db_application_token,
-            namespace=self.db_keyspace,
-        )
+        return self.store_batches([documents])
+
+    def store_batches(self, document_batches: Iterable[List[Document]]):
+        """
+        Write document batches to the configured vector store as they are produced, and record
+        them in the manifest so the next incremental run only sends the differences.
+        Documents committed by earlier runs but no longer in the CSV are deleted afterwards
+        (the manifest keeps them until then, so an interrupted run still knows about them).
+        """
+        embeddings = self.model_loader.load_embeddings()
+        vstore = load_vector_store(embeddings, self.config)
         #vstore.delete_collection()   #clear everything in that collection — only use it for development/testing.
+        manifest = self._open_manifest()
+        committed = manifest.load()
 
-        inserted_ids = vstore.add_documents(documents)
-        print(f"Successfully inserted {len(inserted_ids)} documents into AstraDB.")
+        builders = self._index_builders()
+        seen = set()
+        def unique_batches():
+            for batch in document_batches:
+                # Duplicate reviews share one id: keep the first one, like the incremental mode does
+                unique = [doc for doc in batch if not (doc.id in seen or seen.add(doc.id))]
+                for builder, _ in builders:
+                    builder.add_documents(unique)
+                yield unique
+
+        inserted_ids = self._write_documents(embeddings, vstore, unique_batches(), manifest)
+        removed = self._delete_removed(vstore, manifest, [doc_id for doc_id in committed if doc_id not in seen])
+        save_vector_store(vstore, self.config)     #one compacted copy for the servers, replacing the checkpoints
+        self._save_indexes(builders)
+        manifest.close()
+        logger.info("Successfully inserted %d documents into the vector store, %d removed.", len(inserted_ids), len(removed))
         return vstore, inserted_ids
 
-    def run_pipeline(self):
+    def _write_documents(self, embeddings, vstore, document_batches: Iterable[List[Document]], manifest):
+        """
+        Push the batches through the pipelined engine (parallel embedding and writing).
+        Written batches are committed to the manifest at checkpoints: after every batch for AstraDB,
+        every `checkpoint_batches` batches for the local index (which has to be saved to disk first).
+        A local checkpoint only appends the rows written since the previous one, so its cost does not
+        grow with the index; the caller saves the compacted index once at the end.
+        """
+        ingestion_config = self.config.get("ingestion", {})
+        checkpoint_batches = 1 if get_backend(self.config) == "astra" else ingestion_config.get("checkpoint_batches", 20)
+        engine = IngestionEngine.from_config(embeddings, vstore, self.config)
+        pending = []            #written batches not yet committed to the manifest
+        written_ids = []
+
+        def checkpoint():
+            save_vector_store(vstore, self.config, checkpoint=True)   #the local index is written to disk, AstraDB persists by itself
+            manifest.commit_upserts((doc.id, document_hash(doc)) for batch in pending for doc in batch)
+            pending.clear()
+
+        def on_written(batch):
+            pending.append(batch)
+            written_ids.extend(doc.id for doc in batch)
+            if len(pending) >= checkpoint_batches:
+                checkpoint()
+
+        engine.run(document_batches, on_written)
+        if pending:
+            checkpoint()
+        return written_ids
+
+    def _delete_removed(self, vstore, manifest, removed: List[str]) -> List[str]:
         """
-        Run the full data ingestion pipeline: transform data and store into vector DB.
+        Delete documents that are no longer in the CSV, in batches, each committed to the manifest once deleted.
         """
-        documents = self.transform_data()
-        vstore, inserted_ids = self.store_in_vector_db(documents)
+        batch_size = self.config.get("ingestion", {}).get("batch_size", 100)
+        for start in range(0, len(removed), batch_size):
+            batch = removed[start:start + batch_size]
+            vstore.delete(ids=batch)
+            save_vector_store(vstore, self.config, checkpoint=True)
+            manifest.commit_deletes(batch)
+            logger.info("Deleted %d/%d documents.", min(start + batch_size, len(removed)), len(removed))
+        return removed
+
+    def _index_builders(self):
+        """
+        (builder, save function) pairs fed with every unique document while the CSV streams through:
+        the product catalog (names and per-product aggregates) and the BM25 index of the hybrid retriever.
+        """
+        hybrid_config = self.config.get("retriever", {}).get("hybrid", {})
+        builders = [(ProductCatalog(), self._save_catalog)]
+        if hybrid_config.get("enabled", False):
+            builders.append((BM25Builder(name_weight=hybrid_config.get("name_weight", 2)), self._save_bm25))
+        return builders
+
+    def _save_indexes(self, builders):
+        for builder, save in builders:
+            save(builder)
+
+    def _save_bm25(self, builder):
+        """
+        Build the BM25 index and write it next to the other ingestion outputs (loaded by the Retriever).
+        """
+        index_path = self.config["retriever"]["hybrid"].get("index_path", "data/bm25_index")
+        index = builder.build()
+        index.save(index_path)
+        logger.info("BM25 index: %d documents, %d terms saved to %s", len(index), len(index.vocabulary), index_path)
+
+    def _save_catalog(self, catalog):
+        catalog_path = self.config.get("catalog", {}).get("path", "data/product_catalog.json")
+        catalog.save(catalog_path)
+        logger.info("Product catalog: %d products saved to %s", len(catalog), catalog_path)
+
+    def _open_manifest(self):
+        """
+        Open the manifest of ingested content hashes for the configured vector store.
+        """
+        backend = get_backend(self.config)
+        if backend == "astra":
+            target = f"astra:{self.config['astra_db']['collection_name']}"
+        else:
+            target = f"{backend}:{self.config['vector_store'].get('local', {}).get('index_path', 'data/local_index')}"
+        manifest_path = self.config.get("ingestion", {}).get("manifest_path", "data/ingestion_manifest.sqlite")
+        return IngestionManifest(manifest_path, target)
+
+    def store_incremental(self, document_batches: Iterable[List[Document]]):
+        """
+        Only upsert new or changed documents and delete the ones removed from the CSV.
+        Work is done in batches; a batch is recorded in the manifest only after the vector store
+        accepted it, so re-running after an interruption resumes from the last committed batch.
+        Only the changed documents and the ids/hashes are kept in memory, not the whole CSV.
+        """
+        manifest = self._open_manifest()
+        committed = manifest.load()
+        embeddings = self.model_loader.load_embeddings()
+        vstore = load_vector_store(embeddings, self.config)
+
+        builders = self._index_builders()     #rebuilt from every document, the CSV is streamed anyway
+        seen = set()
+        def changed_batches():
+            for batch in document_batches:
+                # duplicate reviews collapse to one id
+                unique = [doc for doc in batch if not (doc.id in seen or seen.add(doc.id))]
+                for builder, _ in builders:
+                    builder.add_documents(unique)
+                yield [doc for doc in unique if committed.get(doc.id) != document_hash(doc)]
+
+        # same id -> the stored document is replaced
+        upserted_ids = self._write_documents(embeddings, vstore, changed_batches(), manifest)
+
+        removed = self._delete_removed(vstore, manifest, [doc_id for doc_id in committed if doc_id not in seen])
+        if upserted_ids or removed:
+            save_vector_store(vstore, self.config)
+        self._save_indexes(builders)
+
+        logger.info("Incremental ingestion: %d new/changed, %d removed, %d unchanged documents.",
+                    len(upserted_ids), len(removed), len(seen) - len(upserted_ids))
+        manifest.close()
+        return vstore, upserted_ids, removed
+
+    def run_pipeline(self, incremental: bool = None):
+        """
+        Run the data ingestion pipeline: transform data and store into vector DB.
+        incremental=True only sends the rows that changed since the last run
+        (default: ingestion.mode in config.yaml).
+        """
+        if incremental is None:
+            incremental = self.config.get("ingestion", {}).get("mode", "full") == "incremental"
+
+        # Documents are streamed from the CSV straight into the vector store writer
+        if incremental:
+            vstore, upserted_ids, removed_ids = self.store_incremental(self.iter_documents())
+            changed = bool(upserted_ids or removed_ids)
+        else:
+            vstore, inserted_ids = self.store_batches(self.iter_documents())
+            changed = True
+
+        # Tell running servers that their cached answers may be stale
+        invalidation_file = self.config.get("cache", {}).get("invalidation_file")
+        if invalidation_file and changed:
+            touch_ingestion_stamp(invalidation_file)
 
         # Optionally do a quick search
         query = "Can you tell me the low budget headphone?"
@@ -135,8 +271,14 @@ class DataIngestion:
 # Run if this file is executed directly
 #While running the script, it will execute the code inside this block.
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the product reviews into the vector store")
+    parser.add_argument("--incremental", action="store_true", default=None, help="only upsert/delete changed rows")
+    parser.add_argument("--full", dest="incremental", action="store_false", help="re-ingest the whole CSV")
+    args = parser.parse_args()
+
+    setup_logging(load_config())
     ingestion = DataIngestion()    #Loading this class
-    ingestion.run_pipeline()     #running this method of this class
+    ingestion.run_pipeline(incremental=args.incremental)     #running this method of this class
 
 
 #We have run this code multiple times and hence the DB is updating with same data each time we run the code.
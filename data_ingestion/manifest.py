@@ -0,0 +1,65 @@
+#Local record of what has already been written to the vector store, used by incremental ingestion.
+#For every document id we keep a hash of its content (review text + metadata); comparing it with the
+#current CSV tells which rows are new, changed or removed. Each batch is committed only after it was
+#written to the vector store, so an interrupted run resumes from the last committed batch.
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, Tuple
+from langchain_core.documents import Document
+
+
+def document_hash(document: Document) -> str:
+    """
+    Hash of everything we store for a document, so a change in rating or summary is also detected.
+    """
+    payload = json.dumps([document.page_content, document.metadata], sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    """
+    SQLite table of (target, doc_id, content_hash). `target` identifies the vector store
+    (backend + collection), so switching backends starts from an empty manifest.
+    """
+
+    def __init__(self, path: str, target: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.target = target
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " target TEXT NOT NULL, doc_id TEXT NOT NULL, content_hash TEXT NOT NULL,"
+            " PRIMARY KEY (target, doc_id))"
+        )
+        self._conn.commit()
+
+    def load(self) -> Dict[str, str]:
+        """
+        Return {doc_id: content_hash} of everything committed for this target.
+        """
+        rows = self._conn.execute("SELECT doc_id, content_hash FROM documents WHERE target = ?", (self.target,))
+        return dict(rows.fetchall())
+
+    def commit_upserts(self, items: Iterable[Tuple[str, str]]):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                [(self.target, doc_id, content_hash) for doc_id, content_hash in items],
+            )
+
+    def commit_deletes(self, doc_ids: Iterable[str]):
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM documents WHERE target = ? AND doc_id = ?",
+                [(self.target, doc_id) for doc_id in doc_ids],
+            )
+
+    def reset(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM documents WHERE target = ?", (self.target,))
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,249 @@
+#Pipelined ingestion engine: overlaps embedding calls with vector store writes.
+#
+#   producer thread -> [embed queue] -> N embedding workers -> [write queue] -> M writer workers -> main thread
+#
+#Both queues are bounded, so a slow stage makes the stages before it wait (backpressure) instead of
+#piling batches up in memory. Calls that fail with a rate-limit error are retried with exponential backoff.
+#The main thread receives every written batch (on_written callback), e.g. to commit it to the manifest.
+
+import queue
+import random
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+from langchain_core.documents import Document
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_STOP = object()     #sentinel telling a worker to exit
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    True for HTTP 429 / quota errors from the embedding API or the vector store.
+    """
+    for attribute in ("code", "status_code", "status"):
+        if getattr(error, attribute, None) == 429:
+            return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("429", "rate limit", "ratelimit", "resourceexhausted",
+                                             "resource exhausted", "quota", "too many requests"))
+
+
+def rebatch(document_batches: Iterable[List[Document]], batch_size: int):
+    """
+    Re-cut an iterable of document lists into lists of exactly `batch_size` (the last may be shorter).
+    """
+    pending = []
+    for batch in document_batches:
+        pending.extend(batch)
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            pending = pending[batch_size:]
+    if pending:
+        yield pending
+
+
+class IngestionEngine:
+    """
+    Embeds and writes document batches with bounded concurrency on both stages.
+
+    When the vector store accepts precomputed vectors (add_embeddings) they are passed straight to it.
+    Otherwise the embedding stage only pays off when the embeddings are cached (CachedEmbeddings):
+    it fills the cache so that the store's own embedding call during add_documents is a local lookup.
+    Without either, embedding is left to the writers so no text is embedded twice.
+    """
+
+    def __init__(self, embeddings, vstore, batch_size: int = 100, embed_workers: int = 4, write_workers: int = 4,
+                 queue_size: int = 8, max_retries: int = 5, backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 30.0, report_every_seconds: float = 5.0):
+        self.embeddings = embeddings
+        self.vstore = vstore
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+        self.write_workers = write_workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.report_every_seconds = report_every_seconds
+        self.retries = 0
+        self._retry_lock = threading.Lock()
+
+        from utils.embedding_cache import CachedEmbeddings
+        self.pass_vectors = hasattr(vstore, "add_embeddings")
+        self.precompute = self.pass_vectors or isinstance(embeddings, CachedEmbeddings)
+
+    @classmethod
+    def from_config(cls, embeddings, vstore, config: dict):
+        ingestion_config = config.get("ingestion", {})
+        return cls(
+            embeddings, vstore,
+            batch_size=ingestion_config.get("batch_size", 100),
+            embed_workers=ingestion_config.get("embed_workers", 4),
+            write_workers=ingestion_config.get("write_workers", 4),
+            queue_size=ingestion_config.get("queue_size", 8),
+            max_retries=ingestion_config.get("max_retries", 5),
+            backoff_seconds=ingestion_config.get("backoff_seconds", 1.0),
+        )
+
+    def _with_retry(self, func, *args):
+        """
+        Call func(*args), retrying rate-limit errors with exponential backoff (plus jitter).
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                with self._retry_lock:
+                    self.retries += 1
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt))
+                time.sleep(delay * (0.5 + random.random() / 2))
+
+    def _embed(self, batch: List[Document]):
+        if not self.precompute:
+            return None
+        return self._with_retry(self.embeddings.embed_documents, [doc.page_content for doc in batch])
+
+    def _write(self, batch: List[Document], vectors):
+        ids = [doc.id for doc in batch]
+        if self.pass_vectors:
+            self._with_retry(self.vstore.add_embeddings, [doc.page_content for doc in batch], vectors,
+                             [doc.metadata for doc in batch], ids)
+        else:
+            self._with_retry(lambda: self.vstore.add_documents(batch, ids=ids))
+
+    def run(self, document_batches: Iterable[List[Document]],
+            on_written: Optional[Callable[[List[Document]], None]] = None) -> dict:
+        """
+        Push every document through embed -> write. Returns a throughput report.
+        The first error stops the pipeline and is re-raised here.
+        """
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        done_queue = queue.Queue()
+        stop = threading.Event()
+        errors = []
+        timings = {"embed_seconds": 0.0, "write_seconds": 0.0}
+        timings_lock = threading.Lock()
+
+        def put(target, item):
+            # Blocking put that gives up when the pipeline is stopping (so no thread hangs on a full queue)
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fail(error):
+            errors.append(error)
+            stop.set()
+
+        def producer():
+            try:
+                for batch in rebatch(document_batches, self.batch_size):
+                    if not put(embed_queue, batch):
+                        return
+            except Exception as e:
+                fail(e)
+            finally:
+                for _ in range(self.embed_workers):
+                    embed_queue.put(_STOP)
+
+        def embed_worker():
+            while True:
+                batch = embed_queue.get()
+                if batch is _STOP or stop.is_set():
+                    break
+                try:
+                    start = time.perf_counter()
+                    vectors = self._embed(batch)
+                    with timings_lock:
+                        timings["embed_seconds"] += time.perf_counter() - start
+                except Exception as e:
+                    fail(e)
+                    break
+                if not put(write_queue, (batch, vectors)):
+                    break
+            # drain so the producer is never blocked on a full queue after a failure
+            while stop.is_set() and not embed_queue.empty():
+                embed_queue.get_nowait()
+
+        def write_worker():
+            while True:
+                item = write_queue.get()
+                if item is _STOP or stop.is_set():
+                    break
+                batch, vectors = item
+                try:
+                    start = time.perf_counter()
+                    self._write(batch, vectors)
+                    with timings_lock:
+                        timings["write_seconds"] += time.perf_counter() - start
+                except Exception as e:
+                    fail(e)
+                    break
+                done_queue.put(batch)
+
+        start = time.perf_counter()
+        producer_thread = threading.Thread(target=producer, daemon=True)
+        embed_threads = [threading.Thread(target=embed_worker, daemon=True) for _ in range(self.embed_workers)]
+        write_threads = [threading.Thread(target=write_worker, daemon=True) for _ in range(self.write_workers)]
+        for thread in [producer_thread, *embed_threads, *write_threads]:
+            thread.start()
+
+        def close_writers():
+            for thread in embed_threads:
+                thread.join()
+            for _ in range(self.write_workers):
+                write_queue.put(_STOP)
+        closer = threading.Thread(target=close_writers, daemon=True)
+        closer.start()
+
+        documents = batches = 0
+        next_report = start + self.report_every_seconds
+        while True:
+            try:
+                batch = done_queue.get(timeout=0.1)
+            except queue.Empty:
+                if not any(thread.is_alive() for thread in write_threads) and done_queue.empty():
+                    break
+                continue
+            if on_written is not None and not stop.is_set():
+                try:
+                    on_written(batch)
+                except Exception as e:
+                    fail(e)
+            documents += len(batch)
+            batches += 1
+            if time.perf_counter() >= next_report:
+                elapsed = time.perf_counter() - start
+                logger.info("Ingestion progress: %d documents in %.1fs (%.1f docs/s, %d retries)",
+                            documents, elapsed, documents / elapsed, self.retries)
+                next_report += self.report_every_seconds
+
+        stop.set()
+        producer_thread.join(timeout=1)
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - start
+        report = {
+            "documents": documents,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "docs_per_second": round(documents / elapsed, 1) if elapsed else 0.0,
+            "retries": self.retries,
+            "embed_seconds": round(timings["embed_seconds"], 3),
+            "write_seconds": round(timings["write_seconds"], 3),
+        }
+        logger.info("Ingestion finished: %s", report)
+        return report
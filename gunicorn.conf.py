@@ -0,0 +1,31 @@
+#Production serving mode: one gunicorn master and N uvicorn worker processes.
+#   gunicorn -c gunicorn.conf.py main:app
+#With preload (server.preload in config.yaml) the master imports the app and loads the read-only indexes
+#(local vector index, BM25, product catalog - utils/shared_resources.py) once before forking, so the
+#workers share them (memory-mapped files + copy-on-write) instead of each loading its own copy.
+#Everything with sockets or threads (Gemini/AstraDB clients, embedding cache, answer cache, limiter) is
+#created per worker in the FastAPI lifespan, after the fork. Each worker bounds its Gemini connection
+#pool (server.http_pool), so the process count does not multiply open connections without limit.
+#
+#Environment overrides: WEB_CONCURRENCY (workers), BIND (default 0.0.0.0:8000), PRELOAD (1/0).
+
+import os
+from config.config_loader import load_config
+
+_config = load_config()
+_server = _config.get("server", {})
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", _server.get("workers", 2)))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD", "1" if _server.get("preload", True) else "0") == "1"
+timeout = 120                  #LLM answers can take a while; a stuck worker is restarted after this
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # Runs in the master after the app was (pre)loaded and before the workers are forked
+    if preload_app:
+        from utils.shared_resources import preload
+        preload(_config)
@@ -1,33 +1,139 @@
 # Uvicorn is the ASGI server used to run the FastAPI application
 import uvicorn
 
+import asyncio
+import json
+import time
+from typing import Optional
+
+# Used to build the chain once when the application starts (and clean up when it stops)
+from contextlib import asynccontextmanager, AsyncExitStack
+
 # FastAPI framework imports
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-# Load environment variables from a .env file
-from dotenv import load_dotenv
+# The chain registry (LangChain, Gemini and AstraDB clients), the answer cache, the session memory and the
+# stage tracing are imported when they are first used, in the background startup task or in the first
+# request, so importing this module (and serving / and /health) does not wait for them.
+
+# Process-wide config.yaml, .env variables and ModelLoader, each loaded once (utils/container.py)
+from utils.container import get_container
+
+# Bounds how many chains run at once and rejects quickly (503) when the queue is full
+from utils.concurrency import ConcurrencyLimiter, LimiterSaturated
+
+# Process-wide metrics (histograms/counters) shown on /stats and, in Prometheus format, on /metrics
+from utils.metrics import REGISTRY
+
+# Queued, sampled logging (log calls never wait on console I/O)
+from utils.logger import get_logger, setup_logging
+
 
-# LangChain modules for building chains and handling I/O
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
+# Load environment variables from .env file into the environment
+container = get_container()
+container.load_env()
+setup_logging(container.config)
+
+logger = get_logger("app")
+request_logger = get_logger("app.requests")     #per-request logs, sampled (logging.sample_rates in config.yaml)
+
+requests_total = REGISTRY.counter("chat_requests_total", "Chat requests received (/get and /stream)")
+request_errors = REGISTRY.counter("chat_request_errors_total", "Chat requests that failed with an error")
+requests_in_flight = REGISTRY.gauge("chat_requests_in_flight", "Chat requests currently being handled")
+
+
+async def start_components(app: FastAPI):
+    """
+    Build the chain registry, warm it up, create the cache/session components and mark the app ready.
+    A registry can be set on app.state before startup (e.g. with stub components for load tests).
+    """
+    started = time.perf_counter()
+    try:
+        from utils.chain_registry import ChainRegistry
+        from utils.answer_cache import AnswerCache
+        from utils.session_memory import SessionMemory
 
-# Custom Retriever class that loads and calls AstraDB vector retriever
-from retriever.retrieval import Retriever
+        registry = getattr(app.state, "registry", None) or ChainRegistry()
+        # Imports and client construction are blocking: done in a thread so the event loop keeps serving
+        await asyncio.to_thread(registry.build)
+        await registry.awarm_up()
+        app.state.registry = registry
+        if not hasattr(app.state, "answer_cache"):
+            app.state.answer_cache = AnswerCache.from_config(registry.config, embeddings=registry.embeddings)
+        if not hasattr(app.state, "session_memory"):
+            app.state.session_memory = SessionMemory.from_config(registry.config)
+    except Exception as e:
+        app.state.startup_error = repr(e)
+        logger.exception("Startup failed, chat requests will be refused")
+        return
+    registry.startup_report["ready"] = round(time.perf_counter() - started, 4)
+    app.state.ready.set()
+    logger.info("Startup report: %s", registry.startup_report)
 
-# Utility class for loading LLM and embeddings
-from utils.model_loader import ModelLoader
 
-# Dictionary containing prompt templates
-from prompt_library.prompt import PROMPT_TEMPLATES
+async def reload_on_ingestion(app: FastAPI):
+    """
+    After an ingestion run (cache.invalidation_file touched) rebuild the chains over the new indexes.
+    The rebuild runs in a thread; requests keep using the previous chains until it is done.
+    """
+    await app.state.ready.wait()
+    registry = app.state.registry
+    interval = registry.config.get("cache", {}).get("invalidation_check_seconds", 5)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await asyncio.to_thread(registry.reload_indexes):
+                logger.info("Indexes reloaded after an ingestion run in %ss", registry.startup_report["reload"])
+        except Exception:
+            logger.exception("Reloading the indexes failed, still serving the previous ones")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start serving right away and get the chain ready in the background: the page and the health checks
+    answer while the heavy imports, clients and warm-up are still running; chat requests wait for them
+    (up to server.startup_wait_seconds).
+    """
+    app.state.ready = asyncio.Event()
+    app.state.startup_error = None
+    app.state.limiter = getattr(app.state, "limiter", None) or ConcurrencyLimiter.from_config(container.config)
+    startup = asyncio.create_task(start_components(app))
+    reloader = asyncio.create_task(reload_on_ingestion(app))
+    yield
+    startup.cancel()
+    reloader.cancel()
+
+
+async def wait_until_ready() -> bool:
+    """
+    True once the chain is ready; False when startup failed or did not finish in server.startup_wait_seconds.
+    """
+    if app.state.ready.is_set():
+        return True
+    if app.state.startup_error is None:
+        timeout = container.config.get("server", {}).get("startup_wait_seconds", 30)
+        try:
+            await asyncio.wait_for(app.state.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return app.state.ready.is_set()
+
+
+def not_ready_response():
+    return PlainTextResponse(
+        "The assistant is starting up, please try again in a moment.",
+        status_code=503,
+        headers={"Retry-After": "2"},
+    )
 
 
 # Create the FastAPI application instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files like CSS/JS to the `/static` route from the 'static' directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -44,56 +150,227 @@ app.add_middleware(
     allow_headers=["*"],           # Allow all headers
 )
 
-# Load environment variables from .env file into the environment
-load_dotenv()
-
-# Instantiate the retriever and model loader (shared across requests)
-retriever_obj = Retriever()
-model_loader = ModelLoader()
-
-# Function to handle the LLM chain logic
-def invoke_chain(query: str):
-    # Load the retriever object (wraps the AstraDB vector store)
-    retriever = retriever_obj.load_retriever()
-
-    # Load the prompt template from the dictionary of templates
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATES["product_bot"])
-
-    # Load the LLM (e.g., OpenAI or other) via the model loader
-    llm = model_loader.load_llm()
-
-    # Build the chain:
-    # 1. Use retriever to inject context
-    # 2. Pass context + user question to the prompt
-    # 3. Feed prompt to LLM
-    # 4. Parse LLM output to string
-    chain = (
-        {"context": retriever, "question": RunnablePassthrough()}  # Pass question as-is
-        | prompt
-        | llm
-        | StrOutputParser()   # Parse output into a clean string
-    )
+# Function to handle the LLM chain logic.
+# It is async so that retrieval (AstraDB) and generation (Gemini) use the async clients
+# and never block the event loop while waiting on the network.
+async def invoke_chain(query: str, session_id: str = None):
+    from utils.resilience import ChainRun
+    from utils.tracing import StageTimer, start_trace
+    registry = app.state.registry
+    cache = app.state.answer_cache
+    memory = app.state.session_memory
+    if memory and session_id:
+        return "".join([chunk async for chunk in session_turn(memory, session_id, query)])
+
+    # With resilience enabled the request deadline starts here and covers the cache lookup too
+    run = ChainRun(registry.resilience, cache)
+
+    # Repeated (or semantically equivalent) questions are answered from the cache
+    lookup = await cache.alookup(query) if cache else None
+    if lookup is not None and lookup.answer is not None:
+        return lookup.answer
 
-    # Invoke the chain with the user's query and get the result
-    output = chain.invoke(query)
+    # Look up the chain that was built at startup (retriever -> prompt -> LLM -> parser).
+    # The time spent here is the per-request setup overhead and should stay near zero.
+    with registry.setup_time.time():
+        chain = registry.get_chain()
 
+    # Run the chain with the user's query. It is consumed as a stream (and joined) so the time to the
+    # first LLM token is measured too; StageTimer records every stage into the request trace.
+    # Past the deadline, with an upstream circuit open or after an upstream error the answer is a degraded
+    # one (utils/resilience.py).
+    trace = start_trace()
+    chunks = []
+    async for chunk in run.astream(chain, query, [StageTimer(trace)], lookup):
+        chunks.append(chunk)
+    trace.finish()
+    output = "".join(chunks)
+    request_logger.info("Stage timings: %s (degraded: %s)", trace.report(), run.degraded)
+
+    if cache and not run.degraded:
+        await cache.astore(lookup, output)
     return output
 
+# Same chain as invoke_chain, but yields the answer token by token as Gemini generates it
+async def stream_chain(query: str, session_id: str = None):
+    from utils.resilience import ChainRun
+    from utils.tracing import StageTimer, start_trace
+    registry = app.state.registry
+    cache = app.state.answer_cache
+    memory = app.state.session_memory
+    if memory and session_id:
+        async for chunk in session_turn(memory, session_id, query):
+            yield chunk
+        return
+
+    run = ChainRun(registry.resilience, cache)
+
+    lookup = await cache.alookup(query) if cache else None
+    if lookup is not None and lookup.answer is not None:
+        yield lookup.answer     # cached: the whole answer is the first "token"
+        return
+
+    with registry.setup_time.time():
+        chain = registry.get_chain()
+
+    trace = start_trace()
+    chunks = []
+    async for chunk in run.astream(chain, query, [StageTimer(trace)], lookup):
+        if chunk:
+            chunks.append(chunk)
+            yield chunk
+
+    trace.finish()
+    request_logger.info("Stage timings: %s (degraded: %s)", trace.report(), run.degraded)
+    if cache and not run.degraded:
+        await cache.astore(lookup, "".join(chunks))   # only complete answers are cached
+
+# One turn of a conversation: the session's recent turns go into the prompt, and a follow-up about the
+# previous answer's products reuses its reviews instead of retrieving again (utils/session_memory.py)
+async def session_turn(memory, session_id: str, query: str):
+    from utils.resilience import ChainRun
+    from utils.tracing import StageTimer, start_trace
+    registry = app.state.registry
+    cache = app.state.answer_cache
+    run = ChainRun(registry.resilience, cache, answer_key="answer")
+    plan = await memory.aplan(session_id, query)
+
+    # Only the first question of a conversation stands on its own, so only it can use the answer cache.
+    # A cached answer is served when its reviews were stored with it, so follow-ups can still reuse them.
+    lookup = await cache.alookup(query) if cache and not plan.history else None
+    if lookup is not None and lookup.answer is not None and lookup.documents is not None:
+        await memory.arecord(plan, lookup.answer, lookup.documents)
+        yield lookup.answer
+        return
+
+    with registry.setup_time.time():
+        chain = registry.get_chain(registry.session_template_name)
+
+    trace = start_trace()
+    chunks = []
+    documents = None
+    async for chunk in run.astream(chain, plan.chain_input(), [StageTimer(trace)], lookup):
+        if "documents" in chunk:
+            documents = chunk["documents"]
+        if chunk.get("answer"):
+            chunks.append(chunk["answer"])
+            yield chunk["answer"]
+
+    trace.finish()
+    request_logger.info("Stage timings: %s (retrieval reused: %s, degraded: %s)", trace.report(), plan.reused, run.degraded)
+    output = "".join(chunks)
+    await memory.arecord(plan, output, documents)
+    if lookup is not None and not run.degraded:
+        await cache.astore(lookup, output, documents)
+
 # GET endpoint to render the chat HTML page
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """
     Render the chat interface HTML page using Jinja2.
     """
-    return templates.TemplateResponse("chat.html", {"request": request})
+    return templates.TemplateResponse(request, "chat.html")   # request-first signature (current Starlette)
+
+# Liveness check: the process is up and serving, even while the chain is still being built
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+# Readiness check: 200 once chat requests can be answered (load balancers / autoscalers route on this)
+@app.get("/ready")
+async def ready():
+    if app.state.ready.is_set():
+        return {"status": "ready", "startup_seconds": app.state.registry.startup_report}
+    status = "failed" if app.state.startup_error else "starting"
+    return JSONResponse({"status": status, "error": app.state.startup_error}, status_code=503)
 
 # POST endpoint to handle chat form submissions
 @app.post("/get", response_class=HTMLResponse)
-async def chat(msg: str = Form(...)):  # `msg` is the user input from the form
-    result = invoke_chain(msg)         # Get the response from the chain
-    print(f"Response: {result}")       # Log the result to the console (for debugging)
+async def chat(msg: str = Form(...), session_id: Optional[str] = Form(None, max_length=64)):  # `msg` is the user input from the form
+    requests_total.inc()
+    if not await wait_until_ready():
+        return not_ready_response()
+    requests_in_flight.inc()
+    try:
+        async with app.state.limiter.slot():   # Wait for a free slot (bounded queue)
+            result = await invoke_chain(msg, session_id)   # Get the response from the chain
+    except LimiterSaturated:
+        # Overloaded: answer fast instead of queueing forever, the client may retry
+        return PlainTextResponse(
+            "The assistant is busy right now, please try again in a moment.",
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    except Exception:
+        request_errors.inc()
+        raise
+    finally:
+        requests_in_flight.dec()
+    request_logger.info("Response: %s", result)   # Sampled log of the answer (logging.sample_rates)
     return result                      # Return the LLM response to the frontend
 
+# POST endpoint that streams the answer as Server-Sent Events (one event per token chunk).
+# The first bytes reach the browser as soon as the first token is generated; /get stays for compatibility.
+@app.post("/stream")
+async def chat_stream(msg: str = Form(...), session_id: Optional[str] = Form(None, max_length=64)):
+    requests_total.inc()
+    if not await wait_until_ready():
+        return not_ready_response()
+    stack = AsyncExitStack()
+    try:
+        # Take the concurrency slot before we start streaming so overload is still a fast 503
+        await stack.enter_async_context(app.state.limiter.slot())
+    except LimiterSaturated:
+        return PlainTextResponse(
+            "The assistant is busy right now, please try again in a moment.",
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+
+    async def events():
+        requests_in_flight.inc()
+        async with stack:   # the slot is released when the stream finishes or the client disconnects
+            try:
+                async for token in stream_chain(msg, session_id):
+                    yield f"data: {json.dumps(token)}\n\n"   # JSON keeps newlines inside one SSE event
+            except Exception:
+                request_errors.inc()
+                logger.exception("Streaming failed")
+                yield f"event: error\ndata: {json.dumps('Sorry, something went wrong.')}\n\n"
+            finally:
+                requests_in_flight.dec()
+            yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},   # disable proxy buffering
+    )
+
+
+# GET endpoint with the startup report and the per-request setup time metric
+@app.get("/stats")
+async def stats():
+    if not app.state.ready.is_set():
+        return {"status": "failed" if app.state.startup_error else "starting"}
+    report = app.state.registry.report()
+    report["limiter"] = app.state.limiter.snapshot()
+    memory = app.state.session_memory
+    report["sessions"] = memory.stats() if memory else {"enabled": False}
+    report["metrics"] = REGISTRY.snapshot()
+    return report
+
+# GET endpoint for Prometheus scraping: every histogram/counter/gauge in the text exposition format
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.prometheus(), media_type="text/plain; version=0.0.4")
+
+# GET endpoint with the answer cache hit/miss counters
+@app.get("/cache/stats")
+async def cache_stats():
+    cache = getattr(app.state, "answer_cache", None)
+    return cache.stats() if cache else {"enabled": False}
+
 
 #Use this commad to run the app on webpage
 """uvicorn main:app --reload --port 8001"""
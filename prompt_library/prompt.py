@@ -9,6 +9,22 @@ PROMPT_TEMPLATES = {
 
     QUESTION: {question}
 
+    YOUR ANSWER:
+    """,
+    "product_bot_session": """
+    You are an expert EcommerceBot specialized in product recommendations and handling customer queries.
+    Analyze the provided product titles, ratings, and reviews to provide accurate, helpful responses.
+    The question may follow up on the earlier conversation; resolve words like "it" or "the cheaper one" from it.
+    Stay relevant to the context, and keep your answers concise and informative.
+
+    CONVERSATION SO FAR:
+    {history}
+
+    CONTEXT:
+    {context}
+
+    QUESTION: {question}
+
     YOUR ANSWER:
     """
 }
\ No newline at end of file
@@ -0,0 +1,167 @@
+#In-memory BM25 inverted index over the reviews (page_content) and product names (metadata.product_name).
+#Built by the ingestion pipeline and saved as a handful of .npy files plus a small JSON vocabulary,
+#which are memory-mapped at startup (loading takes milliseconds). Each save is a new version directory
+#published by swapping one pointer file (utils/atomic_files.py), so the files always change as a set.
+#
+#Layout (CSR): the postings of term t are postings[offsets[t]:offsets[t + 1]] (document rows) with the
+#matching weighted term frequencies in tfs[...]. Product-name occurrences count `name_weight` times.
+#The product name and rating of every row are kept as MetadataColumns, so searches accept the same
+#metadata filter as the vector store.
+
+import json
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+import numpy as np
+from retriever.metadata_filter import MetadataColumns
+from utils.atomic_files import current_version, publish_version, save_json, save_npy
+
+_ARRAYS = ("offsets", "postings", "tfs", "doc_len", "idf", "is_name_term")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can for from good how i in is it me my of on or please show "
+    "suggest tell that the this to under what which with you your best".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class BM25Builder:
+    """
+    Collects documents (streamed in any number of batches) and builds a BM25Index.
+    """
+
+    def __init__(self, name_weight: int = 2):
+        self.name_weight = name_weight
+        self.ids: List[str] = []
+        self._term_freqs: List[Counter] = []
+        self._name_terms = set()
+        self._metadatas: List[dict] = []
+
+    def add(self, doc_id: str, text: str, metadata: Optional[dict] = None):
+        metadata = metadata or {}
+        name_tokens = tokenize(metadata.get("product_name", ""))
+        freqs = Counter(tokenize(text))
+        for token in name_tokens:
+            freqs[token] += self.name_weight
+        self._name_terms.update(name_tokens)
+        self.ids.append(doc_id)
+        self._term_freqs.append(freqs)
+        self._metadatas.append({field: metadata.get(field) for field in ("product_name", "product_rating")})
+
+    def add_documents(self, documents):
+        for doc in documents:
+            self.add(doc.id, doc.page_content, doc.metadata)
+
+    def build(self, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocabulary = sorted({term for freqs in self._term_freqs for term in freqs})
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+
+        postings_per_term = [[] for _ in vocabulary]
+        doc_len = np.zeros(len(self.ids), dtype=np.float32)
+        for row, freqs in enumerate(self._term_freqs):
+            doc_len[row] = sum(freqs.values())
+            for term, tf in freqs.items():
+                postings_per_term[term_ids[term]].append((row, tf))
+
+        counts = np.array([len(p) for p in postings_per_term], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        postings = np.fromiter((row for p in postings_per_term for row, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((tf for p in postings_per_term for _, tf in p), dtype=np.float32, count=int(offsets[-1]))
+
+        n_docs = max(len(self.ids), 1)
+        idf = np.log(1.0 + (n_docs - counts + 0.5) / (counts + 0.5)).astype(np.float32)
+        is_name_term = np.array([term in self._name_terms for term in vocabulary], dtype=bool)
+        columns = MetadataColumns.from_metadatas(self._metadatas)
+        return BM25Index(vocabulary, list(self.ids), offsets, postings, tfs, doc_len, idf, is_name_term, columns, k1, b)
+
+
+class BM25Index:
+    """
+    Read-only BM25 index. search() returns (doc_id, score) pairs, best first.
+    """
+
+    def __init__(self, vocabulary, ids, offsets, postings, tfs, doc_len, idf, is_name_term,
+                 columns: MetadataColumns, k1=1.5, b=0.75):
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.ids = ids
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.idf = idf
+        self.is_name_term = is_name_term
+        self.columns = columns
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_len = float(np.mean(doc_len)) if len(doc_len) else 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, k: int = 10, filter: Optional[dict] = None) -> List[Tuple[str, float]]:
+        term_ids = [self.term_ids[t] for t in set(tokenize(query)) if t in self.term_ids]
+        if not term_ids or not self.ids:
+            return []
+        rows, contributions = [], []
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_rows = self.postings[start:end]
+            tf = self.tfs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_rows] / self.avg_doc_len)
+            rows.append(doc_rows)
+            contributions.append(self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm))
+        rows = np.concatenate(rows)
+        scores = np.bincount(rows, weights=np.concatenate(contributions), minlength=len(self.ids))
+        if filter:
+            scores[~self.columns.mask(filter)] = 0.0
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def name_term_counts(self, query: str) -> Tuple[int, int, bool]:
+        """
+        (product-name tokens, meaningful tokens) of the query, and whether one of the name tokens
+        looks like a model number (letters and digits, e.g. "235v2").
+        """
+        tokens = [t for t in tokenize(query) if t not in STOPWORDS]
+        name_tokens = [t for t in tokens if t in self.term_ids and self.is_name_term[self.term_ids[t]]]
+        has_model_number = any(any(c.isdigit() for c in t) and any(c.isalpha() for c in t) for t in name_tokens)
+        return len(name_tokens), len(tokens), has_model_number
+
+    def save(self, path: str):
+        def write(directory):
+            for name in _ARRAYS:
+                save_npy(os.path.join(directory, f"bm25_{name}.npy"), getattr(self, name))
+            save_json(os.path.join(directory, "bm25_meta.json"),
+                      {"vocabulary": self.vocabulary, "ids": self.ids, "k1": self.k1, "b": self.b})
+            self.columns.save(directory, "bm25")
+
+        publish_version(path, write)
+        for name in os.listdir(path):       #an index saved before versioning kept its files in `path`
+            if name.startswith("bm25_"):
+                os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "BM25Index":
+        mmap_mode = "r" if mmap else None
+        directory, _ = current_version(path)
+        arrays = {name: np.load(os.path.join(directory, f"bm25_{name}.npy"), mmap_mode=mmap_mode) for name in _ARRAYS}
+        with open(os.path.join(directory, "bm25_meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        return cls(meta["vocabulary"], meta["ids"], arrays["offsets"], arrays["postings"], arrays["tfs"],
+                   arrays["doc_len"], arrays["idf"], arrays["is_name_term"],
+                   MetadataColumns.load(directory, "bm25", mmap), meta["k1"], meta["b"])
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        directory, _ = current_version(path)
+        return os.path.exists(os.path.join(directory, "bm25_meta.json"))
@@ -0,0 +1,63 @@
+#Product catalog: the distinct products of the review CSV with per-product aggregates (review count,
+#average rating). Written by the ingestion pipeline (it sees every document anyway) and loaded by
+#the query-understanding stage (product names) and the context packer (aggregates), so neither has to
+#query the vector store or recompute anything per request.
+
+import json
+import os
+from typing import Dict, List, Optional
+from utils.atomic_files import save_json
+
+
+class ProductCatalog:
+    """
+    Product name -> {"reviews": count, "rating_sum": sum of ratings}, in the order the products first
+    appear in the CSV.
+    """
+
+    def __init__(self, products: Dict[str, dict] = None):
+        self.products = products or {}
+
+    def add_documents(self, documents):
+        for doc in documents:
+            name = doc.metadata.get("product_name")
+            if name is None:
+                continue
+            entry = self.products.setdefault(name, {"reviews": 0, "rating_sum": 0.0})
+            entry["reviews"] += 1
+            rating = doc.metadata.get("product_rating")
+            if rating is not None:
+                entry["rating_sum"] += float(rating)
+
+    def stats(self, name: str) -> Optional[dict]:
+        """
+        {"reviews": ..., "average_rating": ...} for a product, or None when it is not in the catalog.
+        """
+        entry = self.products.get(name)
+        if entry is None or not entry["reviews"]:
+            return None
+        return {"reviews": entry["reviews"], "average_rating": entry["rating_sum"] / entry["reviews"]}
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        save_json(path, {"products": self.products}, indent=1)    #replaced atomically, servers may be reloading it
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["ProductCatalog"]:
+        """
+        The catalog at catalog.path in config.yaml, or None when the ingestion has not written it yet.
+        """
+        path = config.get("catalog", {}).get("path", "data/product_catalog.json")
+        return cls.load(path) if os.path.exists(path) else None
+
+    @classmethod
+    def load(cls, path: str) -> "ProductCatalog":
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file)["products"])
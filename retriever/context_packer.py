@@ -0,0 +1,183 @@
+#Context assembly between the retriever and the prompt.
+#The retriever over-fetches (context.fetch_k); the packer then
+#   1. groups the reviews by product (in the order the retriever ranked them),
+#   2. drops near-duplicate reviews of the same product (MinHash over word shingles),
+#   3. adds the per-product aggregates computed at ingestion (average rating, review count),
+#   4. fills a token budget round-robin over the products, so every product gets its best review first.
+#The result is a compact text block instead of the raw Document reprs, e.g.
+#   Product: BoAt Rockerz 235v2 ... (average rating 4.5/5 from 50 reviews)
+#   - 5/5 "Terrific purchase": Super sound and good looking ...
+
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from retriever.bm25 import tokenize
+from retriever.catalog import ProductCatalog
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+from utils.shared_resources import product_catalog
+
+logger = get_logger(__name__)
+
+_TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400)
+_raw_tokens = REGISTRY.histogram("context_raw_tokens", "Estimated tokens of the retrieved documents as-is", _TOKEN_BUCKETS)
+_packed_tokens = REGISTRY.histogram("context_packed_tokens", "Estimated tokens of the packed context", _TOKEN_BUCKETS)
+_prompt_tokens = REGISTRY.histogram("chat_prompt_tokens", "Estimated tokens of the formatted prompt sent to the LLM", _TOKEN_BUCKETS)
+_duplicates = REGISTRY.counter("context_duplicates_dropped_total", "Near-duplicate reviews left out of the context")
+
+_MINHASH_PRIME = 4294967291        #largest prime below 2**32, keeps a * hash + b inside uint64
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token for English text), good enough for budgeting and metrics.
+    """
+    return max(1, len(text) // 4)
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles; the share of equal signature slots estimates Jaccard similarity.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        # Hash every word once, then combine consecutive word hashes into shingle hashes (no string joins)
+        words = tokenize(text) or [""]
+        word_hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+        size = min(self.shingle_size, len(words))
+        shingles = np.zeros(len(words) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            shingles = (shingles * np.uint64(1000003) + word_hashes[offset:offset + len(shingles)]) % np.uint64(1 << 32)
+        return shingles
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        (len(texts), num_perm) signature matrix, computed for all texts in one vectorized pass.
+        """
+        hashes = [self._shingle_hashes(text) for text in texts]
+        if not hashes:
+            return np.zeros((0, len(self.a)), dtype=np.uint64)
+        flat = np.concatenate(hashes)
+        starts = np.concatenate([[0], np.cumsum([len(h) for h in hashes])[:-1]])
+        permuted = (flat[:, None] * self.a + self.b) % _MINHASH_PRIME
+        return np.minimum.reduceat(permuted, starts, axis=0)
+
+
+class ContextPacker:
+    """
+    Turns the retrieved documents into the compact {context} text of the prompt.
+    """
+
+    def __init__(self, catalog: Optional[ProductCatalog] = None, max_tokens: int = 600, max_products: int = 4,
+                 reviews_per_product: int = 3, max_review_chars: int = 400, dedupe_threshold: float = 0.7):
+        self.catalog = catalog
+        self.max_tokens = max_tokens
+        self.max_products = max_products
+        self.reviews_per_product = reviews_per_product
+        self.max_review_chars = max_review_chars
+        self.dedupe_threshold = dedupe_threshold
+        self.minhasher = MinHasher()
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["ContextPacker"]:
+        """
+        Packer for the context section of config.yaml, or None when context packing is disabled.
+        """
+        context_config = config.get("context", {})
+        if not context_config.get("enabled", False):
+            return None
+        return cls(
+            catalog=product_catalog(config),
+            max_tokens=context_config.get("max_tokens", 600),
+            max_products=context_config.get("max_products", 4),
+            reviews_per_product=context_config.get("reviews_per_product", 3),
+            max_review_chars=context_config.get("max_review_chars", 400),
+            dedupe_threshold=context_config.get("dedupe_threshold", 0.7),
+        )
+
+    def group(self, documents: List[Document]) -> "OrderedDict[str, List[Document]]":
+        """
+        Reviews per product, products in the order of their best-ranked review, near-duplicates removed.
+        """
+        signatures = self.minhasher.signatures([doc.page_content for doc in documents])
+        # similarity[i, j]: estimated Jaccard similarity of reviews i and j
+        similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+        groups = OrderedDict()
+        kept_rows = {}
+        for row, doc in enumerate(documents):
+            name = doc.metadata.get("product_name", "Unknown product")
+            kept = kept_rows.setdefault(name, [])
+            if kept and similarity[row, kept].max() >= self.dedupe_threshold:
+                _duplicates.inc()
+                continue
+            kept.append(row)
+            groups.setdefault(name, []).append(doc)
+        return groups
+
+    def _header(self, name: str) -> str:
+        stats = self.catalog.stats(name) if self.catalog is not None else None
+        if stats is None:
+            return f"Product: {name}"
+        return f"Product: {name} (average rating {stats['average_rating']:.1f}/5 from {stats['reviews']} reviews)"
+
+    def _review_line(self, doc: Document) -> str:
+        text = " ".join(doc.page_content.split())
+        if len(text) > self.max_review_chars:
+            text = text[:self.max_review_chars].rsplit(" ", 1)[0] + " ..."
+        rating = doc.metadata.get("product_rating")
+        summary = doc.metadata.get("product_summary")
+        prefix = "- "
+        if rating is not None:
+            prefix += f"{rating}/5 "
+        if summary:
+            prefix += f'"{summary}": '
+        return prefix + text
+
+    def pack(self, documents: List[Document]) -> str:
+        """
+        The packed context text, at most max_tokens (estimated) long.
+        """
+        groups = list(self.group(documents).items())[:self.max_products]
+        headers = {name: self._header(name) for name, _ in groups}
+        selected = OrderedDict()
+        remaining = self.max_tokens
+        for position in range(self.reviews_per_product):
+            for name, reviews in groups:
+                if position >= len(reviews) or (position > 0 and name not in selected):
+                    continue
+                line = self._review_line(reviews[position])
+                cost = estimate_tokens(line) + (estimate_tokens(headers[name]) if position == 0 else 0)
+                if cost > remaining:
+                    continue
+                selected.setdefault(name, []).append(line)
+                remaining -= cost
+
+        context = "\n\n".join("\n".join([headers[name], *lines]) for name, lines in selected.items())
+        _raw_tokens.observe(sum(estimate_tokens(doc.page_content) + estimate_tokens(str(doc.metadata)) for doc in documents))
+        _packed_tokens.observe(estimate_tokens(context))
+        return context
+
+    async def apack(self, documents: List[Document]) -> str:
+        return self.pack(documents)
+
+
+def record_prompt_tokens(prompt_value):
+    """
+    Chain step placed between the prompt and the LLM: records the prompt size and passes it through.
+    """
+    tokens = estimate_tokens(prompt_value.to_string())
+    _prompt_tokens.observe(tokens)
+    logger.info("Prompt tokens (estimated): %d", tokens)
+    return prompt_value
+
+
+async def arecord_prompt_tokens(prompt_value):
+    return record_prompt_tokens(prompt_value)
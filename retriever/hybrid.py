@@ -0,0 +1,140 @@
+#Hybrid retriever: BM25 keyword search (retriever/bm25.py) + vector search, fused with reciprocal rank fusion.
+#
+#Product questions often name an exact model ("BoAt Rockerz 235v2") that embeddings match poorly,
+#while descriptive questions ("good budget headphones") need the vector search. RRF combines both rankings
+#without having to calibrate BM25 scores against cosine similarities: score(doc) = sum 1 / (rrf_k + rank).
+#Queries made (almost) only of product-name words skip the embedding call and vector search entirely.
+#With a query parser (retriever/query_understanding.py) both searches are pre-filtered on the metadata
+#(rating, product) found in the question.
+
+from typing import Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from retriever.bm25 import BM25Index
+from retriever.query_understanding import QueryFilterParser
+from utils.metrics import REGISTRY
+
+_keyword_only_queries = REGISTRY.counter("retriever_keyword_only_total", "Queries answered from BM25 without an embedding call")
+_hybrid_queries = REGISTRY.counter("retriever_hybrid_total", "Queries answered with BM25 + vector search")
+_filter_fallbacks = REGISTRY.counter("retriever_filter_fallback_total", "Filtered searches without results, retried unfiltered")
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[str]:
+    """
+    Merge several ranked lists of doc ids into one (best first).
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever over a vector store plus a BM25 index of the same documents.
+    """
+
+    vectorstore: VectorStore
+    bm25: BM25Index
+    k: int = 3
+    candidate_k: int = 10                 #documents taken from each ranking before fusing
+    rrf_k: int = 60
+    keyword_short_circuit: bool = True
+    name_term_ratio: float = 0.6          #share of product-name words that makes a query "keyword only"
+    query_parser: Optional[QueryFilterParser] = None
+
+    @classmethod
+    def from_config(cls, vectorstore: VectorStore, bm25: BM25Index, config: dict,
+                    query_parser: Optional[QueryFilterParser] = None, k: Optional[int] = None) -> "HybridRetriever":
+        retriever_config = config.get("retriever", {})
+        hybrid_config = retriever_config.get("hybrid", {})
+        return cls(
+            vectorstore=vectorstore, bm25=bm25,
+            k=k or retriever_config.get("top_k", 3),
+            candidate_k=max(hybrid_config.get("candidate_k", 10), k or 0),
+            rrf_k=hybrid_config.get("rrf_k", 60),
+            keyword_short_circuit=hybrid_config.get("keyword_short_circuit", True),
+            name_term_ratio=hybrid_config.get("name_term_ratio", 0.6),
+            query_parser=query_parser,
+        )
+
+    def is_keyword_query(self, query: str) -> bool:
+        """
+        True for queries that look up a product by name/model number, e.g. "BoAt Rockerz 235v2":
+        mostly product-name words and either a model number or at least two name words.
+        """
+        if not self.keyword_short_circuit:
+            return False
+        name_tokens, tokens, has_model_number = self.bm25.name_term_counts(query)
+        if not tokens or name_tokens / tokens < self.name_term_ratio:
+            return False
+        return has_model_number or name_tokens >= 2
+
+    def _keyword_ranking(self, query: str, filter: Optional[dict]) -> List[str]:
+        return [doc_id for doc_id, _ in self.bm25.search(query, self.candidate_k, filter)]
+
+    def _filter(self, query: str) -> Optional[dict]:
+        return self.query_parser.parse(query) if self.query_parser is not None else None
+
+    @staticmethod
+    def _ordered(doc_ids: List[str], documents: List[Document]) -> List[Document]:
+        by_id = {doc.id: doc for doc in documents}
+        return [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+
+    def _fuse(self, keyword_ids: List[str], vector_docs: List[Document]):
+        """
+        Fused top-k ids, the documents we already have, and the ids still to be fetched by id.
+        """
+        fused = reciprocal_rank_fusion([[doc.id for doc in vector_docs], keyword_ids], self.rrf_k)[:self.k]
+        known = {doc.id: doc for doc in vector_docs}
+        return fused, known, [doc_id for doc_id in fused if doc_id not in known]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        filter = self._filter(query)
+        documents = self._search(query, filter)
+        if filter and not documents:
+            _filter_fallbacks.inc()       #the filter left nothing, search everything instead
+            documents = self._search(query, None)
+        return documents
+
+    def _search(self, query: str, filter: Optional[dict]) -> List[Document]:
+        keyword_ids = self._keyword_ranking(query, filter)
+        if keyword_ids and self.is_keyword_query(query):
+            _keyword_only_queries.inc()
+            return self._ordered(keyword_ids[:self.k], self.vectorstore.get_by_ids(keyword_ids[:self.k]))
+
+        _hybrid_queries.inc()
+        vector_docs = self.vectorstore.similarity_search(query, k=self.candidate_k, **self._search_kwargs(filter))
+        fused, known, missing = self._fuse(keyword_ids, vector_docs)
+        if missing:
+            known.update({doc.id: doc for doc in self.vectorstore.get_by_ids(missing)})
+        return [known[doc_id] for doc_id in fused if doc_id in known]
+
+    @staticmethod
+    def _search_kwargs(filter: Optional[dict]) -> dict:
+        return {"filter": filter} if filter else {}
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        filter = self._filter(query)
+        documents = await self._asearch(query, filter)
+        if filter and not documents:
+            _filter_fallbacks.inc()
+            documents = await self._asearch(query, None)
+        return documents
+
+    async def _asearch(self, query: str, filter: Optional[dict]) -> List[Document]:
+        keyword_ids = self._keyword_ranking(query, filter)
+        if keyword_ids and self.is_keyword_query(query):
+            _keyword_only_queries.inc()
+            return self._ordered(keyword_ids[:self.k], await self.vectorstore.aget_by_ids(keyword_ids[:self.k]))
+
+        _hybrid_queries.inc()
+        vector_docs = await self.vectorstore.asimilarity_search(query, k=self.candidate_k, **self._search_kwargs(filter))
+        fused, known, missing = self._fuse(keyword_ids, vector_docs)
+        if missing:
+            known.update({doc.id: doc for doc in await self.vectorstore.aget_by_ids(missing)})
+        return [known[doc_id] for doc_id in fused if doc_id in known]
@@ -0,0 +1,419 @@
+#In-process vector index used as an alternative to AstraDB (vector_store.backend: "local" in config.yaml).
+#The whole review catalog fits in memory, so a search is one matrix-vector product over a contiguous
+#float32 matrix instead of a network round-trip. For larger catalogs an IVF (inverted file) mode
+#only scores the rows of the `nprobe` clusters closest to the query.
+#The index is saved as .npy files that are memory-mapped on load, so worker processes start fast
+#and share the same physical pages. Each save writes a new version directory and then swaps the CURRENT
+#pointer (utils/atomic_files.py), never rewriting files in place: a running ingestion cannot change or
+#truncate what the workers have mapped, and a loader never pairs new vectors with old ids or metadata.
+#Ingestion checkpoints call save_changes(), which only appends the rows written since the last save as a
+#shard of the current version (replayed on load), so checkpointing costs O(new rows), not O(index).
+#A metadata `filter` (see retriever/metadata_filter.py) selects the candidate rows before any scoring.
+
+import copy
+import json
+import os
+import threading
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from retriever.metadata_filter import MetadataColumns
+from utils.atomic_files import current_version, publish_version, save_json, save_npy, update_version
+
+
+def _json_default(value):
+    # pandas/numpy scalars in metadata (e.g. the rating column) are not JSON serializable by default
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_UNVERSIONED_FILES = ("vectors.npy", "docs.json", "ivf_centroids.npy", "ivf_order.npy", "ivf_offsets.npy")
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 42) -> np.ndarray:
+    """
+    Plain Lloyd k-means on (unit-normalized) vectors, using dot-product similarity. Returns the centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroid = members.mean(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids[cluster] = centroid / norm if norm else centroid
+    return centroids
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain VectorStore backed by a NumPy float32 matrix (cosine similarity on normalized vectors).
+    mode="exact" scores every row, mode="ivf" scores only the rows in the nprobe nearest clusters.
+    """
+
+    def __init__(self, embedding: Embeddings, mode: str = "exact", nlist: int = 64, nprobe: int = 8):
+        self.embedding = embedding
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._vectors = np.zeros((0, 0), dtype=np.float32)   #one row per document (normalized)
+        self._alive = np.zeros(0, dtype=bool)                 #False for deleted rows
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._id_to_row = {}
+        self._centroids = None        #IVF cluster centroids (nlist, dim)
+        self._ivf_order = None        #row numbers sorted by cluster
+        self._ivf_offsets = None      #cluster c owns _ivf_order[_ivf_offsets[c]:_ivf_offsets[c + 1]]
+        self._vector_buffer = None    #_vectors/_alive are views of these buffers once documents are appended
+        self._alive_buffer = None
+        self._capacity = 0            #rows allocated in the buffers (grown by doubling)
+        self._columns = None          #MetadataColumns of the rows, built on the first filtered search
+        self._write_lock = threading.RLock()   #writes may come from several ingestion writer threads
+        self._saved_version = None    #(index path, version) this store was loaded from or saved as
+        self._changed_rows = set()    #rows added or overwritten since then
+        self._deleted_ids = set()     #...and ids deleted since then
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    # ------------------------------------------------------------------ writing
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Add (or overwrite, when the id already exists) documents with precomputed embeddings.
+        """
+        with self._write_lock:
+            return self._add_embeddings(texts, embeddings, metadatas, ids)
+
+    def _add_embeddings(self, texts, embeddings, metadatas, ids) -> List[str]:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(len(self._ids) + i) for i in range(len(texts))]
+
+        new_rows = []
+        last_index = {doc_id: i for i, doc_id in enumerate(ids)}     #an id repeated in one call: the last one wins
+        for doc_id, i in last_index.items():
+            row = self._id_to_row.get(doc_id)
+            if row is None:
+                new_rows.append(i)
+                continue
+            # Existing document: overwrite in place (copy first if the matrix is a read-only memory map)
+            if not self._vectors.flags.writeable:
+                self._vectors = np.array(self._vectors)
+            self._vectors[row] = vectors[i]
+            self._texts[row] = texts[i]
+            self._metadatas[row] = metadatas[i]
+            self._alive[row] = True
+            self._changed_rows.add(row)
+            self._deleted_ids.discard(doc_id)
+
+        if new_rows:
+            start = len(self._ids)
+            end = start + len(new_rows)
+            self._reserve(end, vectors.shape[1])
+            self._vectors = self._vector_buffer[:end]
+            self._alive = self._alive_buffer[:end]
+            self._vectors[start:end] = vectors[new_rows]
+            self._alive[start:end] = True
+            for offset, i in enumerate(new_rows):
+                self._ids.append(ids[i])
+                self._texts.append(texts[i])
+                self._metadatas.append(metadatas[i])
+                self._id_to_row[ids[i]] = start + offset
+                self._changed_rows.add(start + offset)
+
+        self._centroids = None      #the IVF structure is rebuilt lazily after writes
+        self._columns = None        #...and so is the metadata index
+        return list(ids)
+
+    def _reserve(self, rows: int, dimension: int):
+        """
+        Make sure the backing buffers hold at least `rows` rows. Capacity doubles, so appending
+        many small batches stays linear instead of copying the whole matrix every time.
+        """
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, 2 * self._capacity, 1024)
+        vector_buffer = np.empty((capacity, dimension), dtype=np.float32)
+        alive_buffer = np.zeros(capacity, dtype=bool)
+        current = len(self._ids)
+        if current:
+            vector_buffer[:current] = self._vectors      #also copies a memory-mapped index into RAM
+            alive_buffer[:current] = self._alive
+        self._vector_buffer, self._alive_buffer, self._capacity = vector_buffer, alive_buffer, capacity
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    async def aadd_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                         ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, await self.embedding.aembed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        if ids is None:
+            return False
+        with self._write_lock:
+            if not self._alive.flags.writeable:
+                self._alive = np.array(self._alive)
+            for doc_id in ids:
+                row = self._id_to_row.get(doc_id)
+                if row is not None:
+                    self._alive[row] = False
+                    self._changed_rows.discard(row)
+                    self._deleted_ids.add(doc_id)
+        return True
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        documents = []
+        for doc_id in ids:
+            row = self._id_to_row.get(doc_id)
+            if row is not None and self._alive[row]:
+                documents.append(self._document(row))
+        return documents
+
+    async def aget_by_ids(self, ids, /) -> List[Document]:
+        return self.get_by_ids(ids)       #in-memory lookup, no executor hop needed
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, **kwargs) -> "LocalVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    # ------------------------------------------------------------------ IVF
+
+    def build_ivf(self):
+        """
+        Cluster the vectors into `nlist` groups and store the rows of each group contiguously.
+        """
+        n_clusters = max(1, min(self.nlist, len(self._ids)))
+        self._centroids = _kmeans(np.asarray(self._vectors), n_clusters)
+        assignment = np.argmax(self._vectors @ self._centroids.T, axis=1)
+        self._ivf_order = np.argsort(assignment, kind="stable").astype(np.int32)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        self._ivf_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Rows to score: None means every row (exact mode), otherwise the rows of the nprobe closest clusters.
+        """
+        if self.mode != "ivf" or len(self._ids) == 0:
+            return None
+        if self._centroids is None:
+            self.build_ivf()
+        nprobe = min(self.nprobe, len(self._centroids))
+        clusters = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._ivf_order[self._ivf_offsets[c]:self._ivf_offsets[c + 1]] for c in clusters])
+
+    # ------------------------------------------------------------------ searching
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._ids[row])
+
+    def _metadata_columns(self) -> MetadataColumns:
+        columns = self._columns
+        if columns is None:
+            with self._write_lock:
+                columns = self._columns = MetadataColumns.from_metadatas(self._metadatas)
+        return columns
+
+    def _search(self, embedding: List[float], k: int, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        if len(self._ids) == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+
+        # Pre-filter: only the matching rows are scored (exactly, the filtered set is already small)
+        rows = np.flatnonzero(self._alive & self._metadata_columns().mask(filter)) if filter else self._candidate_rows(query)
+        if filter:
+            if len(rows) == 0:
+                return []
+            scores = self._vectors[rows] @ query
+        elif rows is None:
+            scores = self._vectors @ query
+            scores = np.where(self._alive, scores, -np.inf)
+            rows = np.arange(len(scores))
+        else:
+            scores = self._vectors[rows] @ query
+            scores = np.where(self._alive[rows], scores, -np.inf)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]       #top-k without sorting everything
+        top = top[np.argsort(-scores[top])]
+        return [(self._document(int(rows[i])), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs) -> List[Tuple[Document, float]]:
+        return self._search(embedding, k, kwargs.get("filter"))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self._search(embedding, k, kwargs.get("filter"))]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self._search(self.embedding.embed_query(query), k, kwargs.get("filter"))
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    # The search itself is in-memory and fast, so only the query embedding is awaited
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self._search(await self.embedding.aembed_query(query), k, kwargs.get("filter"))
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(embedding, k, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0     #cosine similarity [-1, 1] -> relevance [0, 1]
+
+    # ------------------------------------------------------------------ persistence
+
+    def save(self, path: str):
+        """
+        Save the live rows to `path` (a directory) as a new version: vectors.npy, docs.json and,
+        in IVF mode, the cluster files.
+        """
+        with self._write_lock:
+            self._save(path)
+
+    def _save(self, path: str):
+        live = np.flatnonzero(self._alive)
+        vectors = np.ascontiguousarray(self._vectors[live], dtype=np.float32)
+        # Keep the compacted state so the saved IVF files match the saved row numbers
+        self._set_state(vectors, [self._ids[i] for i in live], [self._texts[i] for i in live],
+                        [self._metadatas[i] for i in live])
+        if self.mode == "ivf" and len(live):
+            self.build_ivf()
+
+        def write(directory):
+            save_npy(os.path.join(directory, "vectors.npy"), vectors)
+            save_json(os.path.join(directory, "docs.json"),
+                      {"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}, default=_json_default)
+            if self._centroids is not None:
+                save_npy(os.path.join(directory, "ivf_centroids.npy"), self._centroids)
+                save_npy(os.path.join(directory, "ivf_order.npy"), self._ivf_order)
+                save_npy(os.path.join(directory, "ivf_offsets.npy"), self._ivf_offsets)
+
+        directory = publish_version(path, write)
+        self._saved_version = (os.path.abspath(path), os.path.basename(directory))
+        for name in _UNVERSIONED_FILES:       #an index saved before versioning kept its files in `path`
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+
+    def save_changes(self, path: str):
+        """
+        Checkpoint: append the rows written and the ids deleted since the last save/load to the current
+        version at `path` as one shard. Falls back to a full save() when `path` does not hold the version
+        this store was loaded from or saved as.
+        """
+        with self._write_lock:
+            directory, pointer = current_version(path)
+            if pointer.get("version") is None or self._saved_version != (os.path.abspath(path), pointer["version"]):
+                self._save(path)
+                return
+            if not self._changed_rows and not self._deleted_ids:
+                return
+            shards = pointer.get("shards", [])
+            shard = f"shard-{len(shards) + 1:05d}"
+            rows = sorted(self._changed_rows)
+            save_npy(os.path.join(directory, f"{shard}.npy"), np.ascontiguousarray(self._vectors[rows], dtype=np.float32))
+            save_json(os.path.join(directory, f"{shard}.json"), {
+                "ids": [self._ids[row] for row in rows],
+                "texts": [self._texts[row] for row in rows],
+                "metadatas": [self._metadatas[row] for row in rows],
+                "deleted": sorted(self._deleted_ids),
+            }, default=_json_default)
+            update_version(path, shards=shards + [shard])      #the shard is only visible once complete
+            self._changed_rows.clear()
+            self._deleted_ids.clear()
+
+    def _apply_shard(self, directory: str, shard: str):
+        vectors = np.load(os.path.join(directory, f"{shard}.npy"))
+        with open(os.path.join(directory, f"{shard}.json"), encoding="utf-8") as file:
+            changes = json.load(file)
+        if changes["ids"]:
+            self._add_embeddings(changes["texts"], vectors, changes["metadatas"], changes["ids"])
+        self.delete(changes["deleted"])
+
+    def _set_state(self, vectors, ids, texts, metadatas):
+        self._vectors = vectors
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._ids, self._texts, self._metadatas = ids, texts, metadatas
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._capacity = 0        #the next append copies into fresh (writable) buffers
+        self._centroids = self._ivf_order = self._ivf_offsets = None
+        self._columns = None
+        self._changed_rows = set()
+        self._deleted_ids = set()
+
+    def prepare_read_only(self):
+        """
+        Build the lazily created search structures now, e.g. before the server forks its workers,
+        so every worker shares them instead of building its own.
+        """
+        self._metadata_columns()
+        if self.mode == "ivf" and self._centroids is None and len(self._ids):
+            self.build_ivf()
+
+    def with_embedding(self, embedding: Embeddings) -> "LocalVectorStore":
+        """
+        A store sharing this one's (read-only) index data but embedding queries with `embedding`.
+        """
+        store = copy.copy(self)
+        store.embedding = embedding
+        return store
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings, mmap: bool = True, **kwargs) -> "LocalVectorStore":
+        """
+        Load an index saved with save(). With mmap=True the matrices are memory-mapped read-only,
+        so several processes loading the same files share one copy in the page cache.
+        Shards appended by save_changes() are replayed on top (those rows are held in memory).
+        """
+        store = cls(embedding, **kwargs)
+        mmap_mode = "r" if mmap else None
+        directory, pointer = current_version(path)
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, "docs.json"), encoding="utf-8") as file:
+            docs = json.load(file)
+        if len(docs["ids"]) != len(vectors):
+            raise ValueError(f"Local index at {directory}: {len(vectors)} vectors but {len(docs['ids'])} documents")
+        store._set_state(vectors, docs["ids"], docs["texts"], docs["metadatas"])
+
+        centroids_path = os.path.join(directory, "ivf_centroids.npy")
+        if store.mode == "ivf" and os.path.exists(centroids_path):
+            store._centroids = np.load(centroids_path, mmap_mode=mmap_mode)
+            store._ivf_order = np.load(os.path.join(directory, "ivf_order.npy"), mmap_mode=mmap_mode)
+            store._ivf_offsets = np.load(os.path.join(directory, "ivf_offsets.npy"), mmap_mode=mmap_mode)
+
+        for shard in pointer.get("shards", []):
+            store._apply_shard(directory, shard)
+        store._changed_rows.clear()
+        store._deleted_ids.clear()
+        store._saved_version = (os.path.abspath(path), pointer.get("version"))
+        return store
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        directory, _ = current_version(path)
+        return os.path.exists(os.path.join(directory, "vectors.npy"))
@@ -0,0 +1,100 @@
+#Column-wise metadata index used to pre-filter documents before similarity scoring (local backend, BM25).
+#Filters use the same dict syntax as the AstraDB vector store, so one filter works for every backend:
+#   {"product_rating": {"$gte": 4}, "product_name": {"$in": ["BoAt Rockerz 235v2 ...", ...]}}
+#Supported operators: $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin and a top-level $and.
+
+import json
+import os
+from typing import List, Optional
+import numpy as np
+from utils.atomic_files import save_json, save_npy
+
+FILTER_FIELDS = ("product_name", "product_rating")
+_COMPARISONS = {"$eq": np.equal, "$ne": np.not_equal, "$gt": np.greater, "$gte": np.greater_equal,
+                "$lt": np.less, "$lte": np.less_equal}
+
+
+class MetadataColumns:
+    """
+    The filterable metadata of every row: product names as integer codes into `names`, ratings as floats
+    (NaN when missing). A filter becomes a few vectorized comparisons instead of a loop over dicts.
+    """
+
+    def __init__(self, names: List[str], name_codes: np.ndarray, ratings: np.ndarray):
+        self.names = names
+        self.name_to_code = {name: code for code, name in enumerate(names)}
+        self.name_codes = name_codes
+        self.ratings = ratings
+
+    @classmethod
+    def from_metadatas(cls, metadatas: List[dict]) -> "MetadataColumns":
+        name_to_code, codes, ratings = {}, [], []
+        for metadata in metadatas:
+            name = metadata.get("product_name")
+            codes.append(-1 if name is None else name_to_code.setdefault(name, len(name_to_code)))
+            rating = metadata.get("product_rating")
+            ratings.append(np.nan if rating is None else float(rating))
+        return cls(list(name_to_code), np.asarray(codes, dtype=np.int32), np.asarray(ratings, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.name_codes)
+
+    def mask(self, filter: Optional[dict]) -> np.ndarray:
+        """
+        Boolean array, True for the rows matching `filter` (every row for an empty filter).
+        """
+        result = np.ones(len(self), dtype=bool)
+        for field, condition in (filter or {}).items():
+            if field == "$and":
+                for sub_filter in condition:
+                    result &= self.mask(sub_filter)
+            elif field == "product_name":
+                result &= self._name_mask(condition)
+            elif field == "product_rating":
+                result &= self._rating_mask(condition)
+            else:
+                raise ValueError(f"Unsupported metadata filter field: {field} (supported: {FILTER_FIELDS})")
+        return result
+
+    def _name_mask(self, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        result = np.ones(len(self), dtype=bool)
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                codes = [self.name_to_code[name] for name in value if name in self.name_to_code]
+                matched = np.isin(self.name_codes, codes)
+                result &= matched if operator == "$in" else ~matched
+            elif operator in ("$eq", "$ne"):
+                matched = self.name_codes == self.name_to_code.get(value, -2)    #-2: unknown name, matches nothing
+                result &= matched if operator == "$eq" else ~matched
+            else:
+                raise ValueError(f"Unsupported operator for product_name: {operator}")
+        return result
+
+    def _rating_mask(self, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        result = np.ones(len(self), dtype=bool)
+        for operator, value in condition.items():
+            if operator == "$in":
+                result &= np.isin(self.ratings, np.asarray(value, dtype=np.float32))
+            elif operator in _COMPARISONS:
+                result &= _COMPARISONS[operator](self.ratings, float(value))
+            else:
+                raise ValueError(f"Unsupported operator for product_rating: {operator}")
+        return result
+
+    def save(self, path: str, prefix: str):
+        # Replaced atomically: serving workers memory-map these files
+        save_npy(os.path.join(path, f"{prefix}_name_codes.npy"), self.name_codes)
+        save_npy(os.path.join(path, f"{prefix}_ratings.npy"), self.ratings)
+        save_json(os.path.join(path, f"{prefix}_names.json"), self.names)
+
+    @classmethod
+    def load(cls, path: str, prefix: str, mmap: bool = True) -> "MetadataColumns":
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, f"{prefix}_names.json"), encoding="utf-8") as file:
+            names = json.load(file)
+        return cls(names, np.load(os.path.join(path, f"{prefix}_name_codes.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, f"{prefix}_ratings.npy"), mmap_mode=mmap_mode))
@@ -0,0 +1,177 @@
+#Query understanding: turn the structured parts of a question into a metadata filter for the vector store.
+#   "4+ star boAt headphones"        -> {"product_rating": {"$gte": 4}, "product_name": {"$in": [<3 BoAt products>]}}
+#   "reviews of realme buds 2"       -> {"product_name": "realme Buds 2 Wired Headset"}
+#   "good budget headphones"         -> None (nothing structured, plain similarity search)
+#The filter is applied before similarity scoring (AstraDB filter / local metadata index), so the search
+#only ranks documents the question can be about instead of relying on the LLM to ignore the others.
+
+import re
+from typing import List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from retriever.bm25 import STOPWORDS, tokenize
+from utils.metrics import REGISTRY
+from utils.shared_resources import product_catalog
+
+_filtered_queries = REGISTRY.counter("retriever_filtered_total", "Queries searched with a metadata filter")
+_filter_fallbacks = REGISTRY.counter("retriever_filter_fallback_total", "Filtered searches without results, retried unfiltered")
+
+_NUMBER_WORDS = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5"}
+_RATING = r"\b(?P<n>[1-5](?:\.\d)?)\b"
+_CONTEXT = r"(?P<ctx>\brated|\brating(?:\s+of)?)?\s*"
+_STARS = r"(?P<star>stars?\b|rated\b|rating\b)?"
+
+# "at least 4 stars", "rating above 3", "under 3 stars"
+_COMPARATOR_FIRST = re.compile(
+    _CONTEXT + r"(?P<cmp>at least|minimum(?: of)?|min|above|over|more than|greater than|higher than|"
+    r"below|under|less than|lower than|>=|<=|>|<)\s*" + _RATING + r"\s*" + _STARS)
+# "4+ star", "4 stars and above", "rated 4 or higher", "1 star"
+_NUMBER_FIRST = re.compile(
+    _CONTEXT + _RATING + r"\s*(?P<plus>\+)?\s*-?\s*" + _STARS +
+    r"(?:\s*(?:and|or|&)\s*(?P<dir>above|up|more|higher|better|below|under|less|lower))?")
+
+_COMPARATOR_OPERATORS = {
+    "at least": "$gte", "minimum": "$gte", "minimum of": "$gte", "min": "$gte", ">=": "$gte",
+    "above": "$gt", "over": "$gt", "more than": "$gt", "greater than": "$gt", "higher than": "$gt", ">": "$gt",
+    "below": "$lt", "under": "$lt", "less than": "$lt", "lower than": "$lt", "<": "$lt", "<=": "$lte",
+}
+
+
+def parse_rating_filter(query: str) -> Tuple[Optional[dict], str]:
+    """
+    Rating condition mentioned in the question, e.g. {"$gte": 4} (or None), and the question without it.
+    A number only counts as a rating next to "star(s)" / "rated" / "rating".
+    """
+    text = query.lower()
+    for word, digit in _NUMBER_WORDS.items():
+        text = re.sub(rf"\b{word}\b", digit, text)
+
+    for match in _COMPARATOR_FIRST.finditer(text):
+        if match.group("ctx") or match.group("star"):
+            operator = _COMPARATOR_OPERATORS[re.sub(r"\s+", " ", match.group("cmp"))]
+            return {operator: _number(match.group("n"))}, _without(text, match)
+    for match in _NUMBER_FIRST.finditer(text):
+        if not (match.group("ctx") or match.group("star")):
+            continue
+        direction = match.group("dir")
+        if match.group("plus") or direction in ("above", "up", "more", "higher", "better"):
+            operator = "$gte"
+        else:
+            operator = "$lte" if direction else "$eq"
+        return {operator: _number(match.group("n"))}, _without(text, match)
+    return None, text
+
+
+def _without(text: str, match) -> str:
+    return text[:match.start()] + " " + text[match.end():]
+
+
+def _number(text: str):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+class QueryFilterParser:
+    """
+    Extracts a vector-store metadata filter (rating threshold, product/category names) from a question.
+    Product names come from the catalog written at ingestion time.
+    """
+
+    def __init__(self, product_names: List[str], category_terms: List[str] = ()):
+        self.product_names = list(product_names)
+        self.category_terms = [term.lower() for term in category_terms]
+        self._name_tokens = [set(tokenize(name)) - STOPWORDS for name in self.product_names]
+        # A product is mentioned by its brand (first word of the name) or by a model number: "235v2" on its own,
+        # a plain number like "131" only next to another word of the name ("airdopes 131", not "under 100")
+        self._brands = [(tokenize(name) or [""])[0] for name in self.product_names]
+        self._model_numbers = [{t for t in tokens if any(c.isdigit() for c in t) and len(t) >= 3}
+                               for tokens in self._name_tokens]
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["QueryFilterParser"]:
+        """
+        Parser for retriever.filters in config.yaml, or None when disabled / the catalog was not built yet.
+        """
+        filters_config = config.get("retriever", {}).get("filters", {})
+        catalog = product_catalog(config) if filters_config.get("enabled", False) else None
+        if catalog is None:
+            return None
+        return cls(catalog.names, filters_config.get("category_terms", []))
+
+    def _mentions(self, i: int, tokens: set) -> bool:
+        if len(self._brands[i]) >= 3 and self._brands[i] in tokens:
+            return True
+        for model_number in self._model_numbers[i] & tokens:
+            if not model_number.isdigit() or len(self._name_tokens[i] & tokens) >= 2:
+                return True
+        return False
+
+    def match_products(self, query: str) -> List[str]:
+        """
+        Product names the question is about (empty when it is not about specific products).
+        """
+        tokens = set(tokenize(query)) - STOPWORDS
+        candidates = [i for i in range(len(self.product_names)) if self._mentions(i, tokens)]
+        if candidates:
+            # "boat rockerz" narrows the three BoAt products down to the Rockerz
+            best = max(len(self._name_tokens[i] & tokens) for i in candidates)
+            candidates = [i for i in candidates if len(self._name_tokens[i] & tokens) == best]
+
+        for term in self.category_terms:
+            if term in tokens:
+                in_category = [i for i, name_tokens in enumerate(self._name_tokens) if term in name_tokens]
+                narrowed = [i for i in candidates if i in in_category] if candidates else in_category
+                candidates = narrowed or candidates
+
+        if len(candidates) == len(self.product_names):
+            return []          #matches everything, no point in filtering
+        return [self.product_names[i] for i in candidates]
+
+    def parse(self, query: str) -> Optional[dict]:
+        """
+        Metadata filter in AstraDB syntax for the question, or None when nothing structured was found.
+        """
+        filter = {}
+        rating, rest = parse_rating_filter(query)     #"5 star" must not count as the "5" of a product name
+        if rating:
+            filter["product_rating"] = rating
+        products = self.match_products(rest)
+        if len(products) == 1:
+            filter["product_name"] = products[0]
+        elif products:
+            filter["product_name"] = {"$in": products}
+        return filter or None
+
+
+class FilteringRetriever(BaseRetriever):
+    """
+    Vector-store retriever that pre-filters on the metadata found in the question.
+    When a filter leaves nothing (e.g. a misread question) the search is repeated without it.
+    """
+
+    vectorstore: VectorStore
+    query_parser: QueryFilterParser
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        filter = self.query_parser.parse(query)
+        if filter:
+            _filtered_queries.inc()
+            documents = self.vectorstore.similarity_search(query, k=self.k, filter=filter)
+            if documents:
+                return documents
+            _filter_fallbacks.inc()
+        return self.vectorstore.similarity_search(query, k=self.k)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        filter = self.query_parser.parse(query)
+        if filter:
+            _filtered_queries.inc()
+            documents = await self.vectorstore.asimilarity_search(query, k=self.k, filter=filter)
+            if documents:
+                return documents
+            _filter_fallbacks.inc()
+        return await self.vectorstore.asimilarity_search(query, k=self.k)
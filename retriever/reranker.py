@@ -0,0 +1,191 @@
+#Lightweight reranking stage: the retriever over-fetches `depth` candidates (e.g. 30), a cheap local scorer
+#reorders them and only the best few go on to the context packer / prompt. No cross-encoder, no API call:
+#   lexical    share of the question's words found in the review or product name
+#   rating     prior for well-rated products ((rating - 3) / 2, in [-1, 1])
+#   similarity cosine of the question and review embeddings, read from the embedding cache only
+#              (vectors the ingestion already computed; reviews without a cached vector score 0)
+#   rank       the retriever's own order (1 for the first candidate down to 0 for the last)
+#Features are computed for all candidates at once with NumPy; the final score of a (question, review)
+#pair is memoized, so a repeated or semantically cached question is not rescored.
+#On the async path the features of memo misses are computed in a worker thread (the similarity feature
+#reads SQLite), so the event loop never waits on the embedding cache.
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from retriever.bm25 import STOPWORDS, tokenize
+from utils.answer_cache import normalize_query
+from utils.embedding_cache import CachedEmbeddings, content_hash
+from utils.metrics import REGISTRY
+
+_rerank_time = REGISTRY.histogram("rerank_seconds", "Time spent reranking the retrieved candidates")
+_score_hits = REGISTRY.counter("rerank_score_cache_hits_total", "Candidate scores reused from the memo")
+_score_misses = REGISTRY.counter("rerank_score_cache_misses_total", "Candidate scores computed")
+
+
+def find_cached_embeddings(embeddings) -> Optional[CachedEmbeddings]:
+    """
+    The CachedEmbeddings inside (possibly wrapped, e.g. micro-batched) embeddings, or None.
+    """
+    while embeddings is not None:
+        if isinstance(embeddings, CachedEmbeddings):
+            return embeddings
+        embeddings = getattr(embeddings, "underlying", None)
+    return None
+
+
+class Reranker:
+    """
+    Scores candidates with a weighted sum of cheap features and keeps the best `top_n`.
+    """
+
+    def __init__(self, embeddings=None, lexical_weight: float = 1.0, rating_weight: float = 0.2,
+                 similarity_weight: float = 1.0, rank_weight: float = 0.3, cache_size: int = 50000):
+        self.cached_embeddings = find_cached_embeddings(embeddings)
+        self.weights = np.array([lexical_weight, rating_weight, similarity_weight, rank_weight], dtype=np.float32)
+        self.cache_size = cache_size
+        self._scores = OrderedDict()        #(query hash, doc id) -> score, least recently used first
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, embeddings, config: dict) -> "Reranker":
+        rerank_config = config.get("retriever", {}).get("rerank", {})
+        weights = rerank_config.get("weights", {})
+        return cls(
+            embeddings,
+            lexical_weight=weights.get("lexical", 1.0),
+            rating_weight=weights.get("rating", 0.2),
+            similarity_weight=weights.get("similarity", 1.0),
+            rank_weight=weights.get("rank", 0.3),
+            cache_size=rerank_config.get("score_cache_size", 50000),
+        )
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def features(self, query: str, documents: List[Document]) -> np.ndarray:
+        """
+        (len(documents), 4) matrix of [lexical, rating, similarity, rank] features.
+        """
+        n = len(documents)
+        query_terms = list(dict.fromkeys(t for t in tokenize(query) if t not in STOPWORDS))
+        lexical = np.zeros(n, dtype=np.float32)
+        if query_terms:
+            term_index = {term: i for i, term in enumerate(query_terms)}
+            present = np.zeros((n, len(query_terms)), dtype=bool)
+            for row, doc in enumerate(documents):
+                text = f"{doc.page_content} {doc.metadata.get('product_name', '')}"
+                columns = [term_index[t] for t in set(tokenize(text)) if t in term_index]
+                present[row, columns] = True
+            lexical = present.mean(axis=1)
+
+        ratings = np.array([doc.metadata.get("product_rating") or 3 for doc in documents], dtype=np.float32)
+        rank = 1.0 - np.arange(n, dtype=np.float32) / max(n - 1, 1)
+        return np.column_stack([lexical, (ratings - 3.0) / 2.0, self._similarities(query, documents), rank])
+
+    def _similarities(self, query: str, documents: List[Document]) -> np.ndarray:
+        similarity = np.zeros(len(documents), dtype=np.float32)
+        if self.cached_embeddings is None:
+            return similarity
+        store = self.cached_embeddings.store
+        query_vector = store.get_many("query", [content_hash(query)]).get(content_hash(query))
+        if query_vector is None:          #e.g. a keyword-only query never embedded the question
+            return similarity
+        hashes = [content_hash(doc.page_content) for doc in documents]
+        vectors = store.get_many("document", list(set(hashes)))
+        rows = [row for row, hash_value in enumerate(hashes) if hash_value in vectors]
+        if rows:
+            matrix = np.asarray([vectors[hashes[row]] for row in rows], dtype=np.float32)
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+            similarity[rows] = matrix @ query_vector / np.where(norms == 0, 1.0, norms)
+        return similarity
+
+    def _memoized(self, key: str, documents: List[Document]):
+        """
+        (scores, rows missing from the memo); the missing rows of `scores` are left unset.
+        """
+        scores = np.empty(len(documents), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for row, doc in enumerate(documents):
+                cached = self._scores.get((key, doc.id))
+                if cached is None:
+                    missing.append(row)
+                else:
+                    self._scores.move_to_end((key, doc.id))
+                    scores[row] = cached
+        _score_hits.inc(len(documents) - len(missing))
+        _score_misses.inc(len(missing))
+        return scores, missing
+
+    def _compute(self, key: str, query: str, documents: List[Document], missing: List[int]) -> np.ndarray:
+        computed = self.features(query, documents)[missing] @ self.weights
+        with self._lock:
+            for row, score in zip(missing, computed):
+                self._scores[(key, documents[row].id)] = float(score)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+        return computed
+
+    def scores(self, query: str, documents: List[Document]) -> np.ndarray:
+        """
+        Score of every candidate; only the (query, doc id) pairs not in the memo are computed.
+        The rank feature depends on the candidate order, so equal questions share scores only
+        when the retriever returned the same list - which it does for the same question.
+        """
+        key = self.query_hash(query)
+        scores, missing = self._memoized(key, documents)
+        if missing:
+            scores[missing] = self._compute(key, query, documents, missing)
+        return scores
+
+    async def ascores(self, query: str, documents: List[Document]) -> np.ndarray:
+        """
+        Same as scores(); memo misses are computed in a worker thread.
+        """
+        key = self.query_hash(query)
+        scores, missing = self._memoized(key, documents)
+        if missing:
+            scores[missing] = await asyncio.to_thread(self._compute, key, query, documents, missing)
+        return scores
+
+    def rerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        if not documents:
+            return []
+        with _rerank_time.time():
+            order = np.argsort(-self.scores(query, documents), kind="stable")[:top_n]
+        return [documents[i] for i in order]
+
+    async def arerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        if not documents:
+            return []
+        with _rerank_time.time():
+            order = np.argsort(-(await self.ascores(query, documents)), kind="stable")[:top_n]
+        return [documents[i] for i in order]
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Wraps a retriever that over-fetches candidates and keeps the `k` best after reranking.
+    """
+
+    base_retriever: BaseRetriever
+    reranker: Reranker
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self.reranker.rerank(query, candidates, self.k)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = await self.base_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return await self.reranker.arerank(query, candidates, self.k)
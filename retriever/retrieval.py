@@ -1,24 +1,35 @@
 # Importing necessary libraries and modules
 import os
-from langchain_astradb import AstraDBVectorStore  # Importing the AstraDB vector store class
+from retriever.vector_store import load_vector_store, required_env_vars  # Vector store backend selected in config.yaml
 from typing import List  # For typing hinting the return type of functions
 from langchain_core.documents import Document  # Importing the Document class for LangChain
-from config.config_loader import load_config  # Custom config loader to load configurations
-from utils.model_loader import ModelLoader  # Custom model loader to load embeddings or other models
-from dotenv import load_dotenv  # To load environment variables from a .env file
+from utils.container import get_container  # Process-wide config.yaml, .env and ModelLoader (loaded once)
+from utils.embedding_batcher import MicroBatchEmbeddings  # Batches concurrent question embeddings into one call
+from retriever.bm25 import BM25Index  # Keyword index written by the ingestion pipeline
+from utils.shared_resources import bm25_index  # Read-only indexes loaded once per process
+from retriever.hybrid import HybridRetriever  # BM25 + vector search with reciprocal rank fusion
+from retriever.query_understanding import QueryFilterParser, FilteringRetriever  # Metadata filters from the question
+from retriever.reranker import Reranker, RerankingRetriever  # Reorders over-fetched candidates locally
+from utils.tracing import TimedEmbeddings  # Times the question embedding of each request
+from utils.logger import get_logger  # Queued (non-blocking) logging
+
+logger = get_logger(__name__)
 
 class Retriever:
     """
-    This class handles the initialization of the AstraDB vector store and retrieval of relevant documents 
-    from it based on a user query.
+    This class handles the initialization of the vector store (AstraDB or the local in-process index,
+    selected in config.yaml) and retrieval of relevant documents from it based on a user query.
     """
     
-    def __init__(self):
+    def __init__(self, config: dict = None, model_loader=None):
         # Initialize the model loader, load configurations, and environment variables
-        self.model_loader = ModelLoader()  # Load the model loader object
-        self.config = load_config()  # Load configuration from the config_loader
+        # Both default to the process-wide ones, shared with the LLM of the chain registry
+        container = get_container()
+        self.model_loader = model_loader or container.model_loader  # Load the model loader object
+        self.config = config or container.config  # Load configuration from the config_loader
         self._load_env_variables()  # Call the function to load environment variables
-        self.vstore = None  # Placeholder for AstraDB vector store (will be initialized later)
+        self.vstore = None  # Placeholder for the vector store (will be initialized later)
+        self.embeddings = None  # Placeholder for the embedding model used by the vector store
         self.retriever = None  # Placeholder for the retriever object
         """Initializing the instance variables to None. This is called as placeholder variables.
         These variables are initialized with None value, but their actual values will be set later in the code."""
@@ -28,10 +39,10 @@ class Retriever:
         Load and validate environment variables.
         The required variables should be in the .env file for proper functioning.
         """
-        load_dotenv()  # Load environment variables from the .env file
+        get_container().load_env()  # Load environment variables from the .env file (once per process)
         
-        required_vars = ["GOOGLE_API_KEY", "ASTRA_DB_API_ENDPOINT", "ASTRA_DB_APPLICATION_TOKEN", "ASTRA_DB_KEYSPACE"]
-        # List of environment variables that are required for the pipeline
+        required_vars = required_env_vars(self.config)
+        # List of environment variables that are required for the pipeline (AstraDB ones only for the astra backend)
         
         # Check if any required environment variables are missing
         missing_vars = [var for var in required_vars if os.getenv(var) is None]
@@ -53,33 +64,53 @@ class Retriever:
         - The retriever will use the vector store to fetch relevant documents based on a query.
         """
         if not self.vstore:  # If the vector store is not already initialized
-            collection_name = self.config["astra_db"]["collection_name"]  # Load the collection name from the config
+            # Kept so other components can share the same model; concurrent questions are embedded in batches
+            # TimedEmbeddings records the question embedding time of every request (embedding span on /metrics)
+            self.embeddings = TimedEmbeddings(MicroBatchEmbeddings.from_config(self.model_loader.load_embeddings(), self.config))
             
-            # Initialize the AstraDB vector store with necessary parameters (embedding model, collection name, etc.)
-            self.vstore = AstraDBVectorStore(
-                embedding=self.model_loader.load_embeddings(),  # Load the embeddings from the ModelLoader
-                collection_name=collection_name,  # Set the collection name
-                api_endpoint=self.db_api_endpoint,  # AstraDB API endpoint from the environment variables
-                token=self.db_application_token,  # Authentication token for AstraDB
-                namespace=self.db_keyspace,  # Keyspace from environment variables
-            )
+            # Initialize the configured vector store (AstraDB collection or local index) with the embedding model
+            # read_only: the local index is shared by every Retriever of the process (and preloaded gunicorn workers)
+            self.vstore = load_vector_store(self.embeddings, self.config, read_only=True)
         
         if not self.retriever:  # If the retriever is not already initialized
             # Get the value of 'top_k' from the config to define how many documents to return in search results (default is 3)
             top_k = self.config["retriever"]["top_k"] if "retriever" in self.config else 3
+            context_config = self.config.get("context", {})
+            if context_config.get("enabled", False):
+                # Over-fetch: the context packer groups, dedupes and trims the reviews to the token budget
+                top_k = context_config.get("fetch_k", top_k)
+            rerank_config = self.config.get("retriever", {}).get("rerank", {})
+            # With reranking, `depth` candidates are searched and only the best top_k are kept
+            search_k = max(rerank_config.get("depth", 30), top_k) if rerank_config.get("enabled", False) else top_k
             
             # Create the retriever from the vector store, specifying the number of documents to retrieve
-            retriever = self.vstore.as_retriever(search_kwargs={"k": top_k})
-            print("Retriever loaded successfully.")  # Print a confirmation message
-            
-            return retriever  # Return the retriever object
+            # We keep it on the instance so later calls reuse the same wrapper instead of building a new one
+            hybrid_config = self.config.get("retriever", {}).get("hybrid", {})
+            index_path = hybrid_config.get("index_path", "data/bm25_index")
+            query_parser = QueryFilterParser.from_config(self.config)  # None when filters are off or not built yet
+            if hybrid_config.get("enabled", False) and BM25Index.exists(index_path):
+                # Keyword + vector search; the BM25 arrays are memory-mapped and loaded once per process
+                self.retriever = HybridRetriever.from_config(self.vstore, bm25_index(index_path), self.config,
+                                                             query_parser=query_parser, k=search_k)
+            elif query_parser is not None:
+                # Vector search pre-filtered on the rating/product found in the question
+                self.retriever = FilteringRetriever(vectorstore=self.vstore, query_parser=query_parser, k=search_k)
+            else:
+                self.retriever = self.vstore.as_retriever(search_kwargs={"k": search_k})
+            if search_k != top_k:
+                # Cheap local reranking (lexical overlap, rating prior, cached embedding similarity)
+                self.retriever = RerankingRetriever(base_retriever=self.retriever,
+                                                    reranker=Reranker.from_config(self.embeddings, self.config), k=top_k)
+            logger.info("Retriever loaded successfully.")  # Log a confirmation message
+        
+        return self.retriever  # Return the (cached) retriever object
     
     def call_retriever(self, query: str) -> List[Document]:
         """
         This method uses the retriever to fetch documents that are relevant to the user query.
         It invokes the retriever and returns the results.
         """
-        retriever = self.load_retriever()  # Load the retriever (will initialize the vector store if needed)
+        retriever = self.load_retriever()  # Load the retriever (initialized only on the first call)
         
         # Use the retriever to invoke a search with the user query
         output = retriever.invoke(query)
@@ -0,0 +1,82 @@
+#This file selects the vector store backend from config.yaml (vector_store.backend).
+#"astra" (default) uses the AstraDB collection, "local" uses the in-process NumPy index in local_index.py.
+
+import os
+from utils.container import get_container
+
+ASTRA_ENV_VARS = ["ASTRA_DB_API_ENDPOINT", "ASTRA_DB_APPLICATION_TOKEN", "ASTRA_DB_KEYSPACE"]
+
+
+def get_backend(config: dict) -> str:
+    return config.get("vector_store", {}).get("backend", "astra")
+
+
+def required_env_vars(config: dict) -> list:
+    """
+    Environment variables needed by the configured backend (the local index needs no AstraDB credentials).
+    """
+    required = ["GOOGLE_API_KEY"]
+    if get_backend(config) == "astra":
+        required += ASTRA_ENV_VARS
+    return required
+
+
+def local_index_options(config: dict):
+    """
+    (index_path, mmap, options) of the local backend from config.yaml.
+    """
+    local_config = config["vector_store"].get("local", {})
+    options = {
+        "mode": local_config.get("mode", "exact"),
+        "nlist": local_config.get("nlist", 64),
+        "nprobe": local_config.get("nprobe", 8),
+    }
+    return local_config.get("index_path", "data/local_index"), local_config.get("mmap", True), options
+
+
+def load_vector_store(embeddings, config: dict = None, read_only: bool = False):
+    """
+    Create the configured vector store. The local backend loads its saved index when it exists,
+    otherwise it starts empty (the ingestion pipeline fills and saves it).
+    read_only=True (the server) reuses the index already loaded in this process, or preloaded by the
+    gunicorn master (utils/shared_resources.py), instead of loading a private copy.
+    """
+    config = config or get_container().config
+    backend = get_backend(config)
+
+    if backend == "astra":
+        from langchain_astradb import AstraDBVectorStore
+        return AstraDBVectorStore(
+            embedding=embeddings,
+            collection_name=config["astra_db"]["collection_name"],
+            api_endpoint=os.getenv("ASTRA_DB_API_ENDPOINT"),
+            token=os.getenv("ASTRA_DB_APPLICATION_TOKEN"),
+            namespace=os.getenv("ASTRA_DB_KEYSPACE"),
+        )
+
+    if backend == "local":
+        from retriever.local_index import LocalVectorStore
+        index_path, mmap, options = local_index_options(config)
+        if LocalVectorStore.exists(index_path):
+            if read_only:
+                from utils.shared_resources import local_index
+                return local_index(index_path, mmap, **options).with_embedding(embeddings)
+            return LocalVectorStore.load(index_path, embeddings, mmap=mmap, **options)
+        return LocalVectorStore(embeddings, **options)
+
+    raise ValueError(f"Unknown vector_store.backend: {backend}")
+
+
+def save_vector_store(vstore, config: dict = None, checkpoint: bool = False):
+    """
+    Persist the store when the backend keeps its data locally (no-op for AstraDB).
+    checkpoint=True only appends what changed since the last save (ingestion checkpoints); the
+    default writes a compacted copy of the whole index.
+    """
+    config = config or get_container().config
+    if get_backend(config) == "local":
+        index_path = config["vector_store"].get("local", {}).get("index_path", "data/local_index")
+        if checkpoint:
+            vstore.save_changes(index_path)
+        else:
+            vstore.save(index_path)
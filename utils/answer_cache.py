@@ -0,0 +1,297 @@
+#This file implements the answer cache that sits in front of the retriever + LLM chain.
+#Tier 1 (exact): LRU dictionary keyed on the normalized question text.
+#Tier 2 (semantic): re-uses an answer when the question embedding is close enough (cosine) to a cached one.
+#Both tiers are cleared when the ingestion pipeline writes new documents (see touch_ingestion_stamp).
+#Expired answers stay in their slot until it is reused: stale_lookup() serves them when the chain cannot
+#answer in time (degraded answers, utils/resilience.py).
+#An answer can be stored with the review Documents it was built from, so the first turn of a conversation
+#answered from the cache can still hand them to its follow-ups (utils/session_memory.py).
+
+import os
+import re
+import time
+from collections import OrderedDict
+import numpy as np
+from utils.metrics import REGISTRY
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercase, drop punctuation and collapse whitespace so trivial variations share one cache key.
+    """
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+def touch_ingestion_stamp(path: str):
+    """
+    Called by the ingestion pipeline after it wrote documents: updating this file tells every
+    running server that cached answers may be stale.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        file.write(str(time.time()))
+
+
+class ExactAnswerCache:
+    """
+    LRU cache with a per-entry time-to-live.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()     #key -> (answer, expires_at)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        answer, expires_at = entry
+        if expires_at <= time.time():
+            return None                   #kept for get_stale() until the LRU evicts it
+        self._entries.move_to_end(key)    #mark as most recently used
+        return answer
+
+    def get_stale(self, key: str):
+        """
+        The answer stored under key, expired or not.
+        """
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: str, answer: str):
+        self._entries[key] = (answer, time.time() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)    #evict the least recently used entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SemanticAnswerCache:
+    """
+    Stores normalized question embeddings in one contiguous float32 matrix, so a lookup is a
+    single matrix-vector product. Entries expire after `ttl_seconds`; when full, the least
+    recently used slot is overwritten.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 3600, similarity_threshold: float = 0.92):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._vectors = None                          #(max_size, dim) matrix, allocated on first put
+        self._answers = [None] * max_size
+        self._expires_at = np.zeros(max_size)         #0 means the slot is empty
+        self._last_used = np.zeros(max_size)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding):
+        if self._vectors is None:
+            return None
+        now = time.time()
+        scores = self._vectors @ self._normalize(embedding)
+        scores[self._expires_at <= now] = -np.inf     #ignore empty and expired slots
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        self._last_used[best] = now
+        return self._answers[best]
+
+    def get_stale(self, embedding):
+        """
+        Like get(), expired slots included (only cleared/empty slots are ignored).
+        """
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ self._normalize(embedding)
+        scores[self._expires_at == 0] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._answers[best]
+
+    def put(self, embedding, answer: str):
+        vector = self._normalize(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+
+        now = time.time()
+        free = np.flatnonzero(self._expires_at <= now)
+        slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+        self._vectors[slot] = vector
+        self._answers[slot] = answer
+        self._expires_at[slot] = now + self.ttl_seconds
+        self._last_used[slot] = now
+
+    def clear(self):
+        self._answers = [None] * self.max_size
+        self._expires_at[:] = 0
+        self._last_used[:] = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self._expires_at > time.time()))
+
+
+class CacheLookup:
+    """
+    Result of AnswerCache.alookup. Keep it and pass it to astore() so the key and the
+    embedding computed during the lookup are not computed again.
+    """
+    __slots__ = ("key", "query", "embedding", "answer", "documents", "tier")
+
+    def __init__(self, key, query=None, embedding=None, answer=None, documents=None, tier=None):
+        self.key = key
+        self.query = query            #the question as asked: what is embedded, like the retrieval does
+        self.embedding = embedding
+        self.answer = answer
+        self.documents = documents    #the Documents stored with the answer, None when there were none
+        self.tier = tier              #"exact", "semantic" or None on a miss
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache (exact LRU + semantic) with invalidation on new ingestions.
+    The semantic tier is only active when an embeddings model is given.
+    """
+
+    def __init__(self, exact: ExactAnswerCache, semantic: SemanticAnswerCache = None, embeddings=None,
+                 invalidation_file: str = None, invalidation_check_seconds: float = 5.0):
+        self.exact = exact
+        self.semantic = semantic if embeddings is not None else None
+        self.embeddings = embeddings
+        self.invalidation_file = invalidation_file
+        self.invalidation_check_seconds = invalidation_check_seconds
+        self._stamp = self._read_stamp()
+        self._next_check = time.time() + invalidation_check_seconds
+        self.exact_hits = REGISTRY.counter("answer_cache_exact_hits_total", "Answers served from the exact tier")
+        self.semantic_hits = REGISTRY.counter("answer_cache_semantic_hits_total", "Answers served from the semantic tier")
+        self.misses = REGISTRY.counter("answer_cache_misses_total", "Questions not found in the answer cache")
+        self.invalidations = REGISTRY.counter("answer_cache_invalidations_total", "Cache clears caused by new ingestions")
+        self.stale_hits = REGISTRY.counter("answer_cache_stale_hits_total", "Expired answers served as degraded answers")
+
+    @classmethod
+    def from_config(cls, config: dict, embeddings=None):
+        """
+        Build the cache from the `cache` section of config.yaml. Returns None when caching is disabled.
+        """
+        cache_config = config.get("cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+        exact_config = cache_config.get("exact", {})
+        semantic_config = cache_config.get("semantic", {})
+        semantic = None
+        if semantic_config.get("enabled", True):
+            semantic = SemanticAnswerCache(
+                max_size=semantic_config.get("max_size", 2048),
+                ttl_seconds=semantic_config.get("ttl_seconds", 3600),
+                similarity_threshold=semantic_config.get("similarity_threshold", 0.92),
+            )
+        return cls(
+            exact=ExactAnswerCache(exact_config.get("max_size", 1024), exact_config.get("ttl_seconds", 3600)),
+            semantic=semantic,
+            embeddings=embeddings,
+            invalidation_file=cache_config.get("invalidation_file"),
+            invalidation_check_seconds=cache_config.get("invalidation_check_seconds", 5.0),
+        )
+
+    def _read_stamp(self):
+        if not self.invalidation_file:
+            return None
+        try:
+            return os.stat(self.invalidation_file).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _check_invalidation(self):
+        """
+        Clear both tiers when the ingestion stamp file changed (checked at most every few seconds).
+        """
+        now = time.time()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.invalidation_check_seconds
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.clear()
+            self.invalidations.inc()
+
+    def clear(self):
+        self.exact.clear()
+        if self.semantic is not None:
+            self.semantic.clear()
+
+    async def alookup(self, query: str) -> CacheLookup:
+        self._check_invalidation()
+        lookup = CacheLookup(normalize_query(query), query)
+
+        # Both tiers store (answer, documents) entries
+        entry = self.exact.get(lookup.key)
+        if entry is not None:
+            (lookup.answer, lookup.documents), lookup.tier = entry, "exact"
+            self.exact_hits.inc()
+            return lookup
+
+        if self.semantic is not None:
+            lookup.embedding = await self.embeddings.aembed_query(query)
+            entry = self.semantic.get(lookup.embedding)
+            if entry is not None:
+                (lookup.answer, lookup.documents), lookup.tier = entry, "semantic"
+                self.semantic_hits.inc()
+                self.exact.put(lookup.key, entry)     #next time the same wording skips the embedding call
+                return lookup
+
+        self.misses.inc()
+        return lookup
+
+    async def astore(self, lookup: CacheLookup, answer: str, documents=None):
+        """
+        Store the answer, with the Documents it was built from when the caller has them.
+        """
+        if not answer:
+            return
+        entry = (answer, tuple(documents) if documents else None)
+        self.exact.put(lookup.key, entry)
+        if self.semantic is not None:
+            if lookup.embedding is None:
+                # The raw question, not the normalized key: the retriever embedded the same text, so with
+                # the embedding cache this is a lookup, and the vector is comparable to alookup()'s
+                lookup.embedding = await self.embeddings.aembed_query(lookup.query or lookup.key)
+            self.semantic.put(lookup.embedding, entry)
+
+    def stale_lookup(self, lookup: CacheLookup):
+        """
+        Answer for a question that missed the cache, accepting expired entries (None when there is none).
+        Uses the embedding computed by alookup(), never a new embedding call.
+        """
+        entry = self.exact.get_stale(lookup.key)
+        if entry is None and self.semantic is not None and lookup.embedding is not None:
+            entry = self.semantic.get_stale(lookup.embedding)
+        if entry is None:
+            return None
+        self.stale_hits.inc()
+        return entry[0]
+
+    def stats(self) -> dict:
+        hits = self.exact_hits.value + self.semantic_hits.value
+        total = hits + self.misses.value
+        return {
+            "exact_hits": self.exact_hits.value,
+            "semantic_hits": self.semantic_hits.value,
+            "misses": self.misses.value,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations.value,
+            "stale_hits": self.stale_hits.value,
+            "exact_entries": len(self.exact),
+            "semantic_entries": len(self.semantic) if self.semantic is not None else 0,
+        }
@@ -0,0 +1,89 @@
+#Atomic replacement of the index files that serving workers load or memory-map (local vector index, BM25 index,
+#metadata columns, product catalog).
+#Rewriting a mapped file in place changes the data under the worker's in-memory ids and texts, or kills it
+#with SIGBUS when the file gets shorter. Writing a temp file in the same directory and os.replace()-ing it
+#swaps the directory entry instead: mapped workers keep reading the old inode until they reload.
+#An index made of several files must also change as a set (vectors and the ids of their rows): those are
+#written into a new version directory, and one pointer file (CURRENT) is swapped to publish it.
+
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+VERSION_POINTER = "CURRENT"
+_VERSION_PREFIX = "v-"
+
+
+def _replace_with(path: str, write, mode: str, **open_kwargs):
+    directory = os.path.dirname(path) or "."
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(descriptor, mode, **open_kwargs) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def save_npy(path: str, array):
+    """
+    np.save(path, array), replacing `path` atomically.
+    """
+    _replace_with(path, lambda file: np.save(file, array), "wb")
+
+
+def save_json(path: str, data, **dump_kwargs):
+    """
+    json.dump(data) to `path`, replacing it atomically.
+    """
+    _replace_with(path, lambda file: json.dump(data, file, **dump_kwargs), "w", encoding="utf-8")
+
+
+def current_version(path: str):
+    """
+    (directory holding the current files of the versioned index at `path`, the pointer's contents).
+    An index written before versioning keeps its files in `path` itself: (path, {}).
+    """
+    try:
+        with open(os.path.join(path, VERSION_POINTER), encoding="utf-8") as file:
+            pointer = json.load(file)
+    except FileNotFoundError:
+        return path, {}
+    return os.path.join(path, pointer["version"]), pointer
+
+
+def update_version(path: str, **fields):
+    """
+    Rewrite the pointer of the current version with extra fields (e.g. files added to that version).
+    """
+    _, pointer = current_version(path)
+    save_json(os.path.join(path, VERSION_POINTER), {**pointer, **fields})
+
+
+def publish_version(path: str, write, keep: int = 2, **fields):
+    """
+    Call write(directory) to fill a new version directory under `path`, then make it the current one.
+    Readers see either the old or the new set of files, never a mix. The `keep` most recent versions
+    stay on disk, so a reader that has just read the pointer can still open the files it names.
+    """
+    os.makedirs(path, exist_ok=True)
+    versions = sorted(name for name in os.listdir(path) if name.startswith(_VERSION_PREFIX))
+    number = int(versions[-1][len(_VERSION_PREFIX):]) + 1 if versions else 1
+    name = f"{_VERSION_PREFIX}{number:06d}"
+    directory = os.path.join(path, name)
+    os.makedirs(directory)
+    try:
+        write(directory)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    save_json(os.path.join(path, VERSION_POINTER), {"version": name, **fields})
+    for old in (versions + [name])[:-keep]:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+    return directory
@@ -0,0 +1,226 @@
+#This file builds the RAG chain(s) once at application startup and keeps them for every request.
+#Building the retriever, parsing the prompt and creating the LLM client are all one-time costs,
+#so the request handlers only have to look the ready chain up from the registry.
+
+import time
+from operator import itemgetter
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from utils.container import get_container
+from prompt_library.prompt import PROMPT_TEMPLATES
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+
+class ChainRegistry:
+    """
+    Holds the components (retriever, prompt, LLM) and the compiled chains built from them.
+    Components can be injected (e.g. local stubs for load tests); anything not injected
+    is created from the project configuration when build() is called.
+    """
+
+    def __init__(self, config: dict = None, retriever=None, llm=None, embeddings=None, template_name: str = "product_bot",
+                 session_template_name: str = "product_bot_session", router=None, resilience=None):
+        self.config = config or get_container().config
+        self.template_name = template_name
+        self.session_template_name = session_template_name     #chain for conversations with session memory
+        self.retriever = retriever      #LangChain retriever (runnable) used to fetch the context
+        self.loads_retriever = retriever is None   #built from config: reloaded after an ingestion run
+        self.llm = llm                  #Chat model used to generate the answer
+        self.router = router            #LLMRouter choosing among several chat models (llm.routing), replaces llm
+        self.embeddings = embeddings    #Embedding model shared with the retriever (used by the semantic cache)
+        self.resilience = resilience    #deadlines, hedged retrieval, circuit breakers (resilience section), None when disabled
+        self.prompt = None
+        self.context_packer = None      #groups/dedupes the retrieved reviews into a compact {context}
+        self.chains = {}                #compiled chains keyed by prompt template name
+        self.startup_report = {}        #stage name -> seconds spent while building
+        self.ready = False
+        self.setup_time = REGISTRY.histogram(
+            "chat_request_setup_seconds", "Time spent getting the chain ready for a chat request"
+        )
+
+    def _timed(self, stage: str, func):
+        """
+        Run func() and record how long it took in the startup report.
+        """
+        start = time.perf_counter()
+        result = func()
+        self.startup_report[stage] = round(time.perf_counter() - start, 4)
+        return result
+
+    def _load_retriever(self):
+        # Imported here so that injecting a stub retriever does not require AstraDB credentials
+        from retriever.retrieval import Retriever
+        retriever_obj = Retriever(self.config)
+        retriever = retriever_obj.load_retriever()
+        if self.embeddings is None:
+            self.embeddings = retriever_obj.embeddings
+        return retriever
+
+    def _load_llm(self):
+        # Same ModelLoader (and .env / config parsing) as the retriever's embeddings
+        return get_container().model_loader.load_llm()
+
+    def _load_router(self):
+        from utils.llm_router import LLMRouter
+        return LLMRouter.from_config(self.config, get_container().model_loader.load_llm)
+
+    def _load_resilience(self):
+        from utils.resilience import Resilience
+        from utils.shared_resources import product_catalog
+        return Resilience.from_config(self.config, product_catalog(self.config))
+
+    def _guard(self, llm, upstream: str):
+        """
+        The chat model behind the request deadline and its circuit breaker (when resilience is enabled).
+        """
+        if self.resilience is None:
+            return llm
+        return self.resilience.guarded_llm(llm, upstream)
+
+    def _generation(self, prompt, record_tokens):
+        """
+        prompt -> LLM -> text: on the tier picked by the router, or on the single chat model.
+        """
+        if self.router is not None:
+            return self.router.generation(prompt, guard=self._guard)
+        return prompt | record_tokens | self._guard(self.llm, "llm") | StrOutputParser()
+
+    def build(self):
+        """
+        Build every component and compile the chain once. Safe to call more than once.
+        """
+        if self.ready:
+            return self
+
+        total_start = time.perf_counter()
+        if self.retriever is None:
+            from utils.shared_resources import indexes_changed
+            indexes_changed(self.config)    #records the ingestion stamp of the indexes loaded now
+            self.retriever = self._timed("retriever", self._load_retriever)
+        if self.llm is None and self.router is None:
+            self.router = self._timed("llm_router", self._load_router)
+        if self.llm is None and self.router is None:
+            self.llm = self._timed("llm", self._load_llm)
+        if self.resilience is None:
+            self.resilience = self._timed("resilience", self._load_resilience)
+        if self.resilience is not None:
+            # Retrieval is bounded by the deadline and hedged; each LLM tier gets its own circuit breaker
+            self.retriever = self.resilience.hedged_retriever(self.retriever)
+            for tier in (self.router.tiers if self.router is not None else []):
+                tier.breaker = self.resilience.breaker(f"llm_{tier.name}")
+
+        self.prompt = self._timed(
+            "prompt", lambda: ChatPromptTemplate.from_template(PROMPT_TEMPLATES[self.template_name])
+        )
+
+        from retriever.context_packer import ContextPacker, record_prompt_tokens, arecord_prompt_tokens
+        self.context_packer = self._timed("context_packer", lambda: ContextPacker.from_config(self.config))
+        context = self.retriever
+        if self.context_packer is not None:
+            context = self.retriever | RunnableLambda(self.context_packer.pack, afunc=self.context_packer.apack)
+        record_tokens = RunnableLambda(record_prompt_tokens, afunc=arecord_prompt_tokens)
+
+        # Build the chain:
+        # 1. Use retriever to inject context (packed per product under a token budget)
+        # 2. Pass context + user question to the prompt
+        # 3. Record the prompt size, then feed prompt to LLM (the routed tier when llm.routing is enabled)
+        # 4. Parse LLM output to string
+        self.chains[self.template_name] = self._timed(
+            "chain",
+            lambda: {"context": context, "question": RunnablePassthrough()} | self._generation(self.prompt, record_tokens),
+        )
+        # Session chain (utils/session_memory.py): input {question, history, retrieval_query, documents}.
+        # It retrieves only when the turn has no reused documents, and streams {"documents": [...]} first
+        # (so the turn can be recorded) and then the answer chunks as {"answer": "..."}.
+        session_prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATES[self.session_template_name])
+        session_context = itemgetter("documents")
+        if self.context_packer is not None:
+            session_context = session_context | RunnableLambda(self.context_packer.pack, afunc=self.context_packer.apack)
+        self.chains[self.session_template_name] = self._timed(
+            "session_chain",
+            lambda: (
+                RunnablePassthrough.assign(documents=RunnableLambda(self._turn_documents, afunc=self._aturn_documents))
+                | RunnablePassthrough.assign(
+                    answer={"context": session_context, "question": itemgetter("question"), "history": itemgetter("history")}
+                    | self._generation(session_prompt, record_tokens)
+                )
+            ),
+        )
+        self.startup_report["build_total"] = round(time.perf_counter() - total_start, 4)
+        self.ready = True
+        return self
+
+    def _turn_documents(self, inputs: dict, config):
+        if inputs.get("documents") is not None:
+            return inputs["documents"]
+        return self.retriever.invoke(inputs["retrieval_query"], config)
+
+    async def _aturn_documents(self, inputs: dict, config):
+        if inputs.get("documents") is not None:
+            return inputs["documents"]
+        return await self.retriever.ainvoke(inputs["retrieval_query"], config)
+
+    def reload_indexes(self) -> bool:
+        """
+        Rebuild the chains over freshly loaded indexes (local vector index, BM25, product catalog) when an
+        ingestion ran since they were loaded. Requests already running finish on the previous chains.
+        Returns True when the chains were rebuilt.
+        """
+        from utils import shared_resources
+        if not self.loads_retriever or not shared_resources.indexes_changed(self.config):
+            return False
+        stamp = shared_resources.ingestion_stamp(self.config)
+        shared_resources.clear()
+        fresh = ChainRegistry(config=self.config, llm=self.llm, embeddings=self.embeddings, router=self.router,
+                              resilience=self.resilience, template_name=self.template_name,
+                              session_template_name=self.session_template_name).build()
+        shared_resources.mark_loaded(stamp)
+        self.retriever, self.context_packer, self.chains = fresh.retriever, fresh.context_packer, fresh.chains
+        if self.resilience is not None:
+            self.resilience.degraded.catalog = shared_resources.product_catalog(self.config)
+        self.startup_report["reload"] = fresh.startup_report.get("build_total")
+        return True
+
+    async def awarm_up(self):
+        """
+        Send one query through the async chain path so connections, auth tokens and lazy
+        (async) client state are initialized before the first real user request.
+        Failures are reported, not raised.
+        """
+        server_config = self.config.get("server", {})
+        query = server_config.get("warm_up_query")
+        if not server_config.get("warm_up", True) or not query:
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.get_chain().ainvoke(query)
+        except Exception as e:
+            logger.warning("Warm-up call failed: %s", e)
+        self.startup_report["warm_up"] = round(time.perf_counter() - start, 4)
+
+    def get_chain(self, name: str = None):
+        """
+        Return the compiled chain for the given template name (default: the registry's template).
+        """
+        if not self.ready:
+            raise RuntimeError("ChainRegistry.build() must be called before requesting a chain")
+        return self.chains[name or self.template_name]
+
+    def report(self) -> dict:
+        """
+        Startup timings plus the per-request setup time metric.
+        """
+        report = {
+            "startup_seconds": dict(self.startup_report),
+            "request_setup_seconds": self.setup_time.snapshot(),
+        }
+        if self.router is not None:
+            report["llm_tiers"] = self.router.stats()
+        if self.resilience is not None:
+            report["circuit_breakers"] = self.resilience.stats()
+        return report
@@ -0,0 +1,75 @@
+#This file contains the concurrency limiter used by the chat endpoints.
+#It bounds how many chains run at the same time per worker and how many requests may wait for a slot,
+#so that under overload we answer quickly with 503 instead of letting every request get slower.
+
+import asyncio
+from contextlib import asynccontextmanager
+from utils.metrics import REGISTRY
+
+
+class LimiterSaturated(Exception):
+    """
+    Raised when the limiter cannot give a slot (queue full or waited too long).
+    """
+
+
+class ConcurrencyLimiter:
+    """
+    Async limiter: at most `max_concurrency` requests run, at most `max_queue` wait for a slot,
+    and a waiting request gives up after `queue_timeout` seconds.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, queue_timeout: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0      #requests currently holding a slot
+        self.waiting = 0        #requests waiting for a slot
+        self.rejected = REGISTRY.counter("chat_requests_rejected_total", "Requests rejected by the concurrency limiter")
+        self.queue_wait = REGISTRY.histogram("chat_queue_wait_seconds", "Time spent waiting for a concurrency slot")
+
+    @classmethod
+    def from_config(cls, config: dict):
+        server_config = config.get("server", {})
+        return cls(
+            max_concurrency=server_config.get("max_concurrency", 16),
+            max_queue=server_config.get("max_queue", 64),
+            queue_timeout=server_config.get("queue_timeout_seconds", 5.0),
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one concurrency slot for the duration of the block.
+        Raises LimiterSaturated immediately when the wait queue is already full.
+        """
+        if self.in_flight + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected.inc()
+            raise LimiterSaturated("Too many requests in queue")
+
+        self.waiting += 1
+        try:
+            with self.queue_wait.time():
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected.inc()
+            raise LimiterSaturated("Timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected.value,
+        }
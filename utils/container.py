@@ -0,0 +1,65 @@
+#Process-wide container of the things every component used to build for itself: the parsed config.yaml,
+#the .env variables and the ModelLoader (Gemini clients). main.py, ChainRegistry, Retriever and the
+#ModelLoader all ask the container, so the file is parsed and load_dotenv() runs once per process instead
+#of once per constructor, and the retriever and the LLM share one ModelLoader.
+#Nothing heavy is imported here; the ModelLoader (langchain_google_genai) is imported on first use.
+
+import threading
+from config.config_loader import load_config
+
+
+class AppContainer:
+    """
+    Lazily created, then cached, process-wide configuration and clients.
+    """
+
+    def __init__(self, config_path: str = "config/config.yaml"):
+        self.config_path = config_path
+        self._config = None
+        self._env_loaded = False
+        self._model_loader = None
+        self._lock = threading.RLock()
+
+    @property
+    def config(self) -> dict:
+        """
+        Parsed config.yaml, shared by the whole process: copy it (copy.deepcopy) before changing it.
+        """
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = load_config(self.config_path)
+        return self._config
+
+    def load_env(self):
+        """
+        Load the .env file into the environment (once).
+        """
+        if not self._env_loaded:
+            with self._lock:
+                if not self._env_loaded:
+                    from dotenv import load_dotenv
+                    load_dotenv()
+                    self._env_loaded = True
+
+    @property
+    def model_loader(self):
+        if self._model_loader is None:
+            with self._lock:
+                if self._model_loader is None:
+                    from utils.model_loader import ModelLoader
+                    self._model_loader = ModelLoader(self.config)
+        return self._model_loader
+
+
+_container = None
+_container_lock = threading.Lock()
+
+
+def get_container() -> AppContainer:
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = AppContainer()
+    return _container
@@ -0,0 +1,91 @@
+#Micro-batcher for query embeddings.
+#Under burst load many chat requests embed their question at the same moment. Instead of one API
+#round-trip per question, concurrent aembed_query calls are collected for a short window (or until
+#max_batch_size questions are waiting) and sent as one batched call; each caller gets its own vector back.
+
+import asyncio
+import time
+from typing import List
+from langchain_core.embeddings import Embeddings
+from utils.embedding_cache import batch_embed_queries
+from utils.metrics import REGISTRY
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25)
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """
+    Wraps an embedding model. Async query embeddings are batched; everything else
+    (document embeddings, sync calls) is passed straight through.
+    Must be used from a single event loop (the server's).
+    """
+
+    def __init__(self, underlying: Embeddings, max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        self.underlying = underlying
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self._pending = []          #(text, future, enqueued_at) waiting for the next flush
+        self._timer = None
+        self._tasks = set()         #running batch calls (referenced so they are not garbage collected)
+        self.batch_size = REGISTRY.histogram(
+            "query_embedding_batch_size", "Questions per batched embedding call", buckets=BATCH_SIZE_BUCKETS)
+        self.queue_wait = REGISTRY.histogram(
+            "query_embedding_queue_wait_seconds", "Time a question waited for its batch to be sent",
+            buckets=QUEUE_WAIT_BUCKETS)
+
+    @classmethod
+    def from_config(cls, underlying: Embeddings, config: dict) -> Embeddings:
+        """
+        Wrap `underlying` when query_embedding_batcher is enabled in config.yaml, otherwise return it as is.
+        """
+        batcher_config = config.get("query_embedding_batcher", {})
+        if not batcher_config.get("enabled", False):
+            return underlying
+        return cls(underlying, batcher_config.get("max_batch_size", 16), batcher_config.get("max_wait_ms", 10.0))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        sent_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.queue_wait.observe(sent_at - enqueued_at)
+        texts = list(dict.fromkeys(text for text, _, _ in batch))     #identical questions are embedded once
+        self.batch_size.observe(len(texts))
+        try:
+            vectors = dict(zip(texts, await batch_embed_queries(self.underlying, texts)))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future, _ in batch:
+            if not future.done():      #the caller may have been cancelled meanwhile
+                future.set_result(vectors[text])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
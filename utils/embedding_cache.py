@@ -0,0 +1,157 @@
+#On-disk embedding cache shared by ingestion and queries.
+#Vectors are stored in SQLite keyed by (model_name, task, sha256 of the text), so re-running the ingestion
+#over an unchanged CSV, or asking the same question again, makes no embedding API call.
+#Rows written by another embedding model are deleted when the cache is opened, so changing
+#embedding_model.model_name in config.yaml invalidates the cache cleanly.
+#The async methods run the SQLite reads and writes in a worker thread, so they never block the event loop.
+
+import asyncio
+import hashlib
+import inspect
+import os
+import sqlite3
+import threading
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+_SQLITE_MAX_VARIABLES = 500    #keep "IN (?, ?, ...)" lookups below SQLite's parameter limit
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def batch_embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several queries in one call. Models that embed queries differently from documents
+    (like Gemini's RETRIEVAL_QUERY task type) get the query task type on the batched call.
+    """
+    if hasattr(embeddings, "aembed_queries"):
+        return await embeddings.aembed_queries(texts)
+    if "task_type" in inspect.signature(embeddings.aembed_documents).parameters:
+        return await embeddings.aembed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return await embeddings.aembed_documents(texts)
+
+
+class EmbeddingStore:
+    """
+    SQLite table of float32 vectors. Safe to use from several threads (one connection, one lock)
+    and from several processes (WAL journal mode).
+    """
+
+    def __init__(self, path: str, model_name: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, task TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, task, hash))"
+        )
+        # Vectors from a different model are useless (and may even have another dimension)
+        with self._conn:
+            deleted = self._conn.execute("DELETE FROM embeddings WHERE model != ?", (model_name,)).rowcount
+        if deleted:
+            logger.info("Embedding cache: removed %d vectors of other embedding models", deleted)
+
+    def get_many(self, task: str, hashes: List[str]) -> dict:
+        """
+        Return {hash: vector} for the hashes that are stored.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _SQLITE_MAX_VARIABLES):
+                chunk = hashes[start:start + _SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND task = ? "
+                    f"AND hash IN ({','.join('?' * len(chunk))})",
+                    (self.model_name, task, *chunk),
+                ).fetchall()
+                for hash_value, blob in rows:
+                    found[hash_value] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, task: str, items: dict):
+        """
+        Store {hash: vector}.
+        """
+        rows = [(self.model_name, task, hash_value, np.asarray(vector, dtype=np.float32).tobytes())
+                for hash_value, vector in items.items()]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?",
+                                      (self.model_name,)).fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model: vectors already in the store are returned from disk, only the
+    missing texts are sent to the underlying model (deduplicated, in one batched call).
+    Document and query embeddings are cached separately because the model embeds them differently.
+    """
+
+    def __init__(self, underlying: Embeddings, store: EmbeddingStore):
+        self.underlying = underlying
+        self.store = store
+        self.hits = REGISTRY.counter("embedding_cache_hits_total", "Texts whose embedding came from the cache")
+        self.misses = REGISTRY.counter("embedding_cache_misses_total", "Texts sent to the embedding model")
+
+    def _lookup(self, task: str, texts: List[str]):
+        hashes = [content_hash(text) for text in texts]
+        found = self.store.get_many(task, list(set(hashes)))
+        missing = {}      #hash -> text, deduplicated
+        for hash_value, text in zip(hashes, texts):
+            if hash_value not in found:
+                missing[hash_value] = text
+        self.hits.inc(len(texts) - sum(1 for h in hashes if h in missing))
+        self.misses.inc(len(missing))
+        return hashes, found, missing
+
+    def _finish(self, task: str, hashes, found, missing, vectors) -> List[List[float]]:
+        # Round to float32 like the stored copy, so a cached and a fresh vector are identical
+        computed = {hash_value: np.asarray(vector, dtype=np.float32).tolist()
+                    for hash_value, vector in zip(missing.keys(), vectors)}
+        if computed:
+            self.store.put_many(task, computed)
+            found.update(computed)
+        return [list(found[hash_value]) for hash_value in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes, found, missing = self._lookup("document", texts)
+        vectors = self.underlying.embed_documents(list(missing.values())) if missing else []
+        return self._finish("document", hashes, found, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        hashes, found, missing = self._lookup("query", [text])
+        vectors = [self.underlying.embed_query(text)] if missing else []
+        return self._finish("query", hashes, found, missing, vectors)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes, found, missing = await asyncio.to_thread(self._lookup, "document", texts)
+        vectors = await self.underlying.aembed_documents(list(missing.values())) if missing else []
+        return await asyncio.to_thread(self._finish, "document", hashes, found, missing, vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        hashes, found, missing = await asyncio.to_thread(self._lookup, "query", [text])
+        vectors = [await self.underlying.aembed_query(text)] if missing else []
+        return (await asyncio.to_thread(self._finish, "query", hashes, found, missing, vectors))[0]
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Batched version of aembed_query (used by the query micro-batcher).
+        """
+        hashes, found, missing = await asyncio.to_thread(self._lookup, "query", texts)
+        vectors = await batch_embed_queries(self.underlying, list(missing.values())) if missing else []
+        return await asyncio.to_thread(self._finish, "query", hashes, found, missing, vectors)
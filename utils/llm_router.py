@@ -0,0 +1,201 @@
+#Routes every question to one of several LLM tiers (llm.routing in config.yaml), e.g. gemini-1.5-flash for
+#"rating of BoAt Rockerz 235v2" and gemini-1.5-pro for "compare the bass of the boAt and realme earphones".
+#The decision is made locally, without a model call, from what the chain already has when the prompt is
+#formatted: the question (word count, intent from keywords) and the packed context (products, tokens).
+#   - tiers are listed fastest first; a question goes to the first tier whose limits it fits,
+#     the last tier takes everything else
+#   - a tier with max_in_flight set is skipped while that many of its calls are running (its queue is
+#     long), and the question goes to the next faster tier instead of waiting behind them
+#   - a tier whose circuit breaker is open (utils/resilience.py) hands the question to the first tier
+#     whose circuit is closed
+#Per tier: hit counter, in-flight gauge and latency histogram (llm_tier_<name>_*), shown on /metrics.
+
+import re
+import time
+from typing import List, Optional
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+from retriever.bm25 import tokenize
+from retriever.context_packer import arecord_prompt_tokens, estimate_tokens, record_prompt_tokens
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+_fallbacks = REGISTRY.counter("llm_route_fallbacks_total", "Questions sent to a faster tier because the chosen tier was busy")
+
+#Checked in this order; the first intent with a matching keyword wins
+INTENT_KEYWORDS = {
+    "comparison": {"compare", "comparison", "vs", "versus", "difference", "differences", "between", "than",
+                   "better", "worse"},
+    "explanation": {"why", "explain", "pros", "cons", "worth", "should", "problems", "issues", "complaints"},
+    "lookup": {"rating", "rated", "stars", "star", "price", "cost", "reviews", "how"},
+    "recommendation": {"suggest", "recommend", "best", "good", "top", "which", "budget", "cheap"},
+}
+
+_PRODUCT_HEADER = re.compile(r"^Product: ", re.MULTILINE)
+
+
+def detect_intent(question: str) -> str:
+    words = set(tokenize(question))
+    for intent, keywords in INTENT_KEYWORDS.items():
+        if words & keywords:
+            return intent
+    return "general"
+
+
+class QueryFeatures:
+    """
+    What the classifier looks at, computed from the prompt inputs ({question, context[, history]}).
+    """
+    __slots__ = ("question_words", "intent", "products", "context_tokens")
+
+    def __init__(self, inputs: dict):
+        question = str(inputs.get("question", ""))
+        context = inputs.get("context", "")
+        if isinstance(context, str):
+            self.products = len(_PRODUCT_HEADER.findall(context)) or (1 if context.strip() else 0)
+        else:
+            # Raw retrieved Documents (context packing disabled)
+            self.products = len({doc.metadata.get("product_name") for doc in context})
+            context = "\n".join(doc.page_content for doc in context)
+        self.question_words = len(tokenize(question))
+        self.intent = detect_intent(question)
+        self.context_tokens = estimate_tokens(str(context)) + estimate_tokens(str(inputs.get("history", "")))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class LLMTier:
+    """
+    One chat model and the limits of the questions it answers.
+    None means "no limit"; intents=None accepts every intent.
+    """
+
+    def __init__(self, name: str, llm, max_question_words: int = None, max_context_tokens: int = None,
+                 max_products: int = None, intents: List[str] = None, max_in_flight: int = None):
+        self.name = name
+        self.llm = llm
+        self.max_question_words = max_question_words
+        self.max_context_tokens = max_context_tokens
+        self.max_products = max_products
+        self.intents = set(intents) if intents is not None else None
+        self.max_in_flight = max_in_flight
+        self.breaker = None             #CircuitBreaker of the tier's model, set when resilience is enabled
+        self.hits = REGISTRY.counter(f"llm_tier_{name}_requests_total", f"Questions answered by the {name} tier")
+        self.in_flight = REGISTRY.gauge(f"llm_tier_{name}_in_flight", f"Calls to the {name} tier currently running")
+        self.latency = REGISTRY.histogram(f"llm_tier_{name}_seconds", f"Prompt-to-last-token time of the {name} tier")
+
+    def accepts(self, features: QueryFeatures) -> bool:
+        return ((self.max_question_words is None or features.question_words <= self.max_question_words)
+                and (self.max_context_tokens is None or features.context_tokens <= self.max_context_tokens)
+                and (self.max_products is None or features.products <= self.max_products)
+                and (self.intents is None or features.intent in self.intents))
+
+    def busy(self) -> bool:
+        return self.max_in_flight is not None and self.in_flight.value >= self.max_in_flight
+
+    def circuit_open(self) -> bool:
+        return self.breaker is not None and self.breaker.is_open()
+
+
+class LLMRouter:
+    """
+    Picks the tier of each question and runs the generation (prompt -> LLM -> text) on it.
+    """
+
+    def __init__(self, tiers: List[LLMTier]):
+        if not tiers:
+            raise ValueError("LLMRouter needs at least one tier")
+        self.tiers = tiers
+
+    @classmethod
+    def from_config(cls, config: dict, load_llm) -> Optional["LLMRouter"]:
+        """
+        Router for llm.routing in config.yaml, or None when routing is disabled.
+        load_llm(model_name) creates the chat model of a tier.
+        """
+        routing_config = config.get("llm", {}).get("routing", {})
+        if not routing_config.get("enabled", False):
+            return None
+        tiers = []
+        for tier_config in routing_config.get("tiers", []):
+            tiers.append(LLMTier(
+                name=tier_config["name"],
+                llm=load_llm(tier_config["model_name"]),
+                max_question_words=tier_config.get("max_question_words"),
+                max_context_tokens=tier_config.get("max_context_tokens"),
+                max_products=tier_config.get("max_products"),
+                intents=tier_config.get("intents"),
+                max_in_flight=tier_config.get("max_in_flight"),
+            ))
+        return cls(tiers)
+
+    def choose(self, features: QueryFeatures) -> LLMTier:
+        """
+        First tier (fastest first) that accepts the question; a busy tier hands it to the next faster one,
+        a tier with an open circuit to the first tier whose circuit is closed.
+        """
+        position = next((i for i, tier in enumerate(self.tiers) if tier.accepts(features)), len(self.tiers) - 1)
+        chosen = self.tiers[position]
+        while position > 0 and self.tiers[position].busy():
+            position -= 1
+        tier = self.tiers[position]
+        if tier.circuit_open():
+            tier = next((other for other in self.tiers if not other.circuit_open()), tier)
+        if tier is not chosen:
+            _fallbacks.inc()
+        return tier
+
+    def generation(self, prompt, guard=None):
+        """
+        prompt -> routed LLM -> text, as one streaming runnable taking the prompt inputs.
+        guard(llm, upstream) wraps the model of every tier (deadline and circuit breaker checks).
+        """
+        chains = {}
+        for tier in self.tiers:
+            llm = guard(tier.llm, f"llm_{tier.name}") if guard is not None else tier.llm
+            chains[tier.name] = prompt | RunnableLambda(record_prompt_tokens, afunc=arecord_prompt_tokens) | llm | StrOutputParser()
+
+        def route(input_chunks, config):
+            inputs = {}
+            for chunk in input_chunks:
+                inputs.update(chunk)
+            features = QueryFeatures(inputs)
+            tier = self.choose(features)
+            logger.debug("Routed to %s: %s", tier.name, features.as_dict())
+            tier.hits.inc()
+            tier.in_flight.inc()
+            start = time.perf_counter()
+            try:
+                yield from chains[tier.name].stream(inputs, config)
+            finally:
+                tier.in_flight.dec()
+                tier.latency.observe(time.perf_counter() - start)
+
+        async def aroute(input_chunks, config):
+            inputs = {}
+            async for chunk in input_chunks:
+                inputs.update(chunk)
+            features = QueryFeatures(inputs)
+            tier = self.choose(features)
+            logger.debug("Routed to %s: %s", tier.name, features.as_dict())
+            tier.hits.inc()
+            tier.in_flight.inc()
+            start = time.perf_counter()
+            try:
+                async for chunk in chains[tier.name].astream(inputs, config):
+                    yield chunk
+            finally:
+                tier.in_flight.dec()
+                tier.latency.observe(time.perf_counter() - start)
+
+        return RunnableGenerator(route, aroute, name="LLMRouter")
+
+    def stats(self) -> dict:
+        return {
+            tier.name: {"requests": tier.hits.value, "in_flight": tier.in_flight.value,
+                        "seconds": tier.latency.snapshot()}
+            for tier in self.tiers
+        }
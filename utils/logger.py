@@ -0,0 +1,101 @@
+#Leveled, sampled, non-blocking logging for the application.
+#Log calls only put the record on an in-memory queue (QueueHandler); a background thread (QueueListener)
+#formats it and writes it to stderr, so request handlers never wait on console/file I/O.
+#Chatty per-request loggers are sampled: only a share of their DEBUG/INFO records is kept
+#(warnings and errors always are). When the queue is full, records are dropped and counted.
+#
+#Usage:  logger = get_logger(__name__);  logger.info("Retriever loaded")
+#setup_logging(config) is called once per process (server startup, ingestion CLI); it is idempotent.
+#Forked worker processes (gunicorn with preload) get their own queue and writer thread.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Dict, Optional
+from utils.metrics import REGISTRY
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+_dropped = REGISTRY.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a share `rate` of the records below WARNING for the configured loggers (and their children).
+    """
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = dict(sample_rates)
+
+    def _rate(self, logger_name: str) -> float:
+        name = logger_name
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: a full queue drops the record instead of waiting.
+    """
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped.inc()
+
+
+def setup_logging(config: Optional[dict] = None):
+    """
+    Route the root logger through the queue, with the level and sample rates of the logging
+    section in config.yaml. Calling it again does nothing.
+    """
+    if _listener is not None:
+        return
+    logging_config = (config or {}).get("logging", {})
+
+    queue_size = logging_config.get("queue_size", 10000)
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(SamplingFilter(logging_config.get("sample_rates", {})))
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def start_listener():
+        global _listener
+        _listener = logging.handlers.QueueListener(queue_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+
+    def restart_in_child():
+        # A forked worker (gunicorn preload) inherits the queue but not the writer thread
+        queue_handler.queue = queue.Queue(maxsize=queue_size)
+        start_listener()
+
+    start_listener()
+    os.register_at_fork(after_in_child=restart_in_child)
+    atexit.register(lambda: _listener.stop())      #flush what is still queued when the process exits
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(logging_config.get("level", "INFO"))
+    for name, level in logging_config.get("levels", {}).items():
+        logging.getLogger(name).setLevel(level)
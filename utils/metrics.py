@@ -0,0 +1,215 @@
+#This file keeps small in-process metrics (timers, counters, gauges, histograms) for the serving path.
+#We keep them in memory so that recording a value costs almost nothing on the hot path.
+#The registry renders them as JSON (/stats) or in the Prometheus text format (/metrics).
+
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Default latency buckets in seconds (1ms ... 30s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_METRIC_NAME = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")    #what Prometheus accepts
+
+
+class Counter:
+    """
+    A monotonically increasing counter.
+    """
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help_text = help_text
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"value": self._value}
+
+    def prometheus(self) -> str:
+        return _prometheus_header(self, "counter") + f"{self.name} {_format_value(self._value)}\n"
+
+
+class Gauge:
+    """
+    A value that goes up and down (e.g. requests in flight).
+    """
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help_text = help_text
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"value": self._value}
+
+    def prometheus(self) -> str:
+        return _prometheus_header(self, "gauge") + f"{self.name} {_format_value(self._value)}\n"
+
+
+class Histogram:
+    """
+    Bucketed histogram that also keeps a bounded window of recent samples,
+    so we can report percentiles (p50/p95/p99) without storing every observation.
+    """
+    def __init__(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS, window: int = 2048):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self.buckets) + 1)   #last slot is the +Inf bucket
+        self._count = 0
+        self._sum = 0.0
+        self._recent = deque(maxlen=window)   #recent samples used for percentiles
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._bucket_counts[bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+            self._recent.append(value)
+
+    @contextmanager
+    def time(self):
+        """
+        Context manager that observes the elapsed wall-clock time of the block in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def percentile(self, q: float) -> float:
+        """
+        Return the q-th percentile (0-100) of the recent window, or 0.0 when empty.
+        """
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, int(round(q / 100.0 * (len(samples) - 1)))))
+        return samples[index]
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self._count,
+            "sum": round(self._sum, 6),
+            "avg": round(self._sum / self._count, 6) if self._count else 0.0,
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "p99": round(self.percentile(99), 6),
+            "buckets": self.bucket_counts(),
+        }
+
+    def bucket_counts(self) -> dict:
+        """
+        Cumulative count per upper bound ("+Inf" for everything), like Prometheus "le" buckets.
+        """
+        with self._lock:
+            counts = list(self._bucket_counts)
+        cumulative, total = {}, 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+            total += count
+            cumulative[str(bound)] = total
+        return cumulative
+
+    def prometheus(self) -> str:
+        lines = [_prometheus_header(self, "histogram")]
+        for bound, count in self.bucket_counts().items():
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {count}\n')
+        lines.append(f"{self.name}_sum {_format_value(self._sum)}\n{self.name}_count {self._count}\n")
+        return "".join(lines)
+
+
+def _prometheus_header(metric, kind: str) -> str:
+    help_text = metric.help_text.replace("\\", "\\\\").replace("\n", "\\n")
+    return f"# HELP {metric.name} {help_text}\n# TYPE {metric.name} {kind}\n"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of named metrics. Asking twice for the same name returns the same object.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        if not _METRIC_NAME.match(name):
+            raise ValueError(f"Invalid metric name: {name}")
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def snapshot(self) -> dict:
+        """
+        Return a JSON-serializable view of every registered metric.
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in metrics.items()}
+
+    def prometheus(self) -> str:
+        """
+        Every registered metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return "".join(metric.prometheus() for _, metric in metrics)
+
+
+# Shared registry used by the application (import this instead of creating new registries)
+REGISTRY = MetricsRegistry()
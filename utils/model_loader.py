@@ -1,19 +1,21 @@
 #This file is used to define the model configurations and load the model.
 
 import os
-from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from config.config_loader import load_config
+import httpx
+from utils.container import get_container
+from utils.embedding_cache import CachedEmbeddings, EmbeddingStore
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class ModelLoader:
     """
     A utility class to load embedding models and LLM models.
     """
-    def __init__(self):     #Initialized automatically and used to set up any required logic.
-        load_dotenv()
+    def __init__(self, config=None):     #Initialized automatically and used to set up any required logic.
+        get_container().load_env()     #.env and config.yaml are read once per process (utils/container.py)
         self._validate_env()
-        self.config=load_config()
+        self.config=config or get_container().config
 
         """self refers to the current object being created or used. 
         It allows access to the instance’s own variables and methods.
@@ -28,20 +30,44 @@ class ModelLoader:
         if missing_vars:
             raise EnvironmentError(f"Missing environment variables: {missing_vars}")
 
+    def _http_client_args(self):
+        """
+        httpx arguments bounding this process's connection pool to the Gemini API (server.http_pool in config.yaml).
+        Each gunicorn worker creates its own clients after the fork, so the total is workers x max_connections.
+        """
+        pool_config=self.config.get("server", {}).get("http_pool")
+        if not pool_config:
+            return None
+        return {"limits": httpx.Limits(
+            max_connections=pool_config.get("max_connections", 20),
+            max_keepalive_connections=pool_config.get("max_keepalive_connections", 10),
+            keepalive_expiry=pool_config.get("keepalive_expiry_seconds", 30),
+        )}
+
     def load_embeddings(self):
         """
         Load and return the embedding model.
+        When embedding_cache is enabled in config.yaml, the model is wrapped with the on-disk cache,
+        so texts that were embedded before (by ingestion or by earlier queries) are not sent again.
         """
-        print("Loading Embedding model")
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings   #heavy import, only when a client is created
+        logger.info("Loading embedding model")
         model_name=self.config["embedding_model"]["model_name"]
-        return GoogleGenerativeAIEmbeddings(model=model_name)
+        embeddings=GoogleGenerativeAIEmbeddings(model=model_name, client_args=self._http_client_args())
+
+        cache_config=self.config.get("embedding_cache", {})
+        if cache_config.get("enabled", False):
+            store=EmbeddingStore(cache_config.get("path", "data/embedding_cache.sqlite"), model_name)
+            embeddings=CachedEmbeddings(embeddings, store)
+        return embeddings
 
-    def load_llm(self):
+    def load_llm(self, model_name=None):
         """
-        Load and return the LLM model.
+        Load and return the LLM model (llm.model_name, or the given model, e.g. one tier of llm.routing).
         """
-        print("LLM loading...")
-        model_name=self.config["llm"]["model_name"]
-        gemini_model=ChatGoogleGenerativeAI(model=model_name)
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        logger.info("Loading LLM %s", model_name or self.config["llm"]["model_name"])
+        model_name=model_name or self.config["llm"]["model_name"]
+        gemini_model=ChatGoogleGenerativeAI(model=model_name, client_args=self._http_client_args())
         
         return gemini_model  # Placeholder for future LLM loading
\ No newline at end of file
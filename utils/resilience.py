@@ -0,0 +1,503 @@
+#Tail-latency protection of a chat request (resilience section of config.yaml):
+#   - deadline   : every request gets request_timeout_seconds; the remaining time is visible to every
+#                  stage through a context variable, like the request trace (utils/tracing.py)
+#   - hedging    : retrieval sends a second, identical request when the first one is slower than the
+#                  recent p95 of retrievals, and takes whichever answers first
+#   - breakers   : one circuit breaker per upstream (retrieval, every LLM / LLM tier); after
+#                  failure_threshold consecutive failures or timeouts, calls fail immediately for
+#                  reset_seconds instead of piling up behind a broken service. Each call has its own time
+#                  limit (retrieval_timeout_seconds, llm_timeout_seconds): passing it counts as a failure,
+#                  while a request that runs out of its own deadline is not counted against the upstream
+#   - degraded   : when the deadline is near (less than min_generation_seconds left for the LLM), a
+#                  circuit is open or an upstream call fails, the request is answered without the LLM:
+#                  a cached answer (stale ones included) or a short text built from the retrieved
+#                  reviews' product_name / product_rating
+#Everything is local bookkeeping: no extra threads, no extra calls except the hedged retrieval.
+
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, List, Optional
+import httpx
+from langchain_core.callbacks import (AsyncCallbackHandler, AsyncCallbackManagerForRetrieverRun,
+                                      CallbackManagerForRetrieverRun)
+from langchain_core.documents import Document
+from langchain_core.exceptions import ModelAPIError, ModelConnectionError, ModelRateLimitError, ModelTimeoutError
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableGenerator
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+_degraded = REGISTRY.counter("chat_degraded_answers_total", "Chat requests answered without the LLM (deadline, open circuit or upstream error)")
+_deadline_exceeded = REGISTRY.counter("chat_deadline_exceeded_total", "Chat requests that ran out of time")
+_hedges = REGISTRY.counter("retrieval_hedges_total", "Second retrieval requests sent after the hedge delay")
+_hedge_wins = REGISTRY.counter("retrieval_hedge_wins_total", "Hedged retrievals that answered before the first request")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class UpstreamTimeout(TimeoutError):
+    """
+    An upstream call passed its own time limit (counted as a failure of the upstream, unlike DeadlineExceeded).
+    """
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+#Failures of a service rather than of this code: they get a degraded answer, everything else is an error.
+#Only these count as failures for the circuit breakers. (DeadlineExceeded and UpstreamTimeout are TimeoutErrors.)
+UPSTREAM_ERRORS = (TimeoutError, asyncio.TimeoutError, ConnectionError, CircuitOpen, httpx.TransportError,
+                   httpx.HTTPStatusError, ModelAPIError, ModelConnectionError, ModelRateLimitError, ModelTimeoutError)
+
+
+def is_upstream_error(error: BaseException) -> bool:
+    if isinstance(error, UPSTREAM_ERRORS):
+        return True
+    astrapy_exceptions = sys.modules.get("astrapy.exceptions")     #only loaded with the AstraDB backend
+    return astrapy_exceptions is not None and isinstance(error, astrapy_exceptions.DataAPITimeoutException)
+
+
+class Deadline:
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def start_deadline(seconds: float) -> Deadline:
+    """
+    Start the deadline of the current request (visible to everything running in this async context).
+    """
+    deadline = Deadline(seconds)
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def ensure_time_left(seconds: float, stage: str):
+    """
+    Raise DeadlineExceeded when the current request has less than `seconds` left (no-op without a deadline).
+    """
+    deadline = current_deadline()
+    if deadline is not None and deadline.remaining() < seconds:
+        raise DeadlineExceeded(f"{deadline.remaining():.2f}s left, {stage} needs {seconds}s")
+
+
+def time_limit(max_seconds: float, stage: str):
+    """
+    (seconds an upstream call may take, whether the request deadline is what limits them).
+    Raises DeadlineExceeded when the request has no time left.
+    """
+    deadline = current_deadline()
+    if deadline is None or deadline.remaining() >= max_seconds:
+        return max_seconds, False
+    if deadline.remaining() <= 0:
+        raise DeadlineExceeded(f"no time left for {stage}")
+    return deadline.remaining(), True
+
+
+async def within_deadline(chunks, deadline: Deadline):
+    """
+    Yield the chunks of an async iterator, raising DeadlineExceeded (and closing it) when the deadline passes.
+    """
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), max(0.0, deadline.remaining()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("request deadline passed") from None
+            yield chunk
+    finally:
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failures; open -> half-open after reset_seconds,
+    when one trial call goes through; its success closes the circuit, its failure opens it again.
+    A trial that ends without an outcome (e.g. cut by the request deadline) allows another after reset_seconds.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None           #None while closed
+        self.trial_started = None       #start of the running half-open trial call
+        self.state_gauge = REGISTRY.gauge(f"circuit_{name}_open", f"1 while the {name} circuit breaker is open")
+        self.rejected = REGISTRY.counter(f"circuit_{name}_rejected_total", f"Calls to {name} refused by the open circuit")
+
+    def is_open(self) -> bool:
+        if self.opened_at is None:
+            return False
+        since = self.trial_started if self.trial_started is not None else self.opened_at
+        return time.monotonic() - since < self.reset_seconds
+
+    def check(self):
+        """
+        Raise CircuitOpen unless a call may go through now (closed, or the half-open trial call).
+        """
+        if self.opened_at is None:
+            return
+        if self.is_open():
+            self.rejected.inc()
+            raise CircuitOpen(f"{self.name} circuit is open")
+        self.trial_started = time.monotonic()
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit %s closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self.state_gauge.set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        trial_failed = self.trial_started is not None
+        if trial_failed or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning("Circuit %s opened after %d consecutive failures", self.name, self.failures)
+            self.opened_at = time.monotonic()
+            self.trial_started = None
+            self.state_gauge.set(1)
+
+    def snapshot(self) -> dict:
+        return {"open": self.is_open(), "consecutive_failures": self.failures}
+
+
+class HedgedRetriever(BaseRetriever):
+    """
+    Wraps the retriever of the chain: bounded by the request deadline and max_seconds, hedged after the
+    recent p95 retrieval time, guarded by a circuit breaker. Running out of request time is not counted
+    as a failure of the upstream; errors and max_seconds timeouts are.
+    """
+
+    retriever: BaseRetriever
+    breaker: Any
+    latency: Any                        #Histogram of successful retrievals, source of the hedge delay
+    hedge: bool = True
+    percentile: float = 95
+    initial_delay: float = 0.3          #hedge delay until min_samples retrievals were measured
+    min_delay: float = 0.02
+    min_samples: int = 20
+    max_seconds: float = 5.0
+
+    def hedge_delay(self) -> float:
+        if self.latency.count < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.latency.percentile(self.percentile))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        # Sync path (scripts, sync invoke): breaker only
+        self.breaker.check()
+        try:
+            documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        except Exception as e:
+            if is_upstream_error(e):
+                self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return documents
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        self.breaker.check()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        limit, by_deadline = time_limit(self.max_seconds, "retrieval")
+        end = started + limit
+        hedge_at = started + self.hedge_delay() if self.hedge else end
+
+        def attempt():
+            return asyncio.ensure_future(self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()}))
+
+        primary = attempt()
+        tasks = {primary}
+        hedged = not self.hedge
+        error = None
+        try:
+            while True:
+                now = loop.time()
+                if now >= end:
+                    if by_deadline:
+                        raise DeadlineExceeded("no time left for retrieval")
+                    raise UpstreamTimeout(f"retrieval took more than {limit:.1f}s")
+                # Hedge once: when the first request is slower than the hedge delay, or failed right away
+                if not hedged and (not tasks or now >= hedge_at):
+                    hedged = True
+                    _hedges.inc()
+                    tasks.add(attempt())
+                if not tasks:
+                    raise error
+                wait_until = end if hedged else min(hedge_at, end)
+                done, _ = await asyncio.wait(tasks, timeout=wait_until - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            _hedge_wins.inc()
+                        self.latency.observe(loop.time() - started)
+                        self.breaker.record_success()
+                        return task.result()
+                    error = task.exception()
+        except Exception as e:
+            if is_upstream_error(e) and not isinstance(e, DeadlineExceeded):
+                self.breaker.record_failure()
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class RetrievedDocuments(AsyncCallbackHandler):
+    """
+    Keeps the documents returned by the outermost retriever of a run (for the degraded answer).
+    """
+    run_inline = True
+
+    def __init__(self):
+        self.documents = None
+        self._retrievers = set()        #every retriever run seen
+        self._outermost = set()         #...and those not started by another retriever
+
+    async def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._retrievers.add(run_id)
+        if parent_run_id not in self._retrievers:
+            self._outermost.add(run_id)
+
+    async def on_retriever_end(self, documents, *, run_id, **kwargs):
+        if run_id in self._outermost:
+            self.documents = list(documents)
+
+
+class DegradedAnswers:
+    """
+    Answers built without the LLM from the retrieved reviews' product_name / product_rating.
+    """
+
+    def __init__(self, catalog=None, max_products: int = 3):
+        self.catalog = catalog
+        self.max_products = max_products
+
+    def answer(self, documents: Optional[List[Document]]) -> str:
+        products = OrderedDict()
+        for doc in documents or []:
+            name = doc.metadata.get("product_name")
+            if name:
+                products.setdefault(name, []).append(doc.metadata.get("product_rating"))
+        if not products:
+            return "Sorry, I can't answer right now. Please try again in a moment."
+
+        lines = []
+        for name, ratings in list(products.items())[:self.max_products]:
+            stats = self.catalog.stats(name) if self.catalog is not None else None
+            if stats is not None:
+                lines.append(f"- {name}: rated {stats['average_rating']:.1f}/5 from {stats['reviews']} reviews")
+                continue
+            ratings = [float(rating) for rating in ratings if rating is not None]
+            if ratings:
+                lines.append(f"- {name}: rated {sum(ratings) / len(ratings):.1f}/5 in the reviews I found")
+            else:
+                lines.append(f"- {name}")
+        return ("I can't put together a detailed answer right now, but these products match your question:\n"
+                + "\n".join(lines))
+
+
+class Resilience:
+    """
+    Settings, circuit breakers and degraded answers of one server process.
+    """
+
+    def __init__(self, request_timeout_seconds: float = 20.0, min_generation_seconds: float = 2.0,
+                 retrieval_timeout_seconds: float = 5.0, llm_timeout_seconds: float = 10.0, hedge_config: dict = None,
+                 breaker_config: dict = None, degraded: DegradedAnswers = None):
+        self.request_timeout_seconds = request_timeout_seconds
+        self.min_generation_seconds = min_generation_seconds
+        self.retrieval_timeout_seconds = retrieval_timeout_seconds
+        self.llm_timeout_seconds = llm_timeout_seconds
+        self.hedge_config = hedge_config or {}
+        self.breaker_config = breaker_config or {}
+        self.degraded = degraded or DegradedAnswers()
+        self.breakers = {}
+
+    @classmethod
+    def from_config(cls, config: dict, catalog=None) -> Optional["Resilience"]:
+        """
+        Resilience for the resilience section of config.yaml, or None when it is disabled.
+        """
+        resilience_config = config.get("resilience", {})
+        if not resilience_config.get("enabled", False):
+            return None
+        return cls(
+            request_timeout_seconds=resilience_config.get("request_timeout_seconds", 20.0),
+            min_generation_seconds=resilience_config.get("min_generation_seconds", 2.0),
+            retrieval_timeout_seconds=resilience_config.get("retrieval_timeout_seconds", 5.0),
+            llm_timeout_seconds=resilience_config.get("llm_timeout_seconds", 10.0),
+            hedge_config=resilience_config.get("hedge", {}),
+            breaker_config=resilience_config.get("circuit_breaker", {}),
+            degraded=DegradedAnswers(catalog),
+        )
+
+    def breaker(self, upstream: str) -> CircuitBreaker:
+        if upstream not in self.breakers:
+            self.breakers[upstream] = CircuitBreaker(
+                upstream,
+                failure_threshold=self.breaker_config.get("failure_threshold", 5),
+                reset_seconds=self.breaker_config.get("reset_seconds", 30.0),
+            )
+        return self.breakers[upstream]
+
+    def start_deadline(self) -> Deadline:
+        return start_deadline(self.request_timeout_seconds)
+
+    def hedged_retriever(self, retriever) -> HedgedRetriever:
+        return HedgedRetriever(
+            retriever=retriever,
+            breaker=self.breaker("retrieval"),
+            latency=REGISTRY.histogram("retrieval_attempt_seconds", "Successful (hedged) retrieval time"),
+            hedge=self.hedge_config.get("enabled", True),
+            percentile=self.hedge_config.get("percentile", 95),
+            initial_delay=self.hedge_config.get("initial_delay_ms", 300) / 1000.0,
+            min_delay=self.hedge_config.get("min_delay_ms", 20) / 1000.0,
+            min_samples=self.hedge_config.get("min_samples", 20),
+            max_seconds=self.retrieval_timeout_seconds,
+        )
+
+    def guarded_llm(self, llm, upstream: str = "llm"):
+        """
+        The chat model behind its circuit breaker, only called when min_generation_seconds are left.
+        On the async path every wait for the model (first token, then each chunk) is bounded by
+        llm_timeout_seconds: a hung or stalled model fails the call and counts against the upstream.
+        When the request deadline is closer, the call is cut by it instead, which is not counted.
+        """
+        breaker = self.breaker(upstream)
+
+        def guard(prompt_values, config):
+            prompt_value = None
+            for prompt_value in prompt_values:
+                pass
+            ensure_time_left(self.min_generation_seconds, "generation")
+            breaker.check()
+            try:
+                yield from llm.stream(prompt_value, config)
+            except Exception as e:
+                if is_upstream_error(e):
+                    breaker.record_failure()
+                raise
+            breaker.record_success()
+
+        async def aguard(prompt_values, config):
+            prompt_value = None
+            async for prompt_value in prompt_values:
+                pass
+            ensure_time_left(self.min_generation_seconds, "generation")
+            breaker.check()
+            chunks = llm.astream(prompt_value, config).__aiter__()
+            try:
+                while True:
+                    limit, by_deadline = time_limit(self.llm_timeout_seconds, "generation")
+                    try:
+                        # A closer request deadline is enforced by ChainRun (which cancels us), not timed here
+                        chunk = await asyncio.wait_for(chunks.__anext__(), None if by_deadline else limit)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise UpstreamTimeout(f"{upstream} sent nothing for {limit:.1f}s") from None
+                    yield chunk
+            except Exception as e:
+                # Running out of request time (or a cancellation) is not the upstream's fault, nor is a bug here
+                if is_upstream_error(e) and not isinstance(e, DeadlineExceeded):
+                    breaker.record_failure()
+                raise
+            finally:
+                if hasattr(chunks, "aclose"):
+                    await chunks.aclose()
+            breaker.record_success()
+
+        return RunnableGenerator(guard, aguard, name=f"Guarded[{upstream}]")
+
+    def degraded_answer(self, cache, lookup, documents) -> str:
+        """
+        Answer without the LLM: a cached answer for the question (stale ones too), else the review template.
+        """
+        _degraded.inc()
+        if cache is not None and lookup is not None:
+            answer = cache.stale_lookup(lookup)
+            if answer is not None:
+                return answer
+        return self.degraded.answer(documents)
+
+    def stats(self) -> dict:
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+
+class ChainRun:
+    """
+    One chat request's chain run. Without resilience it is a plain astream(); with it, the request deadline
+    starts when the ChainRun is created, the stream is cut when it passes, and a deadline, an open circuit
+    or a failed upstream call (is_upstream_error: timeouts, connection and API errors) ends the answer with
+    a degraded one. `degraded` then tells why (such answers are not cached). Other exceptions are bugs
+    and are raised as usual.
+    """
+
+    def __init__(self, resilience: Optional[Resilience], cache=None, answer_key: str = None):
+        self.resilience = resilience
+        self.cache = cache
+        self.answer_key = answer_key    #the chain streams dicts and the answer text is under this key
+        self.deadline = resilience.start_deadline() if resilience is not None else None
+        self.degraded = None
+
+    def _text(self, chunk):
+        return chunk.get(self.answer_key) if self.answer_key is not None else chunk
+
+    async def astream(self, chain, chain_input, callbacks: list, lookup=None):
+        if self.resilience is None:
+            async for chunk in chain.astream(chain_input, config={"callbacks": callbacks}):
+                yield chunk
+            return
+
+        retrieved = RetrievedDocuments()
+        answered = False
+        try:
+            chunks = chain.astream(chain_input, config={"callbacks": callbacks + [retrieved]})
+            async for chunk in within_deadline(chunks, self.deadline):
+                answered = answered or bool(self._text(chunk))
+                yield chunk
+            return
+        except Exception as e:
+            if not is_upstream_error(e):
+                raise
+            self.degraded = type(e).__name__
+            if isinstance(e, DeadlineExceeded):
+                _deadline_exceeded.inc()
+            if isinstance(e, (DeadlineExceeded, CircuitOpen)):
+                logger.info("Degraded answer (%s): %s", self.degraded, e)
+            else:
+                logger.warning("Degraded answer after an upstream error (%s): %s", self.degraded, e)
+        if answered:
+            text = " ..."               #cut off in the middle of the answer
+        else:
+            text = self.resilience.degraded_answer(self.cache, lookup, retrieved.documents)
+        yield text if self.answer_key is None else {self.answer_key: text}
@@ -0,0 +1,331 @@
+#Server-side conversation memory keyed by a session id (sent by the chat page with every message).
+#Each session keeps a bounded window of its recent turns: the question, a shortened answer, the ids of
+#the reviews retrieved for it and the question's content terms. Two things use it:
+#   - the prompt gets the recent turns as {history}, so "what about the cheaper one?" has a referent
+#   - a follow-up that overlaps the previous turn reuses that turn's reviews instead of retrieving again
+#Records use __slots__ and hold only strings/tuples, sessions are evicted LRU beyond max_sessions and
+#after ttl_seconds of inactivity, so memory stays bounded with tens of thousands of open conversations.
+#
+#The default store lives in the worker's memory. With several gunicorn workers a follow-up can land on
+#another worker, so session.store: "sqlite" keeps the sessions in one SQLite file shared by all of them.
+#Reused reviews come from a per-worker document cache; when they are not there, the turn simply retrieves.
+#The async server uses aplan()/arecord(), which run the SQLite reads and writes in a worker thread.
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Optional
+from langchain_core.documents import Document
+from retriever.bm25 import STOPWORDS, tokenize
+from utils.metrics import REGISTRY
+
+#Words that point back at something said earlier ("is it waterproof?", "the cheaper one")
+REFERENCE_WORDS = frozenset(
+    "it its this that these those they them their one ones same other another both either first second "
+    "former latter cheaper costlier better worse".split()
+)
+
+
+def question_terms(text: str) -> frozenset:
+    return frozenset(t for t in tokenize(text) if t not in STOPWORDS and t not in REFERENCE_WORDS)
+
+
+def document_key(doc: Document) -> str:
+    # Stable across worker processes (the SQLite store shares the ids between them)
+    return doc.id or hashlib.md5(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class Turn:
+    __slots__ = ("question", "answer", "doc_ids", "terms")
+
+    def __init__(self, question: str, answer: str, doc_ids: tuple, terms: frozenset):
+        self.question = question
+        self.answer = answer
+        self.doc_ids = doc_ids
+        self.terms = terms
+
+    def to_list(self) -> list:
+        return [self.question, self.answer, list(self.doc_ids), sorted(self.terms)]
+
+    @classmethod
+    def from_list(cls, values: list) -> "Turn":
+        question, answer, doc_ids, terms = values
+        return cls(question, answer, tuple(doc_ids), frozenset(terms))
+
+
+class Session:
+    __slots__ = ("turns", "expires_at")
+
+    def __init__(self, max_turns: int, expires_at: float, turns=()):
+        self.turns = deque(turns, maxlen=max_turns)
+        self.expires_at = expires_at
+
+    @property
+    def last(self) -> Optional[Turn]:
+        return self.turns[-1] if self.turns else None
+
+
+class InMemorySessionStore:
+    """
+    Sessions of this worker in an OrderedDict used as an LRU, with a per-session inactivity TTL.
+    """
+    blocking = False
+
+    def __init__(self, max_sessions: int = 50000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self.evictions = REGISTRY.counter("session_evictions_total", "Sessions dropped (LRU size bound or TTL)")
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.expires_at < time.time():
+            del self._sessions[session_id]
+            self.evictions.inc()
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def put(self, session_id: str, session: Session):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions.inc()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file (WAL mode), shared by every worker process on the host.
+    Expired rows are deleted on write, at most once a minute; the LRU bound is applied the same way.
+    """
+    blocking = True           #disk I/O: kept off the event loop by SessionMemory.aplan()/arecord()
+
+    def __init__(self, path: str, max_turns: int, max_sessions: int = 50000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, turns TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)")
+        self.evictions = REGISTRY.counter("session_evictions_total", "Sessions dropped (LRU size bound or TTL)")
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT turns, expires_at FROM sessions WHERE id = ? AND expires_at >= ?", (session_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return Session(self.max_turns, row[1], [Turn.from_list(values) for values in json.loads(row[0])])
+
+    def put(self, session_id: str, session: Session):
+        turns = json.dumps([turn.to_list() for turn in session.turns])
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, turns, expires_at) VALUES (?, ?, ?)",
+                (session_id, turns, session.expires_at),
+            )
+            if now >= self._next_cleanup:
+                self._next_cleanup = now + 60
+                removed = self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,)).rowcount
+                # Sessions expire a fixed TTL after their last turn, so the oldest expiry is the least recently used
+                removed += self._conn.execute(
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,),
+                ).rowcount
+                self.evictions.inc(removed)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class DocumentCache:
+    """
+    LRU of recently retrieved review Documents by id, so a reused turn does not query the vector store.
+    Shared by all sessions of the worker: sessions only hold the ids.
+    """
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._documents = OrderedDict()
+
+    def put_many(self, documents: List[Document]):
+        for doc in documents:
+            key = document_key(doc)
+            self._documents[key] = doc
+            self._documents.move_to_end(key)
+        while len(self._documents) > self.max_size:
+            self._documents.popitem(last=False)
+
+    def get_many(self, keys) -> Optional[List[Document]]:
+        """
+        The documents for all keys, or None when any of them was evicted.
+        """
+        documents = []
+        for key in keys:
+            doc = self._documents.get(key)
+            if doc is None:
+                return None
+            self._documents.move_to_end(key)
+            documents.append(doc)
+        return documents
+
+    def __len__(self):
+        return len(self._documents)
+
+
+class TurnPlan:
+    """
+    What one request does with its session: the prompt history, the retrieval query, and the reused
+    documents (None when the turn retrieves).
+    """
+    __slots__ = ("session_id", "session", "question", "terms", "history", "retrieval_query", "documents")
+
+    def __init__(self, session_id: str, session: Session, question: str, terms: frozenset):
+        self.session_id = session_id
+        self.session = session
+        self.question = question
+        self.terms = terms
+        self.history = ""
+        self.retrieval_query = question
+        self.documents = None
+
+    @property
+    def reused(self) -> bool:
+        return self.documents is not None
+
+    def chain_input(self) -> dict:
+        return {"question": self.question, "history": self.history,
+                "retrieval_query": self.retrieval_query, "documents": self.documents}
+
+
+class SessionMemory:
+    """
+    Plans each turn from the session's previous turns and records the finished turn.
+    """
+
+    def __init__(self, store, max_turns: int = 4, ttl_seconds: float = 1800, max_answer_chars: int = 300,
+                 reuse_overlap: float = 0.5, max_new_terms: int = 1, document_cache_size: int = 5000):
+        self.store = store
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_answer_chars = max_answer_chars
+        self.reuse_overlap = reuse_overlap
+        self.max_new_terms = max_new_terms
+        self.documents = DocumentCache(document_cache_size)
+        self.reused = REGISTRY.counter("session_retrievals_reused_total", "Follow-up questions answered with the previous turn's reviews")
+        self.retrieved = REGISTRY.counter("session_retrievals_total", "Session turns that ran the retriever")
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["SessionMemory"]:
+        """
+        Session memory for the `session` section of config.yaml, or None when it is disabled.
+        """
+        session_config = config.get("session", {})
+        if not session_config.get("enabled", False):
+            return None
+        max_turns = session_config.get("max_turns", 4)
+        max_sessions = session_config.get("max_sessions", 50000)
+        if session_config.get("store", "memory") == "sqlite":
+            store = SQLiteSessionStore(session_config.get("path", "data/sessions.sqlite"), max_turns, max_sessions)
+        else:
+            store = InMemorySessionStore(max_sessions)
+        return cls(
+            store,
+            max_turns=max_turns,
+            ttl_seconds=session_config.get("ttl_seconds", 1800),
+            max_answer_chars=session_config.get("max_answer_chars", 300),
+            reuse_overlap=session_config.get("reuse_overlap", 0.5),
+            max_new_terms=session_config.get("max_new_terms", 1),
+            document_cache_size=session_config.get("document_cache_size", 5000),
+        )
+
+    def _is_follow_up(self, terms: frozenset, question: str, previous: Turn) -> bool:
+        """
+        A follow-up about the previous turn's products: most of its content terms were already used,
+        or it points back ("it", "the cheaper one") and brings at most max_new_terms new terms.
+        """
+        if not previous.doc_ids:
+            return False
+        new_terms = terms - previous.terms
+        if terms and 1 - len(new_terms) / len(terms) >= self.reuse_overlap:
+            return True
+        refers_back = any(word in REFERENCE_WORDS for word in tokenize(question))
+        return refers_back and len(new_terms) <= self.max_new_terms
+
+    def plan(self, session_id: str, question: str) -> TurnPlan:
+        return self._plan(session_id, question, self.store.get(session_id))
+
+    async def aplan(self, session_id: str, question: str) -> TurnPlan:
+        if self.store.blocking:
+            return self._plan(session_id, question, await asyncio.to_thread(self.store.get, session_id))
+        return self.plan(session_id, question)
+
+    def _plan(self, session_id: str, question: str, session: Optional[Session]) -> TurnPlan:
+        session = session or Session(self.max_turns, 0.0)
+        plan = TurnPlan(session_id, session, question, question_terms(question))
+        previous = session.last
+        if previous is None:
+            return plan
+
+        plan.history = "\n".join(f"Customer: {turn.question}\nAssistant: {turn.answer}" for turn in session.turns)
+        if self._is_follow_up(plan.terms, question, previous):
+            plan.documents = self.documents.get_many(previous.doc_ids)
+            # The follow-up inherits the previous turn's terms, so the turn after it can still refer back
+            plan.terms = plan.terms | previous.terms
+        if plan.documents is None and any(word in REFERENCE_WORDS for word in tokenize(question)):
+            plan.retrieval_query = f"{previous.question} {question}"      #give "it" its referent for retrieval
+        return plan
+
+    def record(self, plan: TurnPlan, answer: str, documents: Optional[List[Document]]):
+        """
+        Append the finished turn to its session (documents: what the prompt was built from).
+        """
+        self._append(plan, answer, documents)
+        self.store.put(plan.session_id, plan.session)
+
+    async def arecord(self, plan: TurnPlan, answer: str, documents: Optional[List[Document]]):
+        self._append(plan, answer, documents)
+        if self.store.blocking:
+            await asyncio.to_thread(self.store.put, plan.session_id, plan.session)
+        else:
+            self.store.put(plan.session_id, plan.session)
+
+    def _append(self, plan: TurnPlan, answer: str, documents: Optional[List[Document]]):
+        if plan.reused:
+            self.reused.inc()
+        else:
+            self.retrieved.inc()
+        documents = documents or []
+        self.documents.put_many(documents)
+        if len(answer) > self.max_answer_chars:
+            answer = answer[:self.max_answer_chars].rsplit(" ", 1)[0] + " ..."
+        plan.session.turns.append(Turn(plan.question, answer, tuple(document_key(doc) for doc in documents), plan.terms))
+        plan.session.expires_at = time.time() + self.ttl_seconds
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.store),
+            "cached_documents": len(self.documents),
+            "retrievals_reused": self.reused.value,
+            "retrievals": self.retrieved.value,
+        }
@@ -0,0 +1,140 @@
+#Process-wide cache of the read-only serving structures: local vector index, BM25 index, product catalog.
+#Each is loaded once per process and handed to every Retriever / ContextPacker that asks for it.
+#
+#With several gunicorn workers (gunicorn.conf.py, preload) preload() runs in the master before it forks:
+#   - the .npy matrices are memory-mapped, so all workers read the same pages of the OS page cache
+#   - the Python objects around them (ids, texts, metadata, catalog) are inherited copy-on-write;
+#     gc.freeze() moves them out of the garbage collector's reach, so the collector does not write
+#     to (and thereby copy) their pages in every worker
+#Clients with sockets or threads (Gemini, AstraDB, SQLite embedding cache) are never created here: they
+#are opened per worker after the fork, in the FastAPI lifespan.
+#
+#After an ingestion run (cache.invalidation_file touched, see utils/answer_cache.py) the structures are
+#stale: indexes_changed() tells so, clear() drops them, and ChainRegistry.reload_indexes() loads new ones
+#(per worker: the reloaded copies are no longer shared with the other workers).
+
+import gc
+import importlib
+import os
+import threading
+from retriever.bm25 import BM25Index
+from retriever.catalog import ProductCatalog
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_resources = {}
+_lock = threading.Lock()
+_UNSET = object()
+_loaded_stamp = _UNSET       #ingestion stamp the current resources were loaded under
+
+#Imported lazily by main.py (fast cold start of a single process); the gunicorn master imports them before
+#forking so the workers share the module objects instead of each importing LangChain after the fork
+PRELOAD_MODULES = ("utils.chain_registry", "utils.tracing", "utils.llm_router", "utils.answer_cache",
+                   "utils.session_memory", "utils.resilience", "retriever.retrieval")
+
+
+def shared(key, loader):
+    """
+    The resource stored under `key`, created with loader() the first time it is asked for.
+    A loader returning None (e.g. no catalog written yet) is asked again next time.
+    """
+    with _lock:
+        if key not in _resources:
+            resource = loader()
+            if resource is None:
+                return None
+            _resources[key] = resource
+        return _resources[key]
+
+
+def ingestion_stamp(config: dict):
+    """
+    Modification time of the ingestion stamp file (cache.invalidation_file), None when there is none.
+    """
+    path = config.get("cache", {}).get("invalidation_file")
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def indexes_changed(config: dict) -> bool:
+    """
+    True when an ingestion ran since the resources were loaded (the first call only records the stamp).
+    """
+    global _loaded_stamp
+    stamp = ingestion_stamp(config)
+    with _lock:
+        if _loaded_stamp is _UNSET:
+            _loaded_stamp = stamp
+        return stamp != _loaded_stamp
+
+
+def clear():
+    """
+    Drop every loaded resource: the next request for one loads it again. Objects still in use keep
+    working, the index files are replaced atomically, never rewritten in place.
+    """
+    with _lock:
+        _resources.clear()
+
+
+def mark_loaded(stamp):
+    """
+    Record the ingestion stamp the currently loaded resources belong to.
+    """
+    global _loaded_stamp
+    with _lock:
+        _loaded_stamp = stamp
+
+
+def local_index(index_path: str, mmap: bool = True, **options):
+    """
+    LocalVectorStore loaded from index_path, without an embedding model (see LocalVectorStore.with_embedding).
+    """
+    from retriever.local_index import LocalVectorStore
+
+    def load():
+        store = LocalVectorStore.load(index_path, None, mmap=mmap, **options)
+        store.prepare_read_only()
+        return store
+    return shared(("local_index", index_path, mmap, tuple(sorted(options.items()))), load)
+
+
+def bm25_index(index_path: str) -> BM25Index:
+    return shared(("bm25", index_path), lambda: BM25Index.load(index_path))
+
+
+def product_catalog(config: dict):
+    path = config.get("catalog", {}).get("path", "data/product_catalog.json")
+    return shared(("catalog", path), lambda: ProductCatalog.from_config(config))
+
+
+def preload(config: dict):
+    """
+    Import the serving modules and load every read-only structure the configuration uses, then freeze them.
+    Called in the gunicorn master before forking (gunicorn.conf.py); harmless anywhere else.
+    """
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    indexes_changed(config)      #records the ingestion stamp the preloaded structures belong to
+
+    from retriever.local_index import LocalVectorStore
+    from retriever.vector_store import get_backend, local_index_options
+    if get_backend(config) == "local":
+        index_path, mmap, options = local_index_options(config)
+        if LocalVectorStore.exists(index_path):
+            local_index(index_path, mmap, **options)
+
+    hybrid_config = config.get("retriever", {}).get("hybrid", {})
+    index_path = hybrid_config.get("index_path", "data/bm25_index")
+    if hybrid_config.get("enabled", False) and BM25Index.exists(index_path):
+        bm25_index(index_path)
+
+    product_catalog(config)
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded modules %s and shared resources: %s", list(PRELOAD_MODULES), [key[0] for key in _resources])
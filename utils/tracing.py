@@ -0,0 +1,161 @@
+#Per-stage timing spans of a chat request, exported as histograms (/metrics, /stats):
+#   embedding        question embedding (cache lookups included)
+#   vector_search    retrieval without the embedding time (vector/BM25 search, filters, reranking)
+#   prompt_format    filling the prompt template
+#   llm_first_token  from sending the prompt to the first generated token
+#   llm_completion   from sending the prompt to the last token
+#   request          the whole chain run
+#The spans of the current request are collected in a RequestTrace kept in a ContextVar, which the
+#LangChain callback (StageTimer) and the embedding wrapper (TimedEmbeddings) both see.
+
+import time
+from contextvars import ContextVar
+from typing import Any, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.embeddings import Embeddings
+from utils.metrics import REGISTRY
+
+STAGES = ("embedding", "vector_search", "prompt_format", "llm_first_token", "llm_completion", "request")
+STAGE_HISTOGRAMS = {stage: REGISTRY.histogram(f"chat_stage_{stage}_seconds", f"Time spent in the {stage} stage of a chat request")
+                    for stage in STAGES}
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """
+    Seconds spent per stage for one request.
+    """
+    __slots__ = ("spans", "started")
+
+    def __init__(self):
+        self.spans = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        STAGE_HISTOGRAMS[stage].observe(seconds)
+
+    def finish(self):
+        self.add("request", time.perf_counter() - self.started)
+
+    def report(self) -> dict:
+        return {stage: round(seconds, 6) for stage, seconds in self.spans.items()}
+
+
+def start_trace() -> RequestTrace:
+    """
+    Start collecting spans for the request running in the current (async) context.
+    """
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    Records query embedding time into the current request trace. Everything else is passed through.
+    """
+
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        try:
+            return self.underlying.embed_query(text)
+        finally:
+            _record("embedding", time.perf_counter() - start)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        try:
+            return await self.underlying.aembed_query(text)
+        finally:
+            _record("embedding", time.perf_counter() - start)
+
+
+def _record(stage: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+    else:
+        STAGE_HISTOGRAMS[stage].observe(seconds)
+
+
+class StageTimer(AsyncCallbackHandler):
+    """
+    LangChain callback that turns chain events into spans of the current request trace.
+    Runs inline on the event loop (no extra task per event).
+    """
+    run_inline = True
+
+    def __init__(self, trace: RequestTrace):
+        self.trace = trace
+        self._started = {}              #run id -> start time
+        self._embedding_before = {}     #retriever run id -> embedding seconds already spent before it started
+        self._llm_runs_with_token = set()
+
+    async def on_retriever_start(self, serialized, query: str, *, run_id: UUID, parent_run_id=None, **kwargs: Any):
+        # Only the outermost retriever counts (a reranking retriever wraps another one)
+        if parent_run_id not in self._embedding_before:
+            self._started[run_id] = time.perf_counter()
+            self._embedding_before[run_id] = self.trace.spans.get("embedding", 0.0)
+
+    async def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any):
+        self._finish_retrieval(run_id)
+
+    async def on_retriever_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._finish_retrieval(run_id)
+
+    def _finish_retrieval(self, run_id: UUID):
+        start = self._started.pop(run_id, None)
+        if start is None:
+            return
+        embedding = self.trace.spans.get("embedding", 0.0) - self._embedding_before.pop(run_id)
+        self.trace.add("vector_search", max(0.0, time.perf_counter() - start - embedding))
+
+    async def on_chain_start(self, serialized, inputs, *, run_id: UUID, **kwargs: Any):
+        if kwargs.get("run_type") == "prompt":
+            self._started[run_id] = time.perf_counter()
+
+    async def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            self.trace.add("prompt_format", time.perf_counter() - start)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    async def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        if run_id not in self._llm_runs_with_token and run_id in self._started:
+            self._llm_runs_with_token.add(run_id)
+            self.trace.add("llm_first_token", time.perf_counter() - self._started[run_id])
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        start = self._started.pop(run_id, None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if run_id not in self._llm_runs_with_token:     #not streamed: the first token arrives with the rest
+            self.trace.add("llm_first_token", elapsed)
+        self._llm_runs_with_token.discard(run_id)
+        self.trace.add("llm_completion", elapsed)
+
+    async def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._started.pop(run_id, None)
+        self._llm_runs_with_token.discard(run_id)